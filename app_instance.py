@@ -1,6 +1,6 @@
 # app_instance.py
+import asyncio
 import os
-from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 import yaml
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
@@ -11,15 +11,30 @@ from src.controller.ai_manager import AiManager
 from src.controller.auth_manager import AuthManager
 from src.controller.base_manage import BaseManager
 from src.controller.blog_manage import BlogManager
+from src.controller.checkpoint_retention import CheckpointRetention
 from src.controller.file_manager import FileManager
 from src.controller.tag_manage import TagManager
+from src.controller.view_manager import ViewManager
 from src.controller.user_manage import UserManager
 from src.controller.role_manager import RoleManager
 from src.controller.resource_manager import ResourceManager
+from src.database.mongo.content_codec import ContentCodec
 from src.database.mongo.mongodb_manage import MongoDBManager
 from src.database.mysql.mysql_manage import MySQLManager
 from src.database.postgresql.postgresql_manager import PostgreSQLManager
 from src.database.redis.redis_manage import RedisManager
+from src.llm.answer_cache import AnswerCache, DEFAULT_BYPASS_PATTERNS
+from src.llm.config import TEST_MODEL
+from src.llm.image import ImagePreparer
+from src.llm.limiter import ModelLimiters
+from src.llm.prompt import SYSTEM_PROMPT
+from src.llm.rag import BlogRetriever, HashingEmbedder, set_blog_retriever
+from src.llm.usage import UsageAccounting
+from src.llm.tools.cache import configure_tool_caches
+from src.util.http_client import HttpClient, set_http_client
+from src.util.metrics import metrics
+from src.util.sse import SSEStreamer
+from src.util.startup import startup
 
 
 class Application(FastAPI):
@@ -47,21 +62,37 @@ class Application(FastAPI):
         ]
 
     async def init(self, env='dev'):
-        self.load_config(env=env)
-        self.__init__mongoDB()
-        self.__init__redis()
-        self.__init__mysql()
-        self.__init__postgresql()
-        await self.__init__ai_manager()
-        # AI Manager 的初始化移到 lifespan 中，因为需要异步操作
-        self.__init_blog_manager()
-        self.__init_user_manager()
-        self.__init_tag_manager()
-        self.__init_base_manager()
-        self.__init_role_manager()
-        self.__init_reousrce_manager()
-        self.__init_auth_manager()
-        self.__init_file_manager()
+        self._background_tasks = []
+        with startup.step('config'):
+            self.load_config(env=env)
+        with startup.step('mongo'):
+            await self.__init__mongoDB()
+        with startup.step('redis'):
+            self.__init__redis()
+        with startup.step('mysql'):
+            self.__init__mysql()
+        with startup.step('postgresql'):
+            await self.__init__postgresql()
+        with startup.step('http_client'):
+            self.__init__http_client()
+        with startup.step('rag'):
+            self.__init_rag()
+        with startup.step('ai_manager'):
+            await self.__init__ai_manager()
+        with startup.step('managers'):
+            self.__init_base_manager()
+            self.__init_view_manager()
+            self.__init_blog_manager()
+            self.__init_user_manager()
+            self.__init_tag_manager()
+            self.__init_role_manager()
+            self.__init_reousrce_manager()
+            self.__init_auth_manager()
+            self.__init_file_manager()
+        with startup.step('mongo_indexes'):
+            await self.__init__mongo_indexes()
+        self.__start_background_tasks()
+        logger.info(f'启动耗时: {startup.report()}')
         logger.info(f'当前模式为{env}')
         if env == 'local':
             pass
@@ -69,7 +100,11 @@ class Application(FastAPI):
             pass
 
     async def shut_down(self, env='dev'):
+        await self.__stop_background_tasks()
         await self.__cleanup_ai_manager()
+        await self.__close_http_client()
+        self.mongo.close()
+        await self.postgresql.close()
         if env == 'local':
             pass
         else:
@@ -87,9 +122,29 @@ class Application(FastAPI):
         logger.info(f'Loaded {env} configuration from {config_path}')
         logger.debug(f'Loaded configuration sections: {list((self.config or {}).keys())}')
 
-    def __init__mongoDB(self):
-        self.mongo = MongoDBManager(ip=self.config['mongo']['ip'], port=self.config['mongo']['port'], db=self.config['mongo']
-                                    ['db'], user=self.config['mongo']['user'], password=self.config['mongo']['password'])
+    async def __init__mongoDB(self):
+        mongo_config = self.config['mongo']
+        self.mongo = MongoDBManager(ip=mongo_config['ip'], port=mongo_config['port'], db=mongo_config['db'],
+                                    user=mongo_config['user'], password=mongo_config['password'],
+                                    max_pool_size=mongo_config.get('max_pool_size', 100),
+                                    min_pool_size=mongo_config.get('min_pool_size', 0),
+                                    max_idle_time_ms=mongo_config.get('max_idle_time_ms'),
+                                    connect_timeout_ms=mongo_config.get('connect_timeout_ms', 5000),
+                                    server_selection_timeout_ms=mongo_config.get(
+                                        'server_selection_timeout_ms', 5000),
+                                    socket_timeout_ms=mongo_config.get('socket_timeout_ms'),
+                                    wait_queue_timeout_ms=mongo_config.get('wait_queue_timeout_ms'))
+        if not await self.mongo.ping():
+            logger.warning(f"{self.mongo} 暂不可用，将在首次访问时重试")
+
+    async def __init__mongo_indexes(self):
+        """创建各 manager 声明的 Mongo 索引，可选地检查已注册查询的执行计划"""
+        await self.mongo.ensure_indexes()
+        if self.config['mongo'].get('explain_on_startup', False):
+            report = await self.mongo.explain_queries()
+            collscans = [item['name'] for item in report if item['collscan']]
+            if collscans:
+                logger.warning(f"以下 Mongo 查询未命中索引: {collscans}")
 
     def __init__redis(self):
         self.redis = RedisManager(ip=self.config['redis']['ip'], port=self.config['redis']['port'],
@@ -99,47 +154,247 @@ class Application(FastAPI):
         self.mysql = MySQLManager(host=self.config['mysql']['ip'], port=self.config['mysql']['port'],
                                   db=self.config['mysql']['db'], user=self.config['mysql']['user'], password=self.config['mysql']['password'])
 
-    def __init__postgresql(self):
-        self.postgresql = PostgreSQLManager(ip=self.config['postgresql']['ip'], port=self.config['postgresql']['port'],
-                                            db=self.config['postgresql']['db'], user=self.config['postgresql']['user'], password=self.config['postgresql']['password'])
+    async def __init__postgresql(self):
+        pg_config = self.config['postgresql']
+        self.postgresql = PostgreSQLManager(ip=pg_config['ip'], port=pg_config['port'], db=pg_config['db'],
+                                            user=pg_config['user'], password=pg_config['password'],
+                                            min_size=pg_config.get('pool_min_size', 2),
+                                            max_size=pg_config.get('pool_max_size', 10),
+                                            timeout=pg_config.get('pool_timeout', 10),
+                                            max_idle=pg_config.get('pool_max_idle', 600))
+        await self.postgresql.connect()
+
+    def __init__http_client(self):
+        """创建共享的 HTTP 客户端并注入给 LLM 工具，同时为工具结果缓存启用 Redis"""
+        http_config = self.config.get('http', {})
+        self.http = HttpClient(timeout=http_config.get('timeout', 10),
+                               connect_timeout=http_config.get('connect_timeout', 3),
+                               max_connections=http_config.get('max_connections', 100),
+                               max_keepalive_connections=http_config.get('max_keepalive_connections', 20),
+                               keepalive_expiry=http_config.get('keepalive_expiry', 30),
+                               retries=http_config.get('retries', 2),
+                               backoff=http_config.get('backoff', 0.2),
+                               http2=http_config.get('http2', True))
+        self.http.start()
+        set_http_client(self.http)
+        tool_cache_config = self.config.get('ai', {}).get('tool_cache', {})
+        configure_tool_caches(redis=self.redis,
+                              location_ttl=tool_cache_config.get('location_ttl_seconds'),
+                              weather_ttl=tool_cache_config.get('weather_ttl_seconds'),
+                              negative_ttl=tool_cache_config.get('negative_ttl_seconds'))
+
+    async def __close_http_client(self):
+        if getattr(self, 'http', None) is not None:
+            set_http_client(None)
+            await self.http.close()
+
+    def __init_rag(self):
+        """博客检索索引；未启用时 search_blog 工具返回提示，新增博客也不写索引"""
+        rag_config = self.config.get('ai', {}).get('rag', {})
+        if not rag_config.get('enabled', True):
+            self.rag = None
+            return
+        self.rag = BlogRetriever(index_dir=rag_config.get('index_dir', 'data/rag_index'),
+                                 embedder=HashingEmbedder(dim=rag_config.get('dim', 512)),
+                                 chunk_size=rag_config.get('chunk_size', 500),
+                                 chunk_overlap=rag_config.get('chunk_overlap', 80),
+                                 top_k=rag_config.get('top_k', 4),
+                                 min_score=rag_config.get('min_score', 0.1))
+        set_blog_retriever(self.rag)
+
+    async def __sync_rag_index(self):
+        """启动后补齐索引中缺少的博客"""
+        # 与其他 MySQL 调用一样在事件循环线程中执行：pymysql 连接不是线程安全的，不能放到线程池里与请求并发使用
+        await self.rag.sync(self.blog.list_blog_ids(), self.blog.iter_blogs_content)
 
     async def __init__ai_manager(self):
         """初始化 AI Manager（异步）"""
-        from urllib.parse import quote_plus
-        db_user = self.config['postgresql']['user']
-        db_password = self.config['postgresql']['password']
-        db_host = self.config['postgresql']['ip']
-        db_port = self.config['postgresql']['port']
-        db_name = self.config['postgresql']['db']
-        safe_password = quote_plus(db_password)
-        DB_URI = f"postgresql://{db_user}:{safe_password}@{db_host}:{db_port}/{db_name}?sslmode=disable"
-
-        # 创建 checkpointer 上下文管理器并手动进入
-        checkpointer_context = AsyncPostgresSaver.from_conn_string(DB_URI)
-        checkpointer = await checkpointer_context.__aenter__()
-        await checkpointer.setup()
-
-        # 保存 checkpointer 和上下文管理器，以便在关闭时清理
-        self._ai_checkpointer = checkpointer
-        self._ai_checkpointer_context = checkpointer_context
-        self.ai = AiManager(checkpointer=checkpointer)
+        # 配置了 ai.checkpointer_pool 时为 checkpointer 单独建连接池，否则共享应用的 PostgreSQL 连接池
+        pool_config = self.config.get('ai', {}).get('checkpointer_pool')
+        if pool_config:
+            pg_config = self.config['postgresql']
+            self._ai_checkpointer_db = PostgreSQLManager(ip=pg_config['ip'], port=pg_config['port'],
+                                                         db=pg_config['db'], user=pg_config['user'],
+                                                         password=pg_config['password'],
+                                                         min_size=pool_config.get('min_size', 2),
+                                                         max_size=pool_config.get('max_size', 20),
+                                                         timeout=pool_config.get('timeout', 10),
+                                                         max_idle=pool_config.get('max_idle', 600),
+                                                         name='ai_checkpointer')
+            # 连接在后台建立，不阻塞启动
+            await self._ai_checkpointer_db.connect(wait=False)
+        else:
+            self._ai_checkpointer_db = self.postgresql
+        metrics.register_gauge('ai.checkpointer_pool', self.__checkpointer_pool_stats)
+
+        # checkpointer 的创建和建表迁移放到后台任务中，AiManager 在第一次创建 agent 前等待其完成
+        self._ai_checkpointer_ready = asyncio.create_task(self.__setup_checkpointer(),
+                                                          name='ai_checkpointer_setup')
+        limit_config = self.config.get('ai', {}).get('limits', {})
+        retention_config = self.config.get('ai', {}).get('checkpoint_retention', {})
+        usage_config = self.config.get('ai', {}).get('usage', {})
+        self.checkpoint_retention = CheckpointRetention(
+            db=self._ai_checkpointer_db,
+            keep_last=retention_config.get('keep_last', 20),
+            idle_ttl_seconds=retention_config.get('idle_ttl_days', 30) * 86400,
+            batch_size=retention_config.get('batch_size', 200),
+            min_idle_seconds=retention_config.get('min_idle_seconds', 300))
+        self.ai = AiManager(checkpointer_ready=self._ai_checkpointer_ready, retention=self.checkpoint_retention,
+                            context_config=self.config.get('ai', {}).get('context'),
+                            answer_cache=self.__build_answer_cache(),
+                            limiters=ModelLimiters(default=limit_config.get('default'),
+                                                   models=limit_config.get('models')),
+                            sse=self.__build_sse_streamer(),
+                            hedge_config=self.config.get('ai', {}).get('hedge'),
+                            images=self.__build_image_preparer(),
+                            usage=UsageAccounting(db=self.postgresql if usage_config.get('enabled', True) else None,
+                                                  bucket_seconds=usage_config.get('bucket_seconds', 3600)))
         logger.info("AI Manager 初始化成功")
 
+    async def __setup_checkpointer(self):
+        """创建 checkpointer 并执行建表迁移，返回 checkpointer"""
+        with metrics.timer('startup.checkpointer_setup_ms'):
+            from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+            # checkpointer 每次读写从连接池借出连接，多个会话之间不再争用同一条连接
+            checkpointer = AsyncPostgresSaver(conn=self._ai_checkpointer_db.pool)
+            await checkpointer.setup()
+        self._ai_checkpointer = checkpointer
+        logger.info("AI checkpointer 就绪")
+        return checkpointer
+
+    def __build_answer_cache(self):
+        cache_config = self.config.get('ai', {}).get('answer_cache', {})
+        if not cache_config.get('enabled', False):
+            return None
+        # 相似问题匹配复用博客检索的向量化，阈值由向量化后端决定；本地哈希向量化分不清含义不同的相近问题，不启用
+        embedder = self.rag.embedder if cache_config.get('semantic') and self.rag else None
+        if embedder is not None and embedder.similarity_threshold is None:
+            logger.warning(f"向量化后端 {embedder.name} 不支持相似问题匹配，回答缓存只做精确匹配")
+            embedder = None
+        return AnswerCache(cache=self.redis, model_name=TEST_MODEL, system_prompt=SYSTEM_PROMPT,
+                           ttl=cache_config.get('ttl_seconds', 86400),
+                           similarity_threshold=embedder.similarity_threshold if embedder else 1.0,
+                           max_candidates=cache_config.get('max_candidates', 500),
+                           bypass_patterns=cache_config.get('bypass_patterns', DEFAULT_BYPASS_PATTERNS),
+                           embedder=embedder.embed_query if embedder else None)
+
+    def __build_image_preparer(self) -> ImagePreparer:
+        image_config = self.config.get('ai', {}).get('image', {})
+        images = ImagePreparer(images_dir=self.config.get('file', {}).get('images_dir'),
+                               public_url_prefix=image_config.get('public_url_prefix'),
+                               max_side=image_config.get('max_side', 1024),
+                               max_fetch_bytes=image_config.get('max_fetch_mb', 10) * 1024 * 1024,
+                               jpeg_quality=image_config.get('jpeg_quality', 85),
+                               payload_ttl=image_config.get('payload_ttl_seconds', 86400),
+                               answer_ttl=image_config.get('answer_ttl_seconds', 7 * 86400))
+        images.bind_redis(self.redis)
+        return images
+
+    def __build_sse_streamer(self) -> SSEStreamer:
+        sse_config = self.config.get('ai', {}).get('sse', {})
+        return SSEStreamer(max_delay=sse_config.get('max_delay_ms', 50) / 1000,
+                           max_bytes=sse_config.get('max_bytes', 512),
+                           heartbeat=sse_config.get('heartbeat_seconds', 15),
+                           queue_size=sse_config.get('queue_size', 64))
+
+    def __checkpointer_pool_stats(self) -> dict:
+        stats = self._ai_checkpointer_db.pool_stats()
+        requests = stats.get('requests_num', 0)
+        stats['avg_wait_ms'] = round(stats.get('requests_wait_ms', 0) / requests, 3) if requests else 0.0
+        return stats
+
     async def __cleanup_ai_manager(self):
         """清理 AI Manager 资源（异步）"""
-        if not hasattr(self, '_ai_checkpointer_context'):
+        ready = getattr(self, '_ai_checkpointer_ready', None)
+        if ready is not None and not ready.done():
+            ready.cancel()
+        checkpointer_db = getattr(self, '_ai_checkpointer_db', None)
+        if checkpointer_db is None:
             logger.debug("AI Manager checkpointer 未初始化，跳过清理")
             return
 
-        if self._ai_checkpointer_context:
+        # 共享的连接池由 shut_down 统一关闭
+        if checkpointer_db is not self.postgresql:
+            await checkpointer_db.close()
+            logger.info("AI Manager checkpointer 连接池已关闭")
+
+    def __start_background_task(self, coro, name: str):
+        """启动一个随应用生命周期运行的后台任务"""
+        task = asyncio.create_task(coro, name=name)
+        self._background_tasks.append(task)
+        logger.info(f"后台任务 {name} 已启动")
+
+    def __start_background_tasks(self):
+        outbox_config = self.config.get('blog', {}).get('outbox', {})
+        self.__start_background_task(
+            self.blog.run_outbox_reconciler(interval=outbox_config.get('interval_seconds', 30),
+                                            batch_size=outbox_config.get('batch_size', 100),
+                                            max_attempts=outbox_config.get('max_attempts', 5),
+                                            min_age_seconds=outbox_config.get('min_age_seconds', 30)),
+            name='blog_outbox_reconciler')
+        view_config = self.config.get('blog', {}).get('views', {})
+        self.__start_background_task(
+            self.views.run_flush_loop(interval=view_config.get('flush_interval_seconds', 60)),
+            name='blog_view_flusher')
+        stats_config = self.config.get('blog', {}).get('stats', {})
+        self.__start_background_task(
+            self.base.run_recompute_loop(interval=stats_config.get('recompute_interval_seconds', 600)),
+            name='site_stats_recompute')
+        retention_config = self.config.get('ai', {}).get('checkpoint_retention', {})
+        if retention_config.get('enabled', True):
+            self.__start_background_task(
+                self.__after_checkpointer_ready(self.checkpoint_retention.run_retention_loop(
+                    interval=retention_config.get('interval_seconds', 3600))),
+                name='ai_checkpoint_retention')
+        if self.rag is not None:
+            self.__start_background_task(self.__sync_rag_index(), name='rag_index_sync')
+        usage_config = self.config.get('ai', {}).get('usage', {})
+        if usage_config.get('enabled', True):
+            self.__start_background_task(
+                self.ai.usage.run_flush_loop(interval=usage_config.get('flush_interval_seconds', 60)),
+                name='ai_usage_rollup')
+        if self.config.get('ai', {}).get('warmup_on_startup', True):
+            self.__start_background_task(self.ai.warmup(), name='ai_warmup')
+
+    async def __after_checkpointer_ready(self, coro):
+        """等 checkpoint 表创建完成后再运行 coro"""
+        try:
+            await self._ai_checkpointer_ready
+        except Exception:
+            coro.close()
+            raise
+        await coro
+
+    async def __stop_background_tasks(self):
+        for task in getattr(self, '_background_tasks', []):
+            task.cancel()
+        for task in getattr(self, '_background_tasks', []):
             try:
-                await self._ai_checkpointer_context.__aexit__(None, None, None)
-                logger.info("AI Manager checkpointer 已关闭")
+                await task
+            except asyncio.CancelledError:
+                pass
             except Exception as e:
-                logger.error(f"关闭 AI Manager checkpointer 失败: {e}")
+                logger.error(f"后台任务 {task.get_name()} 退出异常: {e}")
+        self._background_tasks = []
+
+    def __init_view_manager(self):
+        view_config = self.config.get('blog', {}).get('views', {})
+        self.views = ViewManager(db=self.mysql, cache=self.redis,
+                                 dedup_window=view_config.get('dedup_window_seconds', 1800),
+                                 flush_batch_size=view_config.get('flush_batch_size', 500),
+                                 stats=self.base,
+                                 base_ttl=view_config.get('base_ttl_seconds', 3600))
+        self.views.ensure_flush_table()
 
     def __init_blog_manager(self):
-        self.blog = BlogManager(baseDB=self.mysql, contentDB=self.mongo)
+        codec_config = self.config['mongo'].get('content_compression', {})
+        codec = ContentCodec(codec=codec_config.get('codec', 'zstd'),
+                             threshold=codec_config.get('threshold', 4096),
+                             level=codec_config.get('level'),
+                             enabled=codec_config.get('enabled', False))
+        self.blog = BlogManager(baseDB=self.mysql, contentDB=self.mongo, codec=codec, views=self.views,
+                                stats=self.base, retriever=self.rag)
+        self.blog.ensure_outbox_table()
 
     def __init_user_manager(self):
         self.user = UserManager(db=self.mysql)
@@ -148,7 +403,7 @@ class Application(FastAPI):
         self.tag = TagManager(db=self.mysql)
 
     def __init_base_manager(self):
-        self.base = BaseManager(db=self.mysql)
+        self.base = BaseManager(db=self.mysql, cache=self.redis)
 
     def __init_role_manager(self):
         self.role = RoleManager(db=self.mysql)
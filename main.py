@@ -1,7 +1,10 @@
 # main.py
 from fastapi.responses import RedirectResponse
-from app_instance import app  # Import the app instance
-from src.routers import blog_router, base_router, user_router, resource_router, role_router, auth_router, ai_router, file_router
+from src.util.startup import startup
+with startup.step('import:app'):
+    from app_instance import app  # Import the app instance
+with startup.step('import:routers'):
+    from src.routers import blog_router, base_router, user_router, resource_router, role_router, auth_router, ai_router, file_router
 
 
 @app.get("/")
@@ -1,37 +1,126 @@
 import asyncio
-import json
-import os
-from typing import Optional
-from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional, Tuple
 from loguru import logger
-from langchain.chat_models import init_chat_model
-from langchain_core.messages import BaseMessage
 
-from src.llm.agent import TestAgent
-from src.llm.llm import LLM
-from src.llm.model.gemma import GemmaModel
+from src.controller.checkpoint_retention import CheckpointRetention
+from src.llm.answer_cache import AnswerCache
+from src.llm.image import ImagePreparer
+from src.llm.limiter import ModelLimiters
+from src.llm.model.registry import models
+from src.llm.usage import RequestUsage, UsageAccounting
+from src.util.metrics import metrics
+from src.util.ndjson import ndjson_stream
+from src.util.sse import SSEStreamer
+
+if TYPE_CHECKING:
+    from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+    from src.llm.agent import TestAgent
+
+# 并发限制按上游模型区分，名称与 registry.MODEL_SPECS 一致
+AGENT_MODEL = "mistral"
+IMAGE_MODEL = "gemma"
+VISION_MODEL = "qwen"
 
 
 class AiManager:
     def __init__(
         self,
-        checkpointer: Optional[AsyncPostgresSaver] = None,
+        checkpointer: Optional["AsyncPostgresSaver"] = None,
+        retention: Optional[CheckpointRetention] = None,
+        context_config: Optional[dict] = None,
+        answer_cache: Optional[AnswerCache] = None,
+        limiters: Optional[ModelLimiters] = None,
+        checkpointer_ready: Optional[Awaitable] = None,
+        sse: Optional[SSEStreamer] = None,
+        usage: Optional[UsageAccounting] = None,
+        hedge_config: Optional[dict] = None,
+        images: Optional[ImagePreparer] = None,
     ):
         """
         初始化 AI Manager
 
+        agent 和模型都在第一次使用（或 warmup）时才创建，langchain 的导入也随之推迟，不占用应用启动时间。
+
         Args:
-            base_url: AI API 的基础 URL，默认从环境变量 AI_URL 读取
-            api_key: API 密钥，默认从环境变量 OPENROUTER_API_KEY 读取
-            model: 模型名称，默认 "mistralai/devstral-2512:free"
-            model_provider: 模型提供商，默认 "mistralai"
+            checkpointer: 会话状态的持久化
+            retention: checkpoint 清理
+            context_config: 会话上下文策略（max_tokens / keep_tokens）
+            answer_cache: 回答缓存，None 表示不缓存
+            limiters: 各模型的并发限制
+            checkpointer_ready: 返回 checkpointer 的初始化任务（建表迁移等），创建 agent 前等待其完成并使用其结果
+            sse: 流式接口的分帧参数
+            usage: 用量核算（token、延迟、工具耗时），None 时只记录指标
+            hedge_config: agent 模型的对冲请求（enabled / fallback / quantile / min_delay_ms / max_delay_ms 等）
+            images: 识图接口的图片读取、缩放和缓存
         """
 
         self.checkpointer = checkpointer
-        self.agent = TestAgent(checkpointer)
-        self.image_agent = GemmaModel
+        self.checkpointer_ready = checkpointer_ready
+        self.retention = retention
+        self.context_config = context_config or {}
+        self.answer_cache = answer_cache
+        self.limiters = limiters or ModelLimiters()
+        self.sse = sse or SSEStreamer()
+        self.usage = usage or UsageAccounting()
+        self.hedge_config = hedge_config or {}
+        self.images = images or ImagePreparer()
+        self._agent: Optional["TestAgent"] = None
+        self._agent_lock = asyncio.Lock()
         logger.info("AI Manager 初始化成功")
 
+    def _build_agent(self) -> "TestAgent":
+        with metrics.timer("ai.agent_init_ms"):
+            from src.llm.agent import TestAgent
+            return TestAgent(self.checkpointer,
+                             max_context_tokens=self.context_config.get('max_tokens', 6000),
+                             keep_context_tokens=self.context_config.get('keep_tokens', 3000),
+                             model=self._build_chat_model())
+
+    def _build_chat_model(self):
+        """agent 使用的模型：配置了 hedge 时为主模型加备用模型的对冲请求"""
+        if not self.hedge_config.get('enabled'):
+            return models.get(AGENT_MODEL)
+        from src.llm.model.hedge import HedgedChatModel
+
+        fallback = self.hedge_config.get('fallback', 'mistral_img')
+        logger.info(f"agent 模型启用对冲请求: {AGENT_MODEL} -> {fallback}")
+        return HedgedChatModel(primary=models.get(AGENT_MODEL), fallback=models.get(fallback),
+                               primary_name=AGENT_MODEL, fallback_name=fallback,
+                               quantile=self.hedge_config.get('quantile', 0.9),
+                               min_delay=self.hedge_config.get('min_delay_ms', 1000) / 1000,
+                               max_delay=self.hedge_config.get('max_delay_ms', 8000) / 1000,
+                               default_delay=self.hedge_config.get('default_delay_ms', 3000) / 1000,
+                               min_samples=self.hedge_config.get('min_samples', 20),
+                               # 对冲请求同样受备用模型的并发限制，与 /ai/read-image 等接口共用名额
+                               fallback_limiter=self.limiters.get(fallback))
+
+    async def get_agent(self) -> "TestAgent":
+        """获取 agent，第一次调用时等待 checkpointer 就绪并创建"""
+        if self._agent is None:
+            async with self._agent_lock:
+                if self._agent is None:
+                    if self.checkpointer_ready is not None:
+                        self.checkpointer = await self.checkpointer_ready
+                    # 导入 langchain 和构建 agent 是同步的 CPU 开销，放到线程中执行，避免阻塞事件循环
+                    self._agent = await asyncio.to_thread(self._build_agent)
+                    logger.info("AI agent 已创建")
+        return self._agent
+
+    @staticmethod
+    async def _get_model(name: str):
+        if name in models.loaded():
+            return models.get(name)
+        return await asyncio.to_thread(models.get, name)
+
+    async def warmup(self):
+        """预先创建 agent 和各模型，供启动后在后台调用，避免首个请求承担初始化开销"""
+        try:
+            await self.get_agent()
+            for name in (IMAGE_MODEL, VISION_MODEL):
+                await self._get_model(name)
+        except Exception as e:
+            logger.error(f"AI 预热失败: {e}")
+
     async def invoke(self, message: str, config: dict):
         """
         调用 AI 模型，一次性返回完整结果
@@ -43,28 +132,158 @@ class AiManager:
         Returns:
             AI 响应字典
         """
-        if self.agent is None:
-            raise RuntimeError("AI 模型未初始化，请检查配置")
+        agent = await self.get_agent()
+        usage, config = self._track("chat", AGENT_MODEL, config)
+        error = False
+        try:
+            # 只有会话首轮、与个人信息无关的问题才查缓存：后续轮次的回答依赖上下文
+            cacheable = await self._is_cacheable(agent, message, config)
+            if cacheable:
+                answer = self.answer_cache.lookup(message)
+                if answer is not None:
+                    usage.cache_hit = True
+                    await agent.append_turn(message, answer, config)
+                    return answer
+
+            async with self.limiters.slot(AGENT_MODEL, self._user_key(config)):
+                result = await agent.run(message, config=config)
+            answer = result.get("messages")[-1].content
+            # 调用了工具的回答依赖实时数据，不缓存
+            if cacheable and isinstance(answer, str) and not agent.used_tools(result.get("messages")):
+                self.answer_cache.store(message, answer)
+            return answer
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.usage.finish(usage, error=error)
+
+    def _track(self, endpoint: str, model: str, config: dict) -> Tuple[RequestUsage, dict]:
+        """开始核算一次请求，返回用量记录和挂上用量回调的 config"""
+        from src.llm.callbacks import UsageCallbackHandler
+
+        usage = self.usage.start(endpoint, model, config)
+        callbacks = [*config.get("callbacks", []), UsageCallbackHandler(usage)]
+        return usage, {**config, "callbacks": callbacks}
 
-        return await self.agent.invoke(message, config=config)
+    @staticmethod
+    def _user_key(config: dict) -> str:
+        """并发排队时区分用户的标识；ip 由路由层按连接地址取得（get_client_ip），客户端无法通过请求头伪造"""
+        configurable = config.get("configurable", {})
+        return f"{configurable.get('user_id')}|{configurable.get('ip')}"
+
+    async def _is_cacheable(self, agent: "TestAgent", message: str, config: dict) -> bool:
+        if self.answer_cache is None:
+            return False
+        if self.answer_cache.should_bypass(message) or await agent.has_history(config):
+            metrics.incr("ai.answer_cache.bypass")
+            return False
+        return True
 
     async def invoke_stream(self, message: str, config: dict):
         """
         调用 AI 模型，按 token 流式返回
 
+        先排队获取调用名额再返回生成器，拿不到名额时在响应开始前抛出 LimiterRejected；
+        名额在流结束、客户端断开或生成器未被迭代就关闭（回收）时归还。
+
+        Args:
+            message: 用户消息
+            config: 配置
+
+        Returns:
+            异步生成器，产出文本内容字符串（按 token）
+        """
+        agent = await self.get_agent()
+        limiter = self.limiters.get(AGENT_MODEL)
+        await limiter.acquire(self._user_key(config))
+        try:
+            usage, config = self._track("chat_stream", AGENT_MODEL, config)
+            return await self._started(self._stream(agent, limiter, usage, message, config))
+        except BaseException:
+            limiter.release()
+            raise
+
+    async def invoke_sse(self, message: str, config: dict,
+                         is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None):
+        """
+        调用 AI 模型，返回 SSE 帧流
+
+        token 按时间和大小合并成帧，空闲时发送心跳；客户端断开时取消上游生成并归还调用名额。
+
+        Args:
+            message: 用户消息
+            config: 配置
+            is_disconnected: 检测客户端是否断开，一般传 request.is_disconnected
+
+        Returns:
+            异步生成器，产出 SSE 帧字符串
+        """
+        return self.sse.stream(await self.invoke_stream(message, config), is_disconnected)
+
+    async def invoke_ndjson(self, message: str, config: dict):
+        """
+        调用 AI 模型，以 NDJSON 返回结构化事件（token / tool_start / tool_end / usage / done）
+
+        与 invoke_stream 一样先获取调用名额，名额在流结束（或客户端断开）时归还。
+
         Args:
             message: 用户消息
             config: 配置
 
-        Yields:
-            文本内容字符串（按 token）
+        Returns:
+            异步生成器，每次产出一行编码好的 NDJSON
+        """
+        agent = await self.get_agent()
+        limiter = self.limiters.get(AGENT_MODEL)
+        await limiter.acquire(self._user_key(config))
+        try:
+            usage, config = self._track("chat_ndjson", AGENT_MODEL, config)
+            return ndjson_stream(await self._started(self._events(agent, limiter, usage, message, config)))
+        except BaseException:
+            limiter.release()
+            raise
+
+    @staticmethod
+    async def _started(generator):
+        """
+        把持有调用名额的生成器推进到开头的占位 yield 后返回
+
+        未启动的异步生成器被关闭或回收时不会执行 finally，名额就永远不会归还
+        （例如客户端在 StreamingResponse 取第一块之前断开）；推进之后 finally 已经生效，
+        aclose() 或被事件循环回收时都会归还名额。
         """
-        if self.agent is None:
-            raise RuntimeError("AI 模型未初始化，请检查配置")
+        await anext(generator)
+        return generator
 
-        # ✅ 正确写法：迭代底层生成器并逐个向上层 yield
-        async for chunk in self.agent.invoke_stream(message, config=config):
-            yield chunk
+    async def _events(self, agent: "TestAgent", limiter, usage: RequestUsage, message: str, config: dict):
+        error = False
+        try:
+            yield None  # 占位，见 _started
+            async for event in agent.stream_events(message, config=config):
+                if event["type"] == "token":
+                    usage.mark_first_token()
+                yield event
+        except Exception:
+            error = True
+            raise
+        finally:
+            limiter.release()
+            self.usage.finish(usage, error=error)
+
+    async def _stream(self, agent: "TestAgent", limiter, usage: RequestUsage, message: str, config: dict):
+        error = False
+        try:
+            yield None  # 占位，见 _started
+            async for chunk in agent.invoke_stream(message, config=config):
+                usage.mark_first_token()
+                yield chunk
+        except Exception:
+            error = True
+            raise
+        finally:
+            limiter.release()
+            self.usage.finish(usage, error=error)
 
     async def generate_image(self, message: str, config: dict):
         """
@@ -74,11 +293,81 @@ class AiManager:
             message: 用户消息
             config: 配置
 
-        Yields:
-            SSE 格式的数据块（data: {...}\n\n）
+        Returns:
+            模型返回的内容
         """
-        if self.agent is None:
-            raise RuntimeError("AI 模型未初始化，请检查配置")
         logger.info(f"generate_image: {message}, config: {config}")
-        response = await self.image_agent.ainvoke({"messages": [{"role": "user", "content": message}]})
-        return response.content
+        return await self._invoke_model(IMAGE_MODEL, "generate_image", message, config)
+
+    async def read_image(self, uri: str, config: dict, question: str = "What is in this image?"):
+        """
+        调用视觉模型识别图片内容
+
+        图片由服务端读取（本站图片读本地文件）并缩放后以 data URI 发给模型；
+        同一张图片（按内容哈希）对同一问题的回答直接从缓存返回。
+
+        Args:
+            uri: 图片地址
+            config: 配置
+            question: 对图片的提问
+
+        Returns:
+            模型的回答
+        """
+        digest, payload = await self.images.prepare(uri)
+        key = self.images.answer_key(digest, VISION_MODEL, question)
+        answer = self.images.answer_cache.get(key)
+        if isinstance(answer, str):
+            usage = self.usage.start("read_image", VISION_MODEL, config)
+            usage.cache_hit = True
+            self.usage.finish(usage)
+            return answer
+
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": question},
+                    {"type": "image_url", "image_url": {"url": payload}},
+                ]
+            }
+        ]
+        answer = await self._invoke_model(VISION_MODEL, "read_image", messages, config)
+        if isinstance(answer, str) and answer:
+            self.images.answer_cache.set(key, answer)
+        return answer
+
+    async def _invoke_model(self, name: str, endpoint: str, messages, config: dict):
+        """在并发限制和用量核算下直接调用单个模型"""
+        model = await self._get_model(name)
+        usage, model_config = self._track(endpoint, name, config)
+        error = False
+        try:
+            async with self.limiters.slot(name, self._user_key(config)):
+                response = await model.ainvoke(messages, config={"callbacks": model_config["callbacks"]})
+            return response.content
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.usage.finish(usage, error=error)
+
+    def get_metrics(self) -> dict:
+        """
+        AI 相关的运行指标（checkpointer 连接池等）
+
+        Returns:
+            指标快照字典
+        """
+        return metrics.snapshot()
+
+    async def get_checkpoint_report(self) -> dict:
+        """
+        checkpoint 表的体积、行数和上一轮清理结果
+
+        Returns:
+            报告字典，未配置清理时返回空字典
+        """
+        if self.retention is None:
+            return {}
+        return await self.retention.report()
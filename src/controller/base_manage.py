@@ -1,47 +1,36 @@
-from typing import List, Union
-import uuid
-from datetime import datetime
+import asyncio
+from typing import Optional
 
-from bson import ObjectId
 from loguru import logger
-from pymongo.cursor import Cursor
-from src.database.mongo.mongodb_manage import MongoDBManager
 from src.database.mysql.mysql_manage import MySQLManager
-from src.type.blog_type import Blog, BlogBase, BlogCreate, TagNew
+from src.database.redis.redis_manage import RedisManager
 from src.type.type import BlogStats
 
+STATS_KEY = "stats:site"
+STATS_FIELDS = ("blog_count", "category_count", "tag_count", "total_view_num")
 
 
 class BaseManager:
-    def __init__(self,db:MySQLManager):
+    def __init__(self, db: MySQLManager, cache: Optional[RedisManager] = None):
+        """
+        Args:
+            db: MySQL 连接
+            cache: Redis 连接，提供时统计数据以快照形式存放在 Redis 中，由写路径增量维护
+        """
         self.db = db
-    
+        self.cache = cache
+
     def get_base_info(self) -> BlogStats:
         """
         获取博客的统计信息，包括文章数、种类数、标签数和总浏览量。
+        优先读取 Redis 快照，快照缺失或不完整时全量重算一次。
         """
         try:
-            logger.info("获取博客统计信息---执行sql")
-            
-            # 文章总数
-            blog_count = self.db.execute("SELECT COUNT(*) AS count FROM blog")[0].get("count", 0)
-
-            # 种类总数
-            category_count = self.db.execute("SELECT COUNT(*) AS count FROM category")[0].get("count", 0)
-
-            # 标签总数
-            tag_count = self.db.execute("SELECT COUNT(*) AS count FROM tag")[0].get("count", 0)
-
-            # 总浏览量（目前先置为0，可以后续修改为实际计算总和）
-            total_view_num = self.db.execute("SELECT SUM(view_num) AS total FROM blog")[0].get("total", 0) or 0
-            
-            # 返回正确格式的 JSON 数据
-            return BlogStats(
-                blog_count=blog_count,
-                category_count=category_count,
-                tag_count=tag_count,
-                total_view_num=total_view_num
-            )
+            if self.cache:
+                snapshot = self.cache.hgetall(STATS_KEY)
+                if all(field in snapshot for field in STATS_FIELDS):
+                    return BlogStats(**{field: int(snapshot[field]) for field in STATS_FIELDS})
+            return self.recompute()
         except Exception as e:
             logger.error(f"获取博客统计信息失败: {e}")
             # 异常情况下返回默认值
@@ -52,4 +41,42 @@ class BaseManager:
                 total_view_num=0
             )
 
+    def recompute(self) -> BlogStats:
+        """
+        用一条 SQL 全量统计，并覆盖 Redis 中的快照（用于初始化和纠正增量误差）
+        """
+        logger.info("获取博客统计信息---执行sql")
+        row = self.db.fetch_one("""
+            SELECT
+                (SELECT COUNT(*) FROM blog) AS blog_count,
+                (SELECT COUNT(*) FROM category) AS category_count,
+                (SELECT COUNT(*) FROM tag) AS tag_count,
+                (SELECT COALESCE(SUM(view_num), 0) FROM blog) AS total_view_num
+        """)
+        if row is None:
+            raise RuntimeError("统计查询失败")
+        stats = BlogStats(**{field: int(row[field] or 0) for field in STATS_FIELDS})
+        if self.cache:
+            self.cache.hset_mapping(STATS_KEY, stats.model_dump(), ttl=None)
+        return stats
+
+    def incr_stat(self, field: str, delta: int = 1) -> None:
+        """
+        增量更新快照中的某一项，供博客/标签/分类的创建删除以及浏览量写回调用；
+        失败只记录日志，由定期重算纠正
+        """
+        if not self.cache or not delta:
+            return
+        try:
+            self.cache.hincrby(STATS_KEY, field, delta)
+        except Exception as e:
+            logger.warning(f"更新统计快照 {field} 失败: {e}")
 
+    async def run_recompute_loop(self, interval: float = 600) -> None:
+        """后台定期全量重算统计快照，直到任务被取消"""
+        while True:
+            try:
+                self.recompute()
+            except Exception as e:
+                logger.error(f"统计快照重算失败: {e}")
+            await asyncio.sleep(interval)
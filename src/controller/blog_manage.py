@@ -1,25 +1,48 @@
-from typing import Any, Dict, List, Union
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
 import uuid
 from datetime import datetime
 
 from bson import ObjectId
 from loguru import logger
-from pymongo.cursor import Cursor
+from pymongo import ASCENDING, UpdateOne
+from src.database.mongo.content_codec import CODEC_FIELD, RAW_SIZE_FIELD, ContentCodec
 from src.database.mongo.mongodb_manage import MongoDBManager
 from src.database.mysql.mysql_manage import MySQLManager
+from src.controller.base_manage import BaseManager
+from src.controller.view_manager import ViewManager
+from src.llm.rag import BlogRetriever
 from src.type.blog_type import Blog, BlogBase, BlogCreate, TagNew
 
+# blogs 集合的字段投影：详情只取构造 Blog 需要的字段，摘要类查询永远不取 content
+BLOG_DETAIL_PROJECTION = {"_id": 0, "blogId": 1, "title": 1, "content": 1, CODEC_FIELD: 1}
+BLOG_SUMMARY_PROJECTION = {"_id": 0, "blogId": 1, "title": 1}
 
 
 class BlogManager:
-    def __init__(self,baseDB:MySQLManager, contentDB: MongoDBManager):
+    def __init__(self,baseDB:MySQLManager, contentDB: MongoDBManager, codec: Optional[ContentCodec] = None,
+                 views: Optional[ViewManager] = None, stats: Optional[BaseManager] = None,
+                 retriever: Optional[BlogRetriever] = None):
         self.db = baseDB
         self.contentDB = contentDB
+        self.views = views
+        self.stats = stats
+        # 博客检索索引，新增博客后增量写入
+        self.retriever = retriever
+        # 正文编解码，默认不压缩但仍能读取已压缩的文档
+        self.codec = codec or ContentCodec(codec="zlib", enabled=False)
+        self.register_content_indexes()
 
-    def get_or_create_tag(self, tag: Union[str, TagNew],blog_id:str) -> int:
-        """检查标签是否存在，不存在则创建"""
+    def register_content_indexes(self):
+        """声明 blogs 集合的索引和需要检查执行计划的查询，新增查询/排序字段时在这里补充"""
+        self.contentDB.register_index("blogs", [("blogId", ASCENDING)], unique=True, name="uniq_blogId")
+        self.contentDB.register_query("blog_by_id", "blogs", {"blogId": 1}, projection=BLOG_DETAIL_PROJECTION)
 
-        if isinstance(tag, str):
+    def get_or_create_tag(self, tag: Union[str, TagNew],blog_id:str, created: Optional[List[int]] = None) -> int:
+        """检查标签是否存在，不存在则创建；新建的标签 ID 会追加到 created 中"""
+
+        if isinstance(tag, (int, str)):
             # 已有标签，直接返回 ID
             logger.info('已有id',tag)
             id =  tag
@@ -27,13 +50,16 @@ class BlogManager:
             # 查询是否存在该标签
             tag_name = tag.name.strip() 
             sql = "SELECT id FROM tag WHERE name = %s"
-            id = self.db.fetch_one(sql, tag_name)
+            row = self.db.fetch_one(sql, tag_name)
+            id = row["id"] if row else None
             if id is None:
                 create_sql = """
                     INSERT INTO tag (name) VALUES (%s)
                 """
                 # 不存在，插入新标签
                 id = self.db.execute(create_sql, tag_name)
+                if created is not None:
+                    created.append(id)
         # 插入博客标签关联表
         if id:
             # 插入 blog_tag 关系表
@@ -42,41 +68,156 @@ class BlogManager:
         return id
             
         
-    def add_blog(self, blog: BlogCreate) -> str:
+    async def add_blog(self, blog: BlogCreate) -> str:
         """
         添加一个博客,返回生成的唯一ID。
 
+        元数据、标签和一条 outbox 写入意图在同一个 MySQL 事务中提交，随后写 Mongo 正文并清除意图；
+        Mongo 写入失败时意图保留，由 reconcile_outbox 在后台重试或清理，请求路径上不做补偿删除。
+
         Args:
             blog (Blog): 博客对象
 
         Returns:
             str: 插入后的文档的 ID
         """
-        # return self.contentDB.insert_one("blogs", blog.model_dump())
-        
         sql = """
         INSERT INTO blog (title, author, abstract,  category, updated_at, is_deleted)
         VALUES (%s, %s,  %s, %s, NOW(), 0)
         """
         params = (blog.title, blog.author, blog.abstract,  blog.category)
-        id = self.db.execute(sql, params) 
-        # logger.info(f'插入的结果{res}')
-         # 处理标签，确保所有 tag 都是 ID
-        tag_ids = [self.get_or_create_tag(tag,id) for tag in blog.tag]
-        # 将内容插入MongoDB记录
-        result = self.contentDB.insert_one("blogs", {"blogId": id, "title": blog.title, "content": blog.content})
+        created_tags = []
+        with self.db.transaction():
+            id = self.db.execute(sql, params)
+            # 处理标签，确保所有 tag 都是 ID
+            tag_ids = [self.get_or_create_tag(tag, id, created_tags) for tag in blog.tag]
+            payload = json.dumps({"blogId": id, "title": blog.title, "content": blog.content}, ensure_ascii=False)
+            outbox_id = self.db.execute("INSERT INTO blog_outbox (blog_id, payload) VALUES (%s, %s)", (id, payload))
+        if self.stats:
+            self.stats.incr_stat("blog_count", 1)
+            self.stats.incr_stat("tag_count", len(created_tags))
+        # 将内容写入MongoDB记录，按 blogId upsert，重试时幂等
+        result = await self.contentDB.update_one("blogs", {"blogId": id},
+                                                 {"title": blog.title, **self.codec.encode(blog.content)})
         if result:
-            return id
-        logger.error(f"Mongo content insert failed for blog_id={id}; rolling back MySQL metadata")
-        self.rollback_blog_metadata(id)
-        return None
+            try:
+                self.db.execute("DELETE FROM blog_outbox WHERE id = %s", (outbox_id,))
+            except Exception as e:
+                # 正文已写入，残留的意图会被 reconciler 识别并清除
+                logger.warning(f"Failed to clear outbox {outbox_id} for blog_id={id}: {e}")
+        else:
+            logger.warning(f"Mongo content write failed for blog_id={id}; left to outbox reconciler")
+        if self.retriever:
+            try:
+                await self.retriever.index_blog(id, blog.title, blog.content)
+            except Exception as e:
+                # 索引只影响检索，下次启动同步时会补齐
+                logger.warning(f"Failed to index blog_id={id} for retrieval: {e}")
+        return id
+
+    def ensure_outbox_table(self) -> None:
+        """创建 blog_outbox 表（记录 MySQL 与 Mongo 双写的待完成意图）"""
+        self.db.execute("""
+        CREATE TABLE IF NOT EXISTS blog_outbox (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            blog_id INT NOT NULL,
+            payload LONGTEXT NOT NULL,
+            status VARCHAR(16) NOT NULL DEFAULT 'pending',
+            attempts INT NOT NULL DEFAULT 0,
+            last_error VARCHAR(255) NULL,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            KEY idx_status_updated (status, updated_at)
+        ) DEFAULT CHARSET = utf8mb4
+        """)
+
+    async def reconcile_outbox(self, batch_size: int = 100, max_attempts: int = 5,
+                               min_age_seconds: int = 30) -> Dict[str, int]:
+        """
+        处理一批未完成的双写意图：已落到 Mongo 的直接清除，未落的批量重试，
+        超过最大重试次数的批量清理 MySQL 元数据并标记为 failed。
+
+        Args:
+            batch_size (int): 每批处理的意图数
+            max_attempts (int): 最大重试次数
+            min_age_seconds (int): 只处理超过该时长未更新的意图，避免与正在进行的请求竞争
+
+        Returns:
+            Dict[str, int]: 本批完成、重试失败、清理的数量
+        """
+        stats = {"applied": 0, "retrying": 0, "abandoned": 0}
+        rows = self.db.fetch_all(
+            "SELECT id, blog_id, payload, attempts FROM blog_outbox "
+            "WHERE status = 'pending' AND updated_at < NOW() - INTERVAL %s SECOND ORDER BY id LIMIT %s",
+            (min_age_seconds, batch_size))
+        if not rows:
+            return stats
+
+        abandoned = [row for row in rows if row["attempts"] >= max_attempts]
+        candidates = [row for row in rows if row["attempts"] < max_attempts]
+        blog_ids = [row["blog_id"] for row in candidates]
+
+        # 一次 $in 查询找出已写入的正文，其余的用一次 bulk_write 重试
+        existing = {doc["blogId"] for doc in await self.contentDB.find_in(
+            "blogs", "blogId", blog_ids, BLOG_SUMMARY_PROJECTION)}
+        missing = [row for row in candidates if row["blog_id"] not in existing]
+        if missing:
+            operations = []
+            for row in missing:
+                payload = json.loads(row["payload"])
+                operations.append(UpdateOne(
+                    {"blogId": row["blog_id"]},
+                    {"$set": {"title": payload["title"], **self.codec.encode(payload["content"])}},
+                    upsert=True))
+            await self.contentDB.bulk_write("blogs", operations)
+            existing |= {doc["blogId"] for doc in await self.contentDB.find_in(
+                "blogs", "blogId", [row["blog_id"] for row in missing], BLOG_SUMMARY_PROJECTION)}
+
+        applied = [row["id"] for row in candidates if row["blog_id"] in existing]
+        failed = [row["id"] for row in candidates if row["blog_id"] not in existing]
+        if applied:
+            self.db.execute(f"DELETE FROM blog_outbox WHERE id IN ({self._placeholders(applied)})", tuple(applied))
+        if failed:
+            self.db.execute(
+                "UPDATE blog_outbox SET attempts = attempts + 1, last_error = 'mongo write failed' "
+                f"WHERE id IN ({self._placeholders(failed)})", tuple(failed))
+        if abandoned:
+            await self._abandon_outbox(abandoned)
+
+        stats.update(applied=len(applied), retrying=len(failed), abandoned=len(abandoned))
+        logger.info(f"blog outbox reconciled: {stats}")
+        return stats
+
+    async def _abandon_outbox(self, rows: List[dict]) -> None:
+        """批量清理多次重试仍失败的博客元数据，并把意图标记为 failed 以便排查"""
+        outbox_ids = [row["id"] for row in rows]
+        blog_ids = [row["blog_id"] for row in rows]
+        await self.contentDB.delete_many("blogs", {"blogId": {"$in": blog_ids}})
+        with self.db.transaction():
+            self.db.execute(f"DELETE FROM blog_tag WHERE blog_id IN ({self._placeholders(blog_ids)})", tuple(blog_ids))
+            self.db.execute(f"DELETE FROM blog WHERE id IN ({self._placeholders(blog_ids)})", tuple(blog_ids))
+            self.db.execute(f"UPDATE blog_outbox SET status = 'failed' WHERE id IN ({self._placeholders(outbox_ids)})",
+                            tuple(outbox_ids))
+        if self.stats:
+            self.stats.incr_stat("blog_count", -len(blog_ids))
+        logger.error(f"Abandoned blog writes after retries, metadata removed: {blog_ids}")
 
-    def rollback_blog_metadata(self, blog_id: int) -> None:
-        try:
-            self.db.execute("DELETE FROM blog_tag WHERE blog_id = %s", (blog_id,))
-            self.db.execute("DELETE FROM blog WHERE id = %s", (blog_id,))
-        except Exception as e:
-            logger.error(f"Failed to roll back blog metadata for blog_id={blog_id}: {e}")
+    async def run_outbox_reconciler(self, interval: float = 30, batch_size: int = 100, **kwargs) -> None:
+        """后台循环执行 reconcile_outbox，直到任务被取消；一批处理满时不等待，直接处理下一批"""
+        while True:
+            backlog = False
+            try:
+                stats = await self.reconcile_outbox(batch_size=batch_size, **kwargs)
+                backlog = sum(stats.values()) >= batch_size
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"blog outbox reconcile failed: {e}")
+            await asyncio.sleep(0 if backlog else interval)
+
+    @staticmethod
+    def _placeholders(values: List[Any]) -> str:
+        return ", ".join(["%s"] * len(values))
 
     def delete_blog(self, blog_id: str) -> bool:
         """
@@ -94,9 +235,16 @@ class BlogManager:
         WHERE id = %s AND is_deleted = FALSE
         """
         result = self.db.execute(sql, (blog_id,))
+        if result > 0 and self.retriever:
+            self.retriever.remove_blog(int(blog_id))
         return result > 0
 
-    def get_blog(self, blog_id:int) -> Blog:
+    def list_blog_ids(self) -> List[int]:
+        """所有未删除博客的 ID"""
+        rows = self.db.fetch_all("SELECT id FROM blog WHERE is_deleted = 0 ORDER BY id")
+        return [row["id"] for row in rows]
+
+    async def get_blog(self, blog_id:int) -> Blog:
         """
         获取指定ID的博客。
 
@@ -106,11 +254,88 @@ class BlogManager:
         Returns:
             Blog: 博客对象，如果不存在则返回 None
         """
-        blog_data = self.contentDB.find_one("blogs", {"blogId": blog_id})
-        logger.info(f'查询到的结果{blog_id}{blog_data}')
+        blog_data = await self.contentDB.find_one("blogs", {"blogId": blog_id}, BLOG_DETAIL_PROJECTION)
+        logger.info(f'查询到博客 {blog_id}: {bool(blog_data)}')
         if blog_data:
-            return Blog(**blog_data)
+            return Blog(**self.codec.decode(blog_data))
         return None
+
+    async def get_blogs_content(self, blog_ids: List[int]) -> List[Blog]:
+        """
+        一次查询获取多篇博客的正文，按传入顺序返回，不存在的博客会被跳过。
+
+        Args:
+            blog_ids (List[int]): 博客 ID 列表
+
+        Returns:
+            List[Blog]: 博客对象列表
+        """
+        docs = await self.contentDB.find_in("blogs", "blogId", blog_ids, BLOG_DETAIL_PROJECTION)
+        return [Blog(**self.codec.decode(doc)) for doc in docs]
+
+    async def iter_blogs_content(self, blog_ids: List[int], batch_size: int = 500) -> AsyncIterator[Blog]:
+        """
+        流式获取大量博客的正文（导出、建索引等场景），每批 batch_size 篇。
+
+        Args:
+            blog_ids (List[int]): 博客 ID 列表
+            batch_size (int): 每批查询的博客数
+
+        Yields:
+            Blog: 按传入顺序逐篇返回的博客对象
+        """
+        async for doc in self.contentDB.find_in_batches("blogs", "blogId", blog_ids,
+                                                        batch_size=batch_size,
+                                                        projection=BLOG_DETAIL_PROJECTION):
+            yield Blog(**self.codec.decode(doc))
+
+    async def backfill_content_codec(self, batch_size: int = 200, dry_run: bool = False) -> Dict[str, int]:
+        """
+        按当前编解码配置压缩存量的未压缩正文，分批使用 bulk_write 回写。
+
+        Args:
+            batch_size (int): 每批处理的文档数
+            dry_run (bool): 只统计不写入
+
+        Returns:
+            Dict[str, int]: 扫描数、压缩数以及压缩前后的字节数
+        """
+        stats = {"scanned": 0, "compressed": 0, "raw_bytes": 0, "stored_bytes": 0}
+        cursor = self.contentDB.find("blogs", {CODEC_FIELD: {"$exists": False}}, batch_size=batch_size,
+                                     projection={"_id": 1, "content": 1})
+        pending = []
+        async for doc in cursor:
+            stats["scanned"] += 1
+            content = doc.get("content")
+            if not isinstance(content, str):
+                continue
+            encoded = self.codec.encode(content)
+            if CODEC_FIELD not in encoded:
+                continue
+            stats["compressed"] += 1
+            stats["raw_bytes"] += encoded[RAW_SIZE_FIELD]
+            stats["stored_bytes"] += len(encoded["content"])
+            pending.append(UpdateOne({"_id": doc["_id"], CODEC_FIELD: {"$exists": False}}, {"$set": encoded}))
+            if len(pending) >= batch_size:
+                if not dry_run:
+                    await self.contentDB.bulk_write("blogs", pending)
+                pending = []
+        if pending and not dry_run:
+            await self.contentDB.bulk_write("blogs", pending)
+        logger.info(f"正文压缩回填完成({'dry run' if dry_run else 'applied'}): {stats}")
+        return stats
+
+    async def get_blog_summary(self, blog_id: int) -> Optional[dict]:
+        """
+        获取指定ID博客在 Mongo 中的摘要信息，不读取正文。
+
+        Args:
+            blog_id (int): 博客的 ID
+
+        Returns:
+            Optional[dict]: {"blogId", "title"}，不存在则返回 None
+        """
+        return await self.contentDB.find_one("blogs", {"blogId": blog_id}, BLOG_SUMMARY_PROJECTION)
     
     
     def get_blog_by_page(self, page: int, page_size: int) -> Dict[str, Any]:
@@ -180,9 +405,13 @@ class BlogManager:
         total_count = self.db.count("blog")  # 统计总数
         # total_count = 10
         # logger.info(f'查询到的结果{blogs_data}')
+        blog_list = [BlogBase(**blog_data) for blog_data in blogs_data]
+        if self.views:
+            # 合并 Redis 中尚未写回的浏览量
+            self.views.merge_live_counts(blog_list)
         return {
             "total": total_count,
             "page": page,
             "page_size": page_size,
-            "list": [BlogBase(**blog_data) for blog_data in blogs_data]
+            "list": blog_list
         }
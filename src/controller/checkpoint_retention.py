@@ -0,0 +1,189 @@
+import asyncio
+from typing import Dict, List
+
+from loguru import logger
+from src.database.postgresql.postgresql_manager import PostgreSQLManager
+from src.util.metrics import metrics
+
+CHECKPOINT_TABLES = ("checkpoints", "checkpoint_writes", "checkpoint_blobs")
+# 线程最后一次写入的时间，取自 checkpoint 中的 ts 字段
+LAST_TS_SQL = "MAX((checkpoint->>'ts')::timestamptz)"
+
+
+class CheckpointRetention:
+    """
+    LangGraph checkpoint 表的保留策略
+
+    AsyncPostgresSaver 每轮对话都会写入新的 checkpoint，旧的从不删除。这里按两条规则清理：
+    1. 每个 thread_id（及 checkpoint_ns）只保留最新的 keep_last 个 checkpoint，
+       连同不再被引用的 checkpoint_writes 和 checkpoint_blobs；
+    2. 最后一次写入早于 idle_ttl_seconds 的线程整体删除。
+
+    两类清理都按 batch_size 个线程分批、每批一个事务执行；最近 min_idle_seconds 内有写入的线程不做裁剪，
+    避免和正在进行的对话争抢。删除只产生死元组，表空间由 autovacuum 回收，report() 中可以看到 n_dead_tup。
+    """
+
+    def __init__(self, db: PostgreSQLManager, keep_last: int = 20, idle_ttl_seconds: int = 30 * 86400,
+                 batch_size: int = 200, min_idle_seconds: int = 300):
+        """
+        Args:
+            db: checkpointer 使用的 PostgreSQL 连接池
+            keep_last: 每个线程保留的 checkpoint 数（至少为 1）
+            idle_ttl_seconds: 线程闲置超过该时长后整体删除，0 表示不按闲置删除
+            batch_size: 每批处理的线程数
+            min_idle_seconds: 最近有写入的线程不做裁剪的时间窗口
+        """
+        self.db = db
+        self.keep_last = max(1, keep_last)
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.batch_size = batch_size
+        self.min_idle_seconds = min_idle_seconds
+        self.last_run: Dict[str, object] = {}
+
+    async def prune_history(self) -> Dict[str, int]:
+        """
+        裁剪每个线程的历史 checkpoint，只保留最新的 keep_last 个
+
+        Returns:
+            各表删除的行数
+        """
+        reclaimed = dict.fromkeys(CHECKPOINT_TABLES, 0)
+        after = None
+        while True:
+            # checkpoint_id 为 uuid6，按字典序即按时间序；用 thread_id 游标翻页，避免重复扫描已处理的线程
+            rows = await self.db.fetch_all(f"""
+                SELECT thread_id FROM checkpoints
+                WHERE (%s::text IS NULL OR thread_id > %s)
+                GROUP BY thread_id
+                HAVING COUNT(*) > %s
+                   AND {LAST_TS_SQL} < now() - %s * interval '1 second'
+                ORDER BY thread_id
+                LIMIT %s
+            """, (after, after, self.keep_last, self.min_idle_seconds, self.batch_size))
+            thread_ids = [row["thread_id"] for row in rows]
+            if not thread_ids:
+                break
+            self._add(reclaimed, await self._prune_threads(thread_ids))
+            after = thread_ids[-1]
+            if len(thread_ids) < self.batch_size:
+                break
+        return reclaimed
+
+    async def _prune_threads(self, thread_ids: List[str]) -> Dict[str, int]:
+        async with self.db.transaction() as tx:
+            checkpoints = await tx.execute("""
+                DELETE FROM checkpoints c
+                USING (
+                    SELECT thread_id, checkpoint_ns, checkpoint_id,
+                           row_number() OVER (PARTITION BY thread_id, checkpoint_ns
+                                              ORDER BY checkpoint_id DESC) AS rn
+                    FROM checkpoints
+                    WHERE thread_id = ANY(%s)
+                ) ranked
+                WHERE ranked.rn > %s
+                  AND c.thread_id = ranked.thread_id
+                  AND c.checkpoint_ns = ranked.checkpoint_ns
+                  AND c.checkpoint_id = ranked.checkpoint_id
+            """, (thread_ids, self.keep_last))
+            writes = await tx.execute("""
+                DELETE FROM checkpoint_writes w
+                WHERE w.thread_id = ANY(%s)
+                  AND NOT EXISTS (SELECT 1 FROM checkpoints c
+                                  WHERE c.thread_id = w.thread_id
+                                    AND c.checkpoint_ns = w.checkpoint_ns
+                                    AND c.checkpoint_id = w.checkpoint_id)
+            """, (thread_ids,))
+            # blob 按 (channel, version) 被 checkpoint 的 channel_versions 引用，保留任一剩余 checkpoint 仍引用的版本
+            blobs = await tx.execute("""
+                DELETE FROM checkpoint_blobs b
+                WHERE b.thread_id = ANY(%s)
+                  AND NOT EXISTS (SELECT 1 FROM checkpoints c
+                                  WHERE c.thread_id = b.thread_id
+                                    AND c.checkpoint_ns = b.checkpoint_ns
+                                    AND c.checkpoint -> 'channel_versions' ->> b.channel = b.version)
+            """, (thread_ids,))
+        return {"checkpoints": checkpoints, "checkpoint_writes": writes, "checkpoint_blobs": blobs}
+
+    async def expire_idle_threads(self) -> Dict[str, int]:
+        """
+        删除闲置超过 idle_ttl_seconds 的线程
+
+        Returns:
+            各表删除的行数，另含删除的线程数 threads
+        """
+        reclaimed = dict.fromkeys(CHECKPOINT_TABLES, 0)
+        reclaimed["threads"] = 0
+        if not self.idle_ttl_seconds:
+            return reclaimed
+        while True:
+            rows = await self.db.fetch_all(f"""
+                SELECT thread_id FROM checkpoints
+                GROUP BY thread_id
+                HAVING {LAST_TS_SQL} < now() - %s * interval '1 second'
+                LIMIT %s
+            """, (self.idle_ttl_seconds, self.batch_size))
+            thread_ids = [row["thread_id"] for row in rows]
+            if not thread_ids:
+                break
+            async with self.db.transaction() as tx:
+                for table in CHECKPOINT_TABLES:
+                    reclaimed[table] += await tx.execute(
+                        f"DELETE FROM {table} WHERE thread_id = ANY(%s)", (thread_ids,))
+            reclaimed["threads"] += len(thread_ids)
+            if len(thread_ids) < self.batch_size:
+                break
+        return reclaimed
+
+    async def run_once(self) -> Dict[str, object]:
+        """执行一轮完整清理，记录指标并返回本轮统计"""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        expired = await self.expire_idle_threads()
+        pruned = await self.prune_history()
+        reclaimed = {table: expired[table] + pruned[table] for table in CHECKPOINT_TABLES}
+        for table, rows in reclaimed.items():
+            metrics.incr("ai.checkpoint.reclaimed_rows", rows, table=table)
+        metrics.incr("ai.checkpoint.expired_threads", expired["threads"])
+        self.last_run = {
+            "expired_threads": expired["threads"],
+            "reclaimed_rows": reclaimed,
+            "duration_ms": round((loop.time() - start) * 1000, 1),
+        }
+        logger.info(f"checkpoint 清理完成: {self.last_run}")
+        return self.last_run
+
+    async def report(self) -> Dict[str, object]:
+        """
+        checkpoint 表的体积和行数，以及上一轮清理的结果
+
+        Returns:
+            tables: 每张表的总大小（字节，含索引和 TOAST）、存活行数和死元组数
+            threads / checkpoints: 当前的线程数和 checkpoint 数
+            last_run: 上一轮清理统计
+        """
+        tables = await self.db.fetch_all("""
+            SELECT relname AS table_name,
+                   pg_total_relation_size(relid) AS total_bytes,
+                   n_live_tup AS live_rows,
+                   n_dead_tup AS dead_rows
+            FROM pg_stat_user_tables
+            WHERE relname = ANY(%s)
+            ORDER BY relname
+        """, (list(CHECKPOINT_TABLES),))
+        counts = await self.db.fetch_one(
+            "SELECT COUNT(DISTINCT thread_id) AS threads, COUNT(*) AS checkpoints FROM checkpoints")
+        return {"tables": tables, **(counts or {}), "last_run": self.last_run}
+
+    async def run_retention_loop(self, interval: float = 3600) -> None:
+        """后台定期执行清理，直到任务被取消"""
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"checkpoint 清理失败: {e}")
+            await asyncio.sleep(interval)
+
+    @staticmethod
+    def _add(total: Dict[str, int], delta: Dict[str, int]):
+        for key, value in delta.items():
+            total[key] = total.get(key, 0) + value
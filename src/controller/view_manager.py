@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import uuid
+from typing import Dict, List, Optional
+
+from loguru import logger
+from src.controller.base_manage import BaseManager
+from src.database.mysql.mysql_manage import MySQLManager
+from src.database.redis.redis_manage import RedisManager
+from src.type.blog_type import BlogBase
+
+PENDING_KEY = "view:pending"
+FLUSHING_KEY = "view:flushing"
+# flushing 中记录本批写回编号的字段，与博客 ID 字段共存
+FLUSH_ID_FIELD = "_flush_id"
+# 单篇博客在 MySQL 中的浏览量（不含未写回的增量），写回时失效
+BASE_KEY = "view:base:{}"
+
+
+class ViewManager:
+    """
+    博客浏览量计数
+
+    浏览先在 Redis 中累加（同一访客在去重窗口内只计一次），由后台任务定期把增量批量写回 MySQL 的 blog.view_num；
+    读取时把尚未写回的增量合并到返回值中，单篇博客的 MySQL 基数缓存在 Redis，详情页读取不再查询 MySQL。
+    每批写回带一个编号，与增量在同一个 MySQL 事务中记入 blog_view_flush，重复写回同一批时直接跳过。
+    """
+
+    def __init__(self, db: MySQLManager, cache: RedisManager, dedup_window: int = 1800,
+                 flush_batch_size: int = 500, stats: Optional[BaseManager] = None, base_ttl: int = 3600,
+                 flush_log_days: int = 7):
+        """
+        Args:
+            db: MySQL 连接
+            cache: Redis 连接
+            dedup_window: 同一访客重复浏览的去重窗口（秒）
+            flush_batch_size: 写回 MySQL 时每条 UPDATE 覆盖的博客数
+            stats: 站点统计，写回后同步增加总浏览量快照
+            base_ttl: 单篇博客 MySQL 浏览量缓存的有效期（秒）
+            flush_log_days: 写回编号的保留天数
+        """
+        self.db = db
+        self.cache = cache
+        self.dedup_window = dedup_window
+        self.flush_batch_size = flush_batch_size
+        self.stats = stats
+        self.base_ttl = base_ttl
+        self.flush_log_days = flush_log_days
+
+    def ensure_flush_table(self) -> None:
+        """创建 blog_view_flush 表（记录已写回 MySQL 的批次编号）"""
+        self.db.execute("""
+        CREATE TABLE IF NOT EXISTS blog_view_flush (
+            flush_id CHAR(32) PRIMARY KEY,
+            blogs INT NOT NULL,
+            views INT NOT NULL,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            KEY idx_created (created_at)
+        ) DEFAULT CHARSET = utf8mb4
+        """)
+
+    def record_view(self, blog_id: int, visitor: str) -> bool:
+        """
+        记录一次浏览
+
+        Args:
+            blog_id: 博客 ID
+            visitor: 访客标识（如 IP + User-Agent）
+
+        Returns:
+            bool: 是否计入（去重窗口内的重复浏览返回 False）
+        """
+        visitor_hash = hashlib.sha1(visitor.encode("utf-8")).hexdigest()[:16]
+        if not self.cache.set(f"view:seen:{blog_id}:{visitor_hash}", 1, ttl=self.dedup_window, nx=True):
+            return False
+        self.cache.hincrby(PENDING_KEY, str(blog_id), 1)
+        return True
+
+    def get_pending(self, blog_ids: List[int]) -> Dict[int, int]:
+        """返回尚未写回 MySQL 的浏览增量（包括正在写回的部分）"""
+        if not blog_ids:
+            return {}
+        keys = [str(blog_id) for blog_id in blog_ids]
+        pending = self.cache.hmget(PENDING_KEY, keys)
+        flushing = self.cache.hmget(FLUSHING_KEY, keys)
+        return {blog_id: int(a or 0) + int(b or 0) for blog_id, a, b in zip(blog_ids, pending, flushing)}
+
+    def merge_live_counts(self, blogs: List[BlogBase]) -> List[BlogBase]:
+        """把未写回的增量加到列表中每篇博客的 view_num 上"""
+        pending = self.get_pending([blog.id for blog in blogs])
+        for blog in blogs:
+            blog.view_num += pending.get(blog.id, 0)
+        return blogs
+
+    def get_view_num(self, blog_id: int) -> int:
+        """单篇博客的实时浏览量：MySQL 中的值（优先读缓存）加上未写回的增量"""
+        base = self.cache.get(BASE_KEY.format(blog_id))
+        if base is None:
+            row = self.db.fetch_one("SELECT view_num FROM blog WHERE id = %s", (blog_id,))
+            base = (row or {}).get("view_num") or 0
+            self.cache.set(BASE_KEY.format(blog_id), base, ttl=self.base_ttl)
+        return int(base) + self.get_pending([blog_id])[blog_id]
+
+    def flush(self) -> int:
+        """
+        把累计的增量批量写回 MySQL
+
+        先把 pending hash 原子地改名为 flushing 并分配写回编号，新浏览继续写入新的 pending；
+        增量和编号在同一个事务中提交，之后才删除 flushing。上次残留的 flushing 会在下次优先处理：
+        编号已在 blog_view_flush 中说明已经提交过，只删除 flushing，不会重复累加。
+
+        Returns:
+            int: 本次写回的浏览总数
+        """
+        if not self.cache.exist(FLUSHING_KEY):
+            if not self.cache.exist(PENDING_KEY):
+                return 0
+            self.cache.rename(PENDING_KEY, FLUSHING_KEY)
+        batch = self.cache.hgetall(FLUSHING_KEY)
+        flush_id = batch.pop(FLUSH_ID_FIELD, None)
+        if flush_id is None:
+            flush_id = uuid.uuid4().hex
+            self.cache.hset(FLUSHING_KEY, FLUSH_ID_FIELD, flush_id, ttl=None)
+        elif self.db.fetch_one("SELECT flush_id FROM blog_view_flush WHERE flush_id = %s", (flush_id,)):
+            logger.warning(f"浏览量批次 {flush_id} 已写回，清理残留的 flushing")
+            self._finish_flush(batch)
+            return 0
+        deltas = [(int(blog_id), int(count)) for blog_id, count in batch.items() if int(count) > 0]
+        total = sum(count for _, count in deltas)
+        with self.db.transaction():
+            self.db.execute("INSERT INTO blog_view_flush (flush_id, blogs, views) VALUES (%s, %s, %s)",
+                            (flush_id, len(deltas), total))
+            for start in range(0, len(deltas), self.flush_batch_size):
+                chunk = deltas[start:start + self.flush_batch_size]
+                cases = " ".join(["WHEN %s THEN %s"] * len(chunk))
+                placeholders = ", ".join(["%s"] * len(chunk))
+                params = [value for pair in chunk for value in pair] + [blog_id for blog_id, _ in chunk]
+                self.db.execute(
+                    f"UPDATE blog SET view_num = view_num + CASE id {cases} ELSE 0 END WHERE id IN ({placeholders})",
+                    tuple(params))
+            self.db.execute("DELETE FROM blog_view_flush WHERE created_at < NOW() - INTERVAL %s DAY",
+                            (self.flush_log_days,))
+        self._finish_flush(batch)
+        if self.stats:
+            self.stats.incr_stat("total_view_num", total)
+        logger.info(f"浏览量写回 MySQL: {len(deltas)} 篇博客, 共 {total} 次")
+        return total
+
+    def _finish_flush(self, batch: Dict[str, str]) -> None:
+        """写回已提交：让相关博客的基数缓存失效，再删除 flushing"""
+        for blog_id in batch:
+            self.cache.delete(BASE_KEY.format(blog_id))
+        self.cache.delete(FLUSHING_KEY)
+
+    async def run_flush_loop(self, interval: float = 60) -> None:
+        """后台定期写回浏览量，直到任务被取消；取消时做最后一次写回"""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"浏览量写回失败: {e}")
+        except asyncio.CancelledError:
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"退出前浏览量写回失败: {e}")
+            raise
@@ -0,0 +1,87 @@
+import zlib
+from typing import Optional
+from bson import Binary
+from loguru import logger
+
+try:
+    import zstandard
+except ImportError:  # zstandard 为可选依赖，缺失时退回 zlib
+    zstandard = None
+
+CODEC_FIELD = "contentCodec"
+RAW_SIZE_FIELD = "contentSize"
+SUPPORTED_CODECS = ("zstd", "zlib")
+
+
+class ContentCodec:
+    """
+    博客正文的压缩编解码。
+
+    超过阈值的正文以 Binary 形式压缩存储，并在文档中写入 contentCodec 标记和原始字节数；
+    未压缩的旧文档没有标记，读取时原样返回，因此可以和存量数据共存。
+    """
+
+    def __init__(self, codec: str = "zstd", threshold: int = 4096, level: Optional[int] = None,
+                 enabled: bool = True):
+        """
+        @param codec: 压缩算法，zstd 或 zlib；zstd 不可用时自动退回 zlib
+        @param threshold: 正文 UTF-8 字节数达到该值才压缩
+        @param level: 压缩级别，None 使用算法默认值（zstd 3，zlib 6）
+        @param enabled: False 时只解码不压缩
+        """
+        if codec not in SUPPORTED_CODECS:
+            raise ValueError(f"unsupported content codec: {codec}")
+        if codec == "zstd" and zstandard is None:
+            logger.warning("zstandard 未安装，正文压缩退回 zlib")
+            codec = "zlib"
+        self.codec = codec
+        self.threshold = threshold
+        self.level = level
+        self.enabled = enabled
+
+    def __repr__(self) -> str:
+        return "content codec {} threshold:{} enabled:{}".format(self.codec, self.threshold, self.enabled)
+
+    def compress(self, data: bytes, codec: Optional[str] = None) -> bytes:
+        codec = codec or self.codec
+        if codec == "zstd":
+            return zstandard.ZstdCompressor(level=self.level or 3).compress(data)
+        return zlib.compress(data, self.level if self.level is not None else 6)
+
+    @staticmethod
+    def decompress(data: bytes, codec: str) -> bytes:
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read zstd compressed content")
+            return zstandard.ZstdDecompressor().decompress(data)
+        if codec == "zlib":
+            return zlib.decompress(data)
+        raise ValueError(f"unsupported content codec: {codec}")
+
+    def encode(self, content: str) -> dict:
+        """
+        把正文编码成要写入 Mongo 的字段
+        @param content: 正文
+        @return: {"content": ...} 以及压缩时的 contentCodec / contentSize 字段
+        """
+        raw = content.encode("utf-8")
+        if not self.enabled or len(raw) < self.threshold:
+            return {"content": content}
+        compressed = self.compress(raw)
+        if len(compressed) >= len(raw):
+            return {"content": content}
+        return {"content": Binary(compressed), CODEC_FIELD: self.codec, RAW_SIZE_FIELD: len(raw)}
+
+    def decode(self, doc: Optional[dict]) -> Optional[dict]:
+        """
+        就地把文档中的正文还原为字符串，并去掉编码标记字段
+        @param doc: Mongo 文档
+        @return: 同一个文档
+        """
+        if not doc:
+            return doc
+        codec = doc.pop(CODEC_FIELD, None)
+        doc.pop(RAW_SIZE_FIELD, None)
+        if codec and "content" in doc:
+            doc["content"] = self.decompress(bytes(doc["content"]), codec).decode("utf-8")
+        return doc
@@ -1,12 +1,35 @@
-from typing import Optional
-from pymongo import MongoClient
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
 from loguru import logger
-from pymongo.cursor import Cursor
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCursor
+from pymongo import IndexModel
+from pymongo.errors import BulkWriteError, PyMongoError
+
 
 class MongoDBManager:
-    """mongo服务"""
+    """mongo服务（基于 motor 的异步实现）"""
     logger = logger
-    def __init__(self, ip, port, db, user=None, password=None, **kwargs):
+
+    def __init__(self, ip, port, db, user=None, password=None,
+                 max_pool_size: int = 100, min_pool_size: int = 0,
+                 max_idle_time_ms: Optional[int] = None,
+                 connect_timeout_ms: int = 5000,
+                 server_selection_timeout_ms: int = 5000,
+                 socket_timeout_ms: Optional[int] = None,
+                 wait_queue_timeout_ms: Optional[int] = None, **kwargs):
+        """
+        @param ip: MongoDB 服务器 IP
+        @param port: MongoDB 服务器端口
+        @param db: 数据库名
+        @param user: 用户名
+        @param password: 密码
+        @param max_pool_size: 连接池最大连接数
+        @param min_pool_size: 连接池最小连接数
+        @param max_idle_time_ms: 连接最大空闲时间，单位：毫秒
+        @param connect_timeout_ms: 建立连接超时时间，单位：毫秒
+        @param server_selection_timeout_ms: 选择服务器超时时间，单位：毫秒
+        @param socket_timeout_ms: 单次读写超时时间，单位：毫秒，None 表示不限制
+        @param wait_queue_timeout_ms: 等待连接池空闲连接的超时时间，单位：毫秒
+        """
         super().__init__()
 
         self.ip = ip
@@ -14,20 +37,39 @@ class MongoDBManager:
         self.dbname = db
         self.user = user # 对用户名进行URL编码
         self.password = password
+        self.pool_options = {
+            "maxPoolSize": max_pool_size,
+            "minPoolSize": min_pool_size,
+            "maxIdleTimeMS": max_idle_time_ms,
+            "connectTimeoutMS": connect_timeout_ms,
+            "serverSelectionTimeoutMS": server_selection_timeout_ms,
+            "socketTimeoutMS": socket_timeout_ms,
+            "waitQueueTimeoutMS": wait_queue_timeout_ms,
+        }
 
+        self.client = None
+        self.db = None
+        # 声明的索引与需要做执行计划检查的查询，由各业务 manager 注册
+        self.index_models: Dict[str, List[IndexModel]] = {}
+        self.registered_queries: Dict[str, dict] = {}
         self.connect()
-        self.ping()
 
     def __repr__(self) -> str:
         return "mongodb {}:{} db:{}".format(self.ip, self.port, self.dbname)
 
     def connect(self) -> bool:
+        """
+        创建客户端，motor 的连接是惰性建立的，这里不会阻塞事件循环
+        """
         try:
+            options = {k: v for k, v in self.pool_options.items() if v is not None}
             # 在MongoClient中直接进行认证
-            pool = MongoClient(self.ip, self.port, username=self.user, password=self.password)
-            self.db = pool[self.dbname]  # 获取数据库对象
-            self.logger.debug(f"{self} authenticated")
+            self.client = AsyncIOMotorClient(self.ip, self.port, username=self.user,
+                                             password=self.password, **options)
+            self.db = self.client[self.dbname]  # 获取数据库对象
+            self.logger.debug(f"{self} client created")
         except Exception as ex:
+            self.client = None
             self.db = None
             self.logger.error(f"failed to connect {self}: {ex}")
             return False
@@ -38,87 +80,217 @@ class MongoDBManager:
         if self.db is None and not self.connect():
             raise Exception()
 
-    def ping(self) -> bool:
+    async def ping(self) -> bool:
         """
         ping 探活
         """
         try:
             self._maybe_reconnect()
-
+            await self.db.command("ping")
             return True
-        except:
+        except Exception as ex:
+            self.logger.error(f"ping {self} failed: {ex}")
             return False
-    
-    def find(self, collection_name: str, filter, batch_size: int = 0) -> Cursor:
+
+    def close(self):
+        """关闭客户端及连接池"""
+        if self.client is not None:
+            self.client.close()
+            self.logger.info(f"{self} closed")
+        self.client = None
+        self.db = None
+
+    def register_index(self, collection_name: str, keys, **kwargs):
+        """
+        声明集合需要的索引，在 ensure_indexes 时统一创建
+        @param collection_name: collection名
+        @param keys: 索引字段，如 [("blogId", ASCENDING)]
+        @param kwargs: 索引选项，如 unique=True, name="uniq_blogId"
+        """
+        self.index_models.setdefault(collection_name, []).append(IndexModel(keys, **kwargs))
+
+    def register_query(self, name: str, collection_name: str, filter: dict, sort: Optional[list] = None,
+                       projection: Optional[dict] = None):
         """
-        查询
+        注册一条典型查询，供 explain_queries 检查执行计划
+        @param name: 查询名称
+        @param collection_name: collection名
+        @param filter: 代表性的过滤条件（使用样例值即可）
+        @param sort: 排序条件，如 [("blogId", -1)]
+        @param projection: 查询实际使用的返回字段
+        """
+        self.registered_queries[name] = {
+            "collection": collection_name, "filter": filter, "sort": sort, "projection": projection}
+
+    async def ensure_indexes(self) -> Dict[str, List[str]]:
+        """
+        创建所有已声明的索引，已存在的同名同定义索引不会重复创建
+        @return: 每个集合创建/确认的索引名
+        """
+        self._maybe_reconnect()
+        created = {}
+        for collection_name, models in self.index_models.items():
+            try:
+                created[collection_name] = await self.db[collection_name].create_indexes(models)
+                self.logger.info(f"{self} indexes ready on {collection_name}: {created[collection_name]}")
+            except PyMongoError as ex:
+                self.logger.error(f"Create indexes failed in {collection_name}: {ex}")
+        return created
+
+    @staticmethod
+    def _plan_stages(plan: Any) -> List[str]:
+        """递归收集执行计划中的所有 stage"""
+        stages = []
+        if isinstance(plan, dict):
+            if "stage" in plan:
+                stages.append(plan["stage"])
+            for key in ("inputStage", "queryPlan", "outerStage", "innerStage"):
+                stages.extend(MongoDBManager._plan_stages(plan.get(key)))
+            for child in plan.get("inputStages", []):
+                stages.extend(MongoDBManager._plan_stages(child))
+        return stages
+
+    async def explain_queries(self) -> List[dict]:
+        """
+        对已注册的查询执行 explain()，标记出走全表扫描（COLLSCAN）的查询
+        @return: [{name, collection, stages, collscan}]
+        """
+        self._maybe_reconnect()
+        report = []
+        for name, query in self.registered_queries.items():
+            cursor = self.db[query["collection"]].find(query["filter"], query["projection"])
+            if query["sort"]:
+                cursor = cursor.sort(query["sort"])
+            try:
+                plan = await cursor.explain()
+            except PyMongoError as ex:
+                self.logger.error(f"Explain failed for query {name}: {ex}")
+                continue
+            stages = self._plan_stages(plan.get("queryPlanner", {}).get("winningPlan", {}))
+            collscan = "COLLSCAN" in stages
+            if collscan:
+                self.logger.warning(f"Query {name} on {query['collection']} uses COLLSCAN: {stages}")
+            report.append({"name": name, "collection": query["collection"],
+                           "stages": stages, "collscan": collscan})
+        return report
+
+    def find(self, collection_name: str, filter, batch_size: int = 0,
+             projection: Optional[dict] = None) -> AsyncIOMotorCursor:
+        """
+        查询，返回的游标可直接用 async for 迭代
         @param collection_name: collection名
         @param filter: 查询的过滤条件
         @param batch_size: 查询批量大小
-        @return 结果
+        @param projection: 返回字段，如 {"_id": 0, "content": 0}，None 返回整个文档
+        @return 结果游标
         """
         self._maybe_reconnect()
 
-        output = self.db[collection_name].find(filter).batch_size(batch_size)
+        output = self.db[collection_name].find(filter, projection).batch_size(batch_size)
         return output
-    
-    def find_all(self, collection_name: str, filter) -> Cursor:
+
+    def find_all(self, collection_name: str, filter, projection: Optional[dict] = None) -> AsyncIOMotorCursor:
         """
         查询集合collection_name中的全部数据
         @param collection_name: collection名
         @param filter: 查询的过滤条件
-        @return 结果
+        @param projection: 返回字段，None 返回整个文档
+        @return 结果游标
         """
         self._maybe_reconnect()
 
-        output = self.db[collection_name].find(filter)
+        output = self.db[collection_name].find(filter, projection)
         return output
-    
 
-    def find_page_query(self, collection_name: str, filter, page_size: int = 0, skip: int = 0,
-                        sort_by: str = '', sort_num: int = 1) -> Cursor:
+    async def find_page_query(self, collection_name: str, filter, page_size: int = 0, skip: int = 0,
+                              sort_by: str = '', sort_num: int = 1,
+                              projection: Optional[dict] = None) -> List[dict]:
         """
-        查询
+        分页查询
         @param collection_name: collection名
         @param filter: 查询的过滤条件
         @param page_size: 每页批量大小
         @param skip: 偏移量
         @param sort_by: 排序字段
         @param sort_num: 排序规则
-        @return 结果
+        @param projection: 返回字段，None 返回整个文档
+        @return 结果列表
         """
         self._maybe_reconnect()
+        cursor = self.db[collection_name].find(filter, projection).limit(page_size).skip(skip)
         if sort_by:
-            output = self.db[collection_name].find(filter).limit(page_size).skip(skip).sort(sort_by, sort_num)
-        else:
-            output = self.db[collection_name].find(filter).limit(page_size).skip(skip)
-        return output
+            cursor = cursor.sort(sort_by, sort_num)
+        return await cursor.to_list(length=page_size or None)
+
+    async def find_in(self, collection_name: str, field: str, values: Sequence,
+                      projection: Optional[dict] = None) -> List[dict]:
+        """
+        用一次 $in 查询取回多个文档，并按 values 的顺序返回（不存在的跳过）
+        @param collection_name: collection名
+        @param field: 匹配字段，如 "blogId"
+        @param values: 字段取值列表
+        @param projection: 返回字段，需要包含 field
+        @return 按 values 顺序排列的文档列表
+        """
+        self._maybe_reconnect()
+        values = list(dict.fromkeys(values))
+        if not values:
+            return []
+        cursor = self.db[collection_name].find({field: {"$in": values}}, projection)
+        docs = {doc[field]: doc for doc in await cursor.to_list(length=None)}
+        return [docs[value] for value in values if value in docs]
+
+    async def find_in_batches(self, collection_name: str, field: str, values: Sequence,
+                              batch_size: int = 500, projection: Optional[dict] = None) -> AsyncIterator[dict]:
+        """
+        流式版本的 find_in：values 按 batch_size 分段，每段一次 $in 查询，
+        游标同样以 batch_size 拉取，内存中最多只保留一段文档
+        @param collection_name: collection名
+        @param field: 匹配字段
+        @param values: 字段取值列表，可以是上万个
+        @param batch_size: 每段的取值个数及游标批量大小
+        @param projection: 返回字段，需要包含 field
+        @return 按 values 顺序逐个产出的文档
+        """
+        self._maybe_reconnect()
+        values = list(dict.fromkeys(values))
+        for start in range(0, len(values), batch_size):
+            chunk = values[start:start + batch_size]
+            cursor = self.db[collection_name].find({field: {"$in": chunk}}, projection).batch_size(batch_size)
+            docs = {}
+            async for doc in cursor:
+                docs[doc[field]] = doc
+            for value in chunk:
+                if value in docs:
+                    yield docs[value]
 
-    def find_count(self, collection_name: str, filter={}) -> Cursor:
+    async def find_count(self, collection_name: str, filter={}) -> int:
         """
-        查询
+        查询数量
         @param collection_name: collection名
         @param filter: 查询的过滤条件
         @return 结果
         """
         self._maybe_reconnect()
 
-        output = self.db[collection_name].count_documents(filter)
+        output = await self.db[collection_name].count_documents(filter)
         return output
 
-    def find_one(self, collection_name: str, filter:dict) ->  Optional[dict]:
+    async def find_one(self, collection_name: str, filter: dict,
+                       projection: Optional[dict] = None) -> Optional[dict]:
         """
         查询一个结果
         @param collection_name: collection名
         @param filter: 查询的过滤条件
+        @param projection: 返回字段，None 返回整个文档
         @return 结果
         """
         self._maybe_reconnect()
 
-        output = self.db[collection_name].find_one(filter)
+        output = await self.db[collection_name].find_one(filter, projection)
         return output
 
-    def insert_one(self, collection_name: str, document) -> bool:
+    async def insert_one(self, collection_name: str, document) -> bool:
         """
         插入单个文档
         @param collection_name: collection名
@@ -127,28 +299,29 @@ class MongoDBManager:
         """
         try:
             self._maybe_reconnect()
-            self.db[collection_name].insert_one(document)
+            await self.db[collection_name].insert_one(document)
             return True
         except Exception as ex:
             self.logger.error(f"Insert failed in {collection_name}: {ex}")
             return False
 
-    def insert_many(self, collection_name: str, documents) -> bool:
+    async def insert_many(self, collection_name: str, documents, ordered: bool = True) -> bool:
         """
         插入多个文档
         @param collection_name: collection名
         @param documents: 插入的文档列表
+        @param ordered: 是否按顺序插入，False 时单条失败不影响其他文档
         @return: 插入成功返回True，否则False
         """
         try:
             self._maybe_reconnect()
-            self.db[collection_name].insert_many(documents)
+            await self.db[collection_name].insert_many(documents, ordered=ordered)
             return True
         except Exception as ex:
             self.logger.error(f"Insert failed in {collection_name}: {ex}")
             return False
 
-    def update_one(self, collection_name: str, filter, update,upsert:bool=True) -> bool:
+    async def update_one(self, collection_name: str, filter, update, upsert: bool = True) -> bool:
         """
         更新单个文档
         @param collection_name: collection名
@@ -159,15 +332,15 @@ class MongoDBManager:
         """
         try:
             self._maybe_reconnect()
-            res = self.db[collection_name].update_one(filter, {"$set": update},upsert=upsert)
-            if res.matched_count == 0:
+            res = await self.db[collection_name].update_one(filter, {"$set": update}, upsert=upsert)
+            if res.matched_count == 0 and res.upserted_id is None:
                 return False
             return True
         except Exception as ex:
             self.logger.error(f"Update failed in {collection_name}: {ex}")
             return False
 
-    def update_many(self, collection_name: str, filter, update) -> bool:
+    async def update_many(self, collection_name: str, filter, update) -> bool:
         """
         更新多个文档
         @param collection_name: collection名
@@ -177,7 +350,7 @@ class MongoDBManager:
         """
         try:
             self._maybe_reconnect()
-            res = self.db[collection_name].update_many(filter, {"$set": update})
+            res = await self.db[collection_name].update_many(filter, {"$set": update})
             if res.matched_count == 0:
                 return False
             return True
@@ -185,7 +358,29 @@ class MongoDBManager:
             self.logger.error(f"Update failed in {collection_name}: {ex}")
             return False
 
-    def delete_one(self, collection_name: str, filter) -> bool:
+    async def bulk_write(self, collection_name: str, requests: list, ordered: bool = False) -> bool:
+        """
+        批量写入
+        @param collection_name: collection名
+        @param requests: pymongo 写操作列表（InsertOne / UpdateOne / DeleteOne 等）
+        @param ordered: 是否按顺序执行，False 时服务端可并行执行且单条失败不中断
+        @return: 全部成功返回True，否则False
+        """
+        if not requests:
+            return True
+        try:
+            self._maybe_reconnect()
+            await self.db[collection_name].bulk_write(requests, ordered=ordered)
+            return True
+        except BulkWriteError as ex:
+            self.logger.error(f"Bulk write partially failed in {collection_name}: "
+                              f"{len(ex.details.get('writeErrors', []))} errors")
+            return False
+        except Exception as ex:
+            self.logger.error(f"Bulk write failed in {collection_name}: {ex}")
+            return False
+
+    async def delete_one(self, collection_name: str, filter) -> bool:
         """
         删除单个文档
         @param collection_name: collection名
@@ -194,7 +389,7 @@ class MongoDBManager:
         """
         try:
             self._maybe_reconnect()
-            res = self.db[collection_name].delete_one(filter)
+            res = await self.db[collection_name].delete_one(filter)
             if res.deleted_count == 0:
                 return False
             return True
@@ -202,7 +397,7 @@ class MongoDBManager:
             self.logger.error(f"Delete failed in {collection_name}: {ex}")
             return False
 
-    def delete_many(self, collection_name: str, filter) -> bool:
+    async def delete_many(self, collection_name: str, filter) -> bool:
         """
         删除多个文档
         @param collection_name: collection名
@@ -211,12 +406,10 @@ class MongoDBManager:
         """
         try:
             self._maybe_reconnect()
-            res = self.db[collection_name].delete_many(filter)
+            res = await self.db[collection_name].delete_many(filter)
             if res.deleted_count == 0:
                 return False
             return True
         except Exception as ex:
             self.logger.error(f"Delete failed in {collection_name}: {ex}")
             return False
-        
-
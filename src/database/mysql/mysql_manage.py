@@ -1,3 +1,4 @@
+from contextlib import contextmanager
 from loguru import logger
 import pymysql
 import time
@@ -45,6 +46,7 @@ class MySQLManager:
         self.retry_interval = retry_interval
         self.cnx = None
         self.cursor = None
+        self._in_transaction = False
         self.connect()
 
     def connect(self):
@@ -89,6 +91,17 @@ class MySQLManager:
         logger.error(f"重试 {self.max_retry_times} 次后仍无法连接MySQL数据库")
         raise ConnectionError("无法连接到MySQL数据库")
 
+    def _ensure_connection(self):
+        """
+        连接断开时重连；事务中不重连，直接抛出 ConnectionError
+
+        事务中重连会丢掉已执行但未提交的语句，之后的语句却在新连接上逐条提交，只留下事务的后半部分
+        """
+        if not self.is_alive():
+            if self._in_transaction:
+                raise ConnectionError("事务执行过程中MySQL连接已断开")
+            self.reconnect()
+
     def execute(self, sql: str, params: Optional[Tuple[Any, ...]] = None) -> Optional[int]:
         """
         执行SQL语句，支持参数化查询
@@ -100,13 +113,13 @@ class MySQLManager:
         Returns:
             Optional[int]: 返回受影响的行数，或查询结果的第一行
         """
-        if not self.is_alive():
-            self.reconnect()
+        self._ensure_connection()
 
         try:
             logger.debug(f"执行SQL: {sql} | 参数数量: {_param_count(params)}")
             self.cursor.execute(sql, params)
-            self.cnx.commit()
+            if not self._in_transaction:
+                self.cnx.commit()
             if sql.strip().lower().startswith("select"):
                 result = self.cursor.fetchall()
                 # logger.info(f"查询结果: {result}")
@@ -120,6 +133,30 @@ class MySQLManager:
             self.cnx.rollback()
             logger.error(f"SQL执行失败: {e}")
             raise
+    @contextmanager
+    def transaction(self):
+        """
+        事务上下文：块内的 execute 不再逐条提交，正常退出时统一提交，异常时回滚
+
+        Example:
+            with db.transaction():
+                db.execute(...)
+                db.execute(...)
+        """
+        if self._in_transaction:
+            raise RuntimeError("不支持嵌套事务")
+        if not self.is_alive():
+            self.reconnect()
+        self._in_transaction = True
+        try:
+            yield self
+            self.cnx.commit()
+        except Exception:
+            self.cnx.rollback()
+            raise
+        finally:
+            self._in_transaction = False
+
     def fetch_one(self, sql: str, params: Tuple[Any, ...] = ()) -> Optional[dict]:
         """
         查询一条记录
@@ -131,8 +168,7 @@ class MySQLManager:
         Returns:
             Optional[dict]: 查询结果的字典，如果没有数据则返回None
         """
-        if not self.is_alive():
-            self.reconnect()
+        self._ensure_connection()
         try:
             self.cursor.execute(sql, params)
             result = self.cursor.fetchone()
@@ -140,6 +176,9 @@ class MySQLManager:
             return result
         except pymysql.Error as e:
             logger.error(f"查询失败: {e}")
+            if self._in_transaction:
+                # 事务中的查询失败不能当作「没有结果」继续执行，交给 transaction() 回滚
+                raise
             return None
     
     def find_page_query(self, table: str, filter: Optional[dict] = None, skip: int = 0, page_size: int = 10) -> List[dict]:
@@ -175,6 +214,9 @@ class MySQLManager:
             return result
         except pymysql.Error as e:
             logger.error(f"分页查询失败: {e}")
+            if self._in_transaction:
+                # 事务中的查询失败不能当作「没有结果」继续执行，交给 transaction() 回滚
+                raise
             return []
     
     def fetch_all(self, sql: str, params: Tuple[Any, ...] = ()) -> List[dict]:
@@ -188,8 +230,7 @@ class MySQLManager:
         Returns:
             List[dict]: 查询结果的字典列表，如果没有数据则返回空列表
         """
-        if not self.is_alive():
-            self.reconnect()
+        self._ensure_connection()
         try:
             self.cursor.execute(sql, params)
             result = self.cursor.fetchall()
@@ -197,6 +238,9 @@ class MySQLManager:
             return result or []
         except pymysql.Error as e:
             logger.error(f"查询失败: {e}")
+            if self._in_transaction:
+                # 事务中的查询失败不能当作「没有结果」继续执行，交给 transaction() 回滚
+                raise
             return []
     
     def count(self, table: str, filter: Optional[dict] = None) -> int:
@@ -225,6 +269,9 @@ class MySQLManager:
             return result['count'] if result else 0
         except pymysql.Error as e:
             logger.error(f"计数查询失败: {e}")
+            if self._in_transaction:
+                # 事务中的查询失败不能当作「没有结果」继续执行，交给 transaction() 回滚
+                raise
             return 0
 
 
@@ -1,15 +1,42 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from loguru import logger
-import time
-from typing import Any, List, Optional, Tuple
+from psycopg import AsyncConnection
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+import psycopg
+
+
+class PostgreSQLConnection:
+    """
+    绑定到单个连接上的执行器，由 PostgreSQLManager.transaction() 提供，
+    块内的语句共享同一个事务
+    """
+
+    def __init__(self, conn: AsyncConnection):
+        self.conn = conn
+
+    async def execute(self, sql: str, params: Optional[Tuple[Any, ...]] = None) -> int:
+        cursor = await self.conn.execute(sql, params)
+        return cursor.rowcount
+
+    async def fetch_one(self, sql: str, params: Optional[Tuple[Any, ...]] = None) -> Optional[dict]:
+        cursor = await self.conn.execute(sql, params)
+        return await cursor.fetchone()
+
+    async def fetch_all(self, sql: str, params: Optional[Tuple[Any, ...]] = None) -> List[dict]:
+        cursor = await self.conn.execute(sql, params)
+        return await cursor.fetchall()
 
 
 class PostgreSQLManager:
     """
-    PostgreSQL连接管理类，基于psycopg2库实现。
+    PostgreSQL连接池管理类，基于 psycopg3 的 AsyncConnectionPool 实现。
 
-    该类提供了一个健壮的PostgreSQL连接，支持自动重连、上下文管理、异常处理等功能。
+    所有查询都是异步的，连接从池中借出、用完归还；同一个连接池可以通过 pool 属性
+    共享给其他 Postgres 使用方（如 LangGraph 的 AsyncPostgresSaver）。
+    连接使用 autocommit + dict_row，多条语句需要原子执行时使用 transaction()。
 
     Attributes:
         ip: PostgreSQL服务器IP地址
@@ -17,70 +44,58 @@ class PostgreSQLManager:
         db: PostgreSQL数据库名称
         user: PostgreSQL用户名
         password: PostgreSQL密码
-        max_retry_times: 最大重试次数，默认为3
-        retry_interval: 重试间隔时间（秒），默认为5
+        min_size: 连接池最小连接数
+        max_size: 连接池最大连接数
+        timeout: 从连接池获取连接的超时时间（秒）
+        max_idle: 空闲连接的回收时间（秒）
     """
 
     def __init__(self, ip: str, port: int, db: str, user: str,
-                 password: Optional[str] = None, max_retry_times: int = 3,
-                 retry_interval: int = 5):
+                 password: Optional[str] = None, min_size: int = 2, max_size: int = 10,
+                 timeout: float = 10.0, max_idle: float = 600.0, name: str = "blog"):
         self.ip = ip
         self.port = port
         self.db = db
         self.user = user
         self.password = password
-        self.max_retry_times = max_retry_times
-        self.retry_interval = retry_interval
-        self.conn = None
-        self.cursor = None
-        self.connect()
-
-    def connect(self):
-        """建立数据库连接"""
-        logger.info(
-            f"尝试连接PostgreSQL数据库 {self.ip}:{self.port}/{self.db},用户: {self.user}")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pool = AsyncConnectionPool(
+            make_conninfo(host=ip, port=port, dbname=db, user=user, password=password, sslmode="disable"),
+            min_size=min_size,
+            max_size=max_size,
+            timeout=timeout,
+            max_idle=max_idle,
+            name=name,
+            open=False,
+            # 与 LangGraph AsyncPostgresSaver 要求的连接参数一致，便于共享连接池
+            kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+        )
+
+    def __repr__(self) -> str:
+        return "postgresql {}:{} db:{} pool:{}".format(self.ip, self.port, self.db, self.pool.name)
+
+    async def connect(self, wait: bool = True):
+        """打开连接池，wait=True 时等待 min_size 个连接建立完成"""
+        logger.info(f"打开PostgreSQL连接池 {self.ip}:{self.port}/{self.db},用户: {self.user}")
         try:
-            self.conn = psycopg2.connect(
-                host=self.ip,
-                port=self.port,
-                database=self.db,
-                user=self.user,
-                password=self.password,
-                cursor_factory=RealDictCursor  # 使用字典游标，返回字典格式的结果
-            )
-            self.cursor = self.conn.cursor()
-            logger.info(f"成功连接到PostgreSQL数据库 {self.ip}:{self.port}/{self.db}")
-        except psycopg2.Error as e:
+            await self.pool.open(wait=wait, timeout=self.timeout)
+            logger.info(f"PostgreSQL连接池就绪 {self} size={self.min_size}-{self.max_size}")
+        except PoolTimeout as e:
             logger.error(f"连接PostgreSQL数据库失败: {e}")
             raise
 
-    def is_alive(self) -> bool:
-        """检查连接是否存活"""
+    async def is_alive(self) -> bool:
+        """检查数据库是否可用"""
         try:
-            if self.conn and self.cursor:
-                self.cursor.execute("SELECT 1")
-                return True
-        except psycopg2.Error as e:
+            await self.fetch_one("SELECT 1 AS ok")
+            return True
+        except (psycopg.Error, PoolTimeout) as e:
             logger.error(f"数据库连接检查失败: {e}")
         return False
 
-    def reconnect(self):
-        """重试连接数据库"""
-        for attempt in range(1, self.max_retry_times + 1):
-            logger.warning(f"尝试重新连接PostgreSQL数据库, 第 {attempt} 次...")
-            try:
-                self.close()
-            except:
-                pass
-            self.connect()
-            if self.is_alive():
-                logger.info("重连PostgreSQL数据库成功")
-                return
-            time.sleep(self.retry_interval)
-        logger.error(f"重试 {self.max_retry_times} 次后仍无法连接PostgreSQL数据库")
-        raise ConnectionError("无法连接到PostgreSQL数据库")
-
-    def execute(self, sql: str, params: Optional[Tuple[Any, ...]] = None) -> Optional[int]:
+    async def execute(self, sql: str, params: Optional[Tuple[Any, ...]] = None) -> int:
         """
         执行SQL语句，支持参数化查询
 
@@ -89,26 +104,17 @@ class PostgreSQLManager:
             params (tuple): SQL语句的参数
 
         Returns:
-            Optional[int]: 返回受影响的行数
+            int: 受影响的行数
         """
-        if not self.is_alive():
-            self.reconnect()
-
+        logger.debug(f"执行SQL: {sql} | 参数数量: {0 if params is None else len(params)}")
         try:
-            logger.debug(f"执行SQL: {sql} | 参数数量: {0 if params is None else len(params)}")
-            self.cursor.execute(sql, params)
-            self.conn.commit()
-
-            # 对于非SELECT语句，返回受影响的行数
-            if not sql.strip().upper().startswith("SELECT"):
-                return self.cursor.rowcount
-            return None
-        except psycopg2.Error as e:
+            async with self.pool.connection() as conn:
+                return await PostgreSQLConnection(conn).execute(sql, params)
+        except psycopg.Error as e:
             logger.error(f"执行SQL失败: {e}")
-            self.conn.rollback()
             raise
 
-    def fetch_one(self, sql: str, params: Optional[Tuple[Any, ...]] = None) -> Optional[dict]:
+    async def fetch_one(self, sql: str, params: Optional[Tuple[Any, ...]] = None) -> Optional[dict]:
         """
         查询一条记录
 
@@ -119,21 +125,15 @@ class PostgreSQLManager:
         Returns:
             Optional[dict]: 查询结果的第一条记录（字典格式），如果没有结果则返回None
         """
-        if not self.is_alive():
-            self.reconnect()
-
+        logger.debug(f"查询一条记录: {sql} | 参数数量: {0 if params is None else len(params)}")
         try:
-            logger.debug(f"查询一条记录: {sql} | 参数数量: {0 if params is None else len(params)}")
-            self.cursor.execute(sql, params)
-            result = self.cursor.fetchone()
-            if result:
-                logger.debug("查询一条记录命中")
-            return dict(result) if result else None
-        except psycopg2.Error as e:
+            async with self.pool.connection() as conn:
+                return await PostgreSQLConnection(conn).fetch_one(sql, params)
+        except psycopg.Error as e:
             logger.error(f"查询失败: {e}")
             raise
 
-    def fetch_all(self, sql: str, params: Optional[Tuple[Any, ...]] = None) -> List[dict]:
+    async def fetch_all(self, sql: str, params: Optional[Tuple[Any, ...]] = None) -> List[dict]:
         """
         查询多条记录
 
@@ -144,57 +144,50 @@ class PostgreSQLManager:
         Returns:
             List[dict]: 查询结果列表（字典格式）
         """
-        if not self.is_alive():
-            self.reconnect()
-
+        logger.debug(f"查询多条记录: {sql} | 参数数量: {0 if params is None else len(params)}")
         try:
-            logger.debug(f"查询多条记录: {sql} | 参数数量: {0 if params is None else len(params)}")
-            self.cursor.execute(sql, params)
-            results = self.cursor.fetchall()
-            result_list = [dict(row) for row in results]
+            async with self.pool.connection() as conn:
+                result_list = await PostgreSQLConnection(conn).fetch_all(sql, params)
             logger.debug(f"结果条数: {len(result_list)}")
             return result_list
-        except psycopg2.Error as e:
+        except psycopg.Error as e:
             logger.error(f"查询失败: {e}")
             raise
 
-    def commit(self):
-        """提交事务"""
-        try:
-            self.conn.commit()
-            logger.debug("事务提交成功")
-        except psycopg2.Error as e:
-            logger.error(f"提交事务失败: {e}")
-            raise
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[PostgreSQLConnection]:
+        """
+        事务上下文：借出一个连接，块内语句正常结束时提交，异常时回滚
 
-    def rollback(self):
-        """回滚事务"""
-        try:
-            self.conn.rollback()
-            logger.debug("事务回滚成功")
-        except psycopg2.Error as e:
-            logger.error(f"回滚事务失败: {e}")
-            raise
+        Example:
+            async with pg.transaction() as tx:
+                await tx.execute(...)
+                row = await tx.fetch_one(...)
+        """
+        async with self.pool.connection() as conn:
+            async with conn.transaction():
+                yield PostgreSQLConnection(conn)
 
-    def close(self):
-        """关闭数据库连接"""
+    def pool_stats(self) -> Dict[str, int]:
+        """
+        连接池指标：pool_size / pool_available / requests_waiting 为当前值，
+        requests_num / requests_wait_ms / requests_errors 等为启动以来的累计值
+        """
+        return {"pool_min": self.min_size, "pool_max": self.max_size, **self.pool.get_stats()}
+
+    async def close(self):
+        """关闭连接池"""
         try:
-            if self.cursor:
-                self.cursor.close()
-            if self.conn:
-                self.conn.close()
-            logger.info("关闭PostgreSQL数据库连接")
-        except psycopg2.Error as e:
-            logger.error(f"关闭连接时出错: {e}")
-
-    def __enter__(self):
+            await self.pool.close()
+            logger.info("关闭PostgreSQL连接池")
+        except psycopg.Error as e:
+            logger.error(f"关闭连接池时出错: {e}")
+
+    async def __aenter__(self):
         """上下文管理器入口"""
+        await self.connect()
         return self
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
         """上下文管理器出口"""
-        if exc_type:
-            self.rollback()
-        else:
-            self.commit()
-        self.close()
+        await self.close()
@@ -1,4 +1,4 @@
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 from redis import Redis
 from loguru import logger
@@ -100,6 +100,40 @@ class RedisManager():
 
         return keyname
     
+    def get(self, name: str, prefix: str = None) -> Any:
+        """
+        redis get
+        @param name: redis key
+        @param prefix: 自定义前缀
+        @return value
+        """
+        self._maybe_reconnect()
+        redis_key = self._get_redis_key(name, prefix)
+
+        return self.r.get(redis_key)
+
+    def set(
+        self,
+        name: str,
+        value: Any,
+        ttl: int = SECONDS_IN_ONE_MONTH,
+        nx: bool = False,
+        prefix: str = None,
+    ) -> bool:
+        """
+        redis set
+        @param name: redis key
+        @param value: value
+        @param ttl: 失效时间，单位：秒
+        @param nx: 为 True 时仅在 key 不存在时写入
+        @param prefix: 自定义前缀
+        @return 是否写入
+        """
+        self._maybe_reconnect()
+        redis_key = self._get_redis_key(name, prefix)
+
+        return bool(self.r.set(redis_key, value, ex=ttl if ttl and ttl > 0 else None, nx=nx))
+
     def hset(
         self,
         name: str,
@@ -126,6 +160,30 @@ class RedisManager():
 
         return rtn
 
+    def hset_mapping(
+        self,
+        name: str,
+        mapping: Dict[str, Any],
+        ttl: int = SECONDS_IN_ONE_MONTH,
+        prefix: str = None,
+    ) -> int:
+        """
+        redis hset 多个字段
+        @param name: name
+        @param mapping: 字段/值词典
+        @param ttl: 失效时间，单位：秒，None 或 0 表示不过期
+        @param prefix: 自定义前缀
+        @return int
+        """
+        self._maybe_reconnect()
+        redis_key = self._get_redis_key(name, prefix)
+
+        rtn = self.r.hset(redis_key, mapping=mapping)
+        if ttl is not None and ttl > 0:
+            self.r.expire(redis_key, ttl)
+
+        return rtn
+
     def hget(self, name: str, key: str, prefix: str = None) -> Any:
         """
         redis hget
@@ -139,6 +197,19 @@ class RedisManager():
 
         return self.r.hget(redis_key, key)
 
+    def hmget(self, name: str, keys: List[str], prefix: str = None) -> List[Optional[str]]:
+        """
+        redis hmget
+        @param name: redis key
+        @param keys: hash key 列表
+        @param prefix: 自定义前缀
+        @return 与 keys 一一对应的值列表
+        """
+        self._maybe_reconnect()
+        redis_key = self._get_redis_key(name, prefix)
+
+        return self.r.hmget(redis_key, keys)
+
     def hgetall(self, name: str, prefix: str = None) -> Dict:
         """
         hget
@@ -177,6 +248,31 @@ class RedisManager():
 
         return self.r.hincrby(redis_key, key, value)
 
+    def hdel(self, name: str, key: str, prefix: str = None) -> int:
+        """
+        redis hdel
+        @param name: redis key
+        @param key: hash key
+        @param prefix: 自定义前缀
+        @return 删除的字段数
+        """
+        self._maybe_reconnect()
+        redis_key = self._get_redis_key(name, prefix)
+
+        return self.r.hdel(redis_key, key)
+
+    def rename(self, name: str, new_name: str, prefix: str = None) -> bool:
+        """
+        原子地重命名 key
+        @param name: 原 redis key
+        @param new_name: 新 redis key
+        @param prefix: 自定义前缀
+        @return bool
+        """
+        self._maybe_reconnect()
+
+        return self.r.rename(self._get_redis_key(name, prefix), self._get_redis_key(new_name, prefix))
+
     def delete(self, name: str, prefix: str = None):
         """
         delete key
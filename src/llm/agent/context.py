@@ -0,0 +1,132 @@
+import uuid
+from typing import Any, Awaitable, Callable, List, Optional
+
+from langchain.agents.middleware import AgentMiddleware, AgentState, ModelRequest, ModelResponse
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AnyMessage, HumanMessage, RemoveMessage, SystemMessage
+from langchain_core.messages.utils import count_tokens_approximately, get_buffer_string
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+from loguru import logger
+from typing_extensions import NotRequired
+
+from src.llm.prompt import CONTEXT_SUMMARY_HEADER, CONTEXT_SUMMARY_PROMPT
+from src.util.metrics import metrics
+
+
+class ContextState(AgentState):
+    """在 agent 状态中额外保存较早对话的滚动摘要，随 checkpoint 持久化"""
+    context_summary: NotRequired[str]
+
+
+class ContextPolicyMiddleware(AgentMiddleware):
+    """
+    会话上下文策略：按 token 预算保留最近的对话，更早的部分合并进滚动摘要
+
+    每次调用模型前，如果历史消息超过 max_tokens，就从某个用户消息处切开：
+    之后的消息（不超过 keep_tokens，至少保留当前这一轮）原样保留，之前的消息和已有摘要一起交给
+    summary_model 生成新摘要，写回状态的 context_summary 并从 messages 中删除。
+    切分点总在 HumanMessage 上，因此不会把 AI 的 tool_calls 和对应的 ToolMessage 拆开。
+    摘要通过系统提示词传给模型。摘要生成失败时本轮只在请求中截断、不改写状态，下一轮再试。
+    """
+
+    state_schema = ContextState
+
+    def __init__(self, summary_model: BaseChatModel, max_tokens: int = 6000, keep_tokens: int = 3000,
+                 token_counter: Callable[[List[AnyMessage]], int] = count_tokens_approximately):
+        """
+        Args:
+            summary_model: 生成摘要的模型
+            max_tokens: 历史消息的 token 上限，超过时触发摘要
+            keep_tokens: 摘要后原样保留的最近消息的 token 预算
+            token_counter: token 计数函数，默认按字符数估算
+        """
+        super().__init__()
+        self.summary_model = summary_model
+        self.max_tokens = max_tokens
+        self.keep_tokens = min(keep_tokens, max_tokens)
+        self.token_counter = token_counter
+
+    def _find_cutoff(self, messages: List[AnyMessage], budget: int) -> int:
+        """返回保留部分的起始下标：预算内最早的一个 HumanMessage，预算不够时取最后一个 HumanMessage"""
+        cutoff = 0
+        for index in range(len(messages) - 1, -1, -1):
+            if not isinstance(messages[index], HumanMessage):
+                continue
+            if cutoff and self.token_counter(messages[index:]) > budget:
+                break
+            cutoff = index
+        return cutoff
+
+    def _plan(self, state: ContextState) -> Optional[int]:
+        messages = state["messages"]
+        total = self.token_counter(messages)
+        metrics.observe("ai.context.history_tokens", total)
+        if total <= self.max_tokens:
+            return None
+        cutoff = self._find_cutoff(messages, self.keep_tokens)
+        return cutoff or None
+
+    def _summary_prompt(self, state: ContextState, older: List[AnyMessage]) -> str:
+        return CONTEXT_SUMMARY_PROMPT.format(summary=state.get("context_summary") or "无",
+                                             messages=get_buffer_string(older))
+
+    def _update(self, state: ContextState, cutoff: int, summary: str) -> dict:
+        messages = state["messages"]
+        for message in messages:
+            if message.id is None:
+                message.id = str(uuid.uuid4())
+        metrics.incr("ai.context.summarized")
+        metrics.incr("ai.context.summarized_messages", cutoff)
+        return {
+            "messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES), *messages[cutoff:]],
+            "context_summary": summary,
+        }
+
+    def before_model(self, state: ContextState, runtime) -> Optional[dict[str, Any]]:
+        cutoff = self._plan(state)
+        if cutoff is None:
+            return None
+        try:
+            response = self.summary_model.invoke(self._summary_prompt(state, state["messages"][:cutoff]))
+        except Exception as e:
+            logger.warning(f"会话摘要生成失败，本轮仅截断请求: {e}")
+            metrics.incr("ai.context.summary_errors")
+            return None
+        return self._update(state, cutoff, response.text.strip())
+
+    async def abefore_model(self, state: ContextState, runtime) -> Optional[dict[str, Any]]:
+        cutoff = self._plan(state)
+        if cutoff is None:
+            return None
+        try:
+            with metrics.timer("ai.context.summary_ms"):
+                response = await self.summary_model.ainvoke(
+                    self._summary_prompt(state, state["messages"][:cutoff]))
+        except Exception as e:
+            logger.warning(f"会话摘要生成失败，本轮仅截断请求: {e}")
+            metrics.incr("ai.context.summary_errors")
+            return None
+        return self._update(state, cutoff, response.text.strip())
+
+    def _prepare(self, request: ModelRequest) -> ModelRequest:
+        """把摘要拼到系统提示词后面，并保证发给模型的消息不超过 max_tokens"""
+        overrides = {}
+        summary = request.state.get("context_summary")
+        if summary:
+            base = request.system_message.text if request.system_message else ""
+            overrides["system_message"] = SystemMessage(content=f"{base}\n\n{CONTEXT_SUMMARY_HEADER}{summary}")
+        if self.token_counter(request.messages) > self.max_tokens:
+            cutoff = self._find_cutoff(request.messages, self.max_tokens)
+            if cutoff:
+                overrides["messages"] = request.messages[cutoff:]
+        metrics.observe("ai.context.prompt_tokens",
+                        self.token_counter(overrides.get("messages", request.messages)))
+        return request.override(**overrides) if overrides else request
+
+    def wrap_model_call(self, request: ModelRequest,
+                        handler: Callable[[ModelRequest], ModelResponse]) -> ModelResponse:
+        return handler(self._prepare(request))
+
+    async def awrap_model_call(self, request: ModelRequest,
+                               handler: Callable[[ModelRequest], Awaitable[ModelResponse]]) -> ModelResponse:
+        return await handler(self._prepare(request))
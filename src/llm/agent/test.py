@@ -1,47 +1,88 @@
-import asyncio
-import json
+import time
+from typing import Optional
 from langchain.agents import create_agent
 from loguru import logger
 
-from src.llm.model.mistral import model
+from src.llm.model.registry import models
 from src.llm.prompt import SYSTEM_PROMPT
-from src.llm.tools import get_client_ip, get_current_location, get_weather_for_location
+from src.llm.tools import get_client_ip, get_current_location, get_weather_for_location, search_blog
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from src.llm.agent.context import ContextPolicyMiddleware
 from src.llm.agent.respones import final_answer_tool
-from src.llm.tools.tool import generate_python_code
+from src.llm.agent.tool_policy import ToolPolicyMiddleware
+from src.llm.tools.tool import DEFAULT_TOOL_TIMEOUT, TOOL_TIMEOUTS, generate_python_code
+from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import AIMessage, BaseMessage, ToolMessage, HumanMessage
 
 
 class TestAgent:
-    def __init__(self, checkpointer: AsyncPostgresSaver):
+    def __init__(self, checkpointer: AsyncPostgresSaver, max_context_tokens: int = 6000,
+                 keep_context_tokens: int = 3000, model: Optional[BaseChatModel] = None):
+        """
+        Args:
+            checkpointer: 会话状态的持久化
+            max_context_tokens: 每轮发给模型的历史消息 token 上限，超过时较早的对话合并为摘要
+            keep_context_tokens: 摘要后原样保留的最近对话的 token 预算
+            model: 使用的聊天模型（如带对冲的 HedgedChatModel），默认为 registry 中的 mistral
+        """
+        model = model or models.get("mistral")
+        self.model = model
         self.agent = create_agent(
             model=model,
             tools=[get_client_ip, get_current_location, get_weather_for_location,
-                   generate_python_code],
+                   generate_python_code, search_blog],
             system_prompt=SYSTEM_PROMPT,
             checkpointer=checkpointer,
+            middleware=[ContextPolicyMiddleware(summary_model=model, max_tokens=max_context_tokens,
+                                                keep_tokens=keep_context_tokens),
+                        # 同一轮的多个工具调用并行执行，每个工具单独限时
+                        ToolPolicyMiddleware(timeouts=TOOL_TIMEOUTS, default_timeout=DEFAULT_TOOL_TIMEOUT)],
         )
 
     def select_model(self):
-        return model
+        return self.model
 
     async def invoke(self, message: str, config: dict):
+        result = await self.run(message, config)
+        return result.get("messages")[-1].content
+
+    async def run(self, message: str, config: dict) -> dict:
+        """执行一轮对话，返回 agent 的完整状态（包括本轮的工具调用消息）"""
         input_data = {"messages": [{"role": "user", "content": message}]}
         logger.info(f"invoke: {input_data}, config: {config}")
         result = await self.agent.ainvoke(input_data, config=config)
         logger.info(f"invoke result: {result.get('messages')[-1].content}")
-        return result.get("messages")[-1].content
+        return result
+
+    async def has_history(self, config: dict) -> bool:
+        """会话中是否已有消息或摘要"""
+        state = await self.agent.aget_state(config)
+        return bool(state.values.get("messages") or state.values.get("context_summary"))
+
+    async def append_turn(self, message: str, answer: str, config: dict):
+        """不调用模型，把一轮问答直接写入会话（用于缓存命中时保持会话历史完整）"""
+        await self.agent.aupdate_state(config, {"messages": [HumanMessage(content=message),
+                                                             AIMessage(content=answer)]},
+                                       as_node="model")
+
+    @staticmethod
+    def used_tools(messages) -> bool:
+        """消息中是否有工具调用"""
+        return any(isinstance(msg, ToolMessage) or (isinstance(msg, AIMessage) and msg.tool_calls)
+                   for msg in messages)
 
     async def invoke_stream(self, message: str, config: dict):
         """
         流式调用 agent，按 token 返回最终响应
 
+        只产出文本 token，分帧（SSE 等）由调用方负责。
+
         Args:
             message: 用户消息
             config: 配置字典
 
         Yields:
-            SSE 格式的数据块（data: {...}\n\n）
+            模型输出的文本片段
         """
 
         input_data = {"messages": [{"role": "user", "content": message}]}
@@ -61,14 +102,54 @@ class TestAgent:
             if node_name == "model":
                 # 3. 检查是否有文本内容（排除掉工具调用的指令消息）
                 if msg.content and isinstance(msg.content, str):
-                    # 封装并发送
-                    chunk = json.dumps(
-                        {"token": msg.content}, ensure_ascii=False)
-                    yield f"data: {chunk}\n\n"
+                    yield msg.content
 
             # 如果 node_name 是 "tools"，这里可以选择记录日志，但不要 yield 给前端
             elif node_name == "tools":
                 logger.debug("工具正在运行，跳过输出...")
 
-        # 发送结束标记
-        yield "data: [DONE]\n\n"
+    async def stream_events(self, message: str, config: dict):
+        """
+        流式调用 agent，按结构化事件返回
+
+        事件（dict，type 字段区分）:
+            token: 模型输出的文本片段 {"type": "token", "text": ...}
+            tool_start: 工具开始 {"type": "tool_start", "id": ..., "name": ...}
+            tool_end: 工具结束 {"type": "tool_end", "id": ..., "name": ..., "status": "ok" | "error", "duration_ms": ...}
+            usage: 本轮合计的 token 用量 {"type": "usage", "input_tokens": ..., "output_tokens": ..., "model_calls": ...}
+        结束事件（done）由调用方在流结束后补充。
+
+        Args:
+            message: 用户消息
+            config: 配置字典
+        """
+        input_data = {"messages": [{"role": "user", "content": message}]}
+        usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0, "model_calls": 0}
+        tool_started = {}
+
+        async for event in self.agent.astream_events(input_data, config=config, version="v2"):
+            kind = event["event"]
+            # 上下文摘要等中间件内部的模型调用不属于本轮回答
+            if (event.get("metadata") or {}).get("langgraph_node") != "model" and kind.startswith("on_chat_model"):
+                continue
+
+            if kind == "on_chat_model_stream":
+                chunk = event["data"].get("chunk")
+                if chunk is not None and chunk.content and isinstance(chunk.content, str):
+                    yield {"type": "token", "text": chunk.content}
+            elif kind == "on_chat_model_end":
+                output = event["data"].get("output")
+                usage_metadata = getattr(output, "usage_metadata", None) or {}
+                usage["model_calls"] += 1
+                for key in ("input_tokens", "output_tokens", "total_tokens"):
+                    usage[key] += usage_metadata.get(key, 0)
+            elif kind == "on_tool_start":
+                tool_started[event["run_id"]] = time.perf_counter()
+                yield {"type": "tool_start", "id": str(event["run_id"]), "name": event["name"]}
+            elif kind in ("on_tool_end", "on_tool_error"):
+                started = tool_started.pop(event["run_id"], None)
+                duration_ms = round((time.perf_counter() - started) * 1000, 1) if started else None
+                yield {"type": "tool_end", "id": str(event["run_id"]), "name": event["name"],
+                       "status": "ok" if kind == "on_tool_end" else "error", "duration_ms": duration_ms}
+
+        yield {"type": "usage", **usage}
@@ -0,0 +1,57 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional, Union
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain.agents.middleware.types import ToolCallRequest
+from langchain_core.messages import ToolMessage
+from langgraph.types import Command
+from loguru import logger
+
+from src.util.metrics import metrics
+
+
+class ToolPolicyMiddleware(AgentMiddleware):
+    """
+    工具调用的超时和耗时统计
+
+    模型在一轮中发起的多个工具调用由 ToolNode 用 asyncio.gather 并行执行，这一轮的耗时取决于最慢的工具；
+    这里给每个工具套上各自的超时，超时的工具返回一条错误 ToolMessage 让模型自行处理，
+    不会拖住同一轮的其他工具和整轮对话。每次调用按工具名记录耗时和结果。
+    """
+
+    def __init__(self, timeouts: Optional[Dict[str, float]] = None, default_timeout: float = 10.0):
+        """
+        Args:
+            timeouts: 工具名 -> 超时时间（秒）
+            default_timeout: 未单独配置的工具的超时时间（秒）
+        """
+        super().__init__()
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+
+    async def awrap_tool_call(
+            self,
+            request: ToolCallRequest,
+            handler: Callable[[ToolCallRequest], Awaitable[Union[ToolMessage, Command]]],
+    ) -> Union[ToolMessage, Command]:
+        name = request.tool_call["name"]
+        timeout = self.timeouts.get(name, self.default_timeout)
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            result = await asyncio.wait_for(handler(request), timeout=timeout)
+            if isinstance(result, ToolMessage) and result.status == "error":
+                status = "error"
+            return result
+        except asyncio.TimeoutError:
+            status = "timeout"
+            logger.warning(f"工具 {name} 超过 {timeout}s 未返回，已取消")
+            return ToolMessage(content=f"工具 {name} 执行超时（{timeout} 秒），请不要依赖它的结果或稍后再试",
+                               tool_call_id=request.tool_call["id"], name=name, status="error")
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            metrics.observe("ai.tool.latency_ms", (time.perf_counter() - start) * 1000, tool=name)
+            metrics.incr("ai.tool.calls", tool=name, status=status)
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from loguru import logger
+
+from src.database.redis.redis_manage import RedisManager
+from src.util.metrics import metrics
+
+ANSWER_KEY = "ai:answer:{}"
+VECTOR_INDEX_KEY = "ai:answer:vectors"
+# 匹配这些正则的问题通常依赖用户的位置、时间等个人信息，答案不能复用；
+# ip 要求前后不是英文字母或数字，避免误伤 pip、zip、script、tips 等词
+DEFAULT_BYPASS_PATTERNS = ("天气", "位置", "在哪", r"(?<![a-z0-9])ip(?![a-z0-9])", "今天", "明天", "现在", "时间",
+                           "我的")
+_TRAILING_PUNCTUATION = "?？!！。.,，~～ "
+
+
+def normalize_question(question: str) -> str:
+    """统一全半角、大小写和空白，去掉结尾的标点，使措辞相同的问题得到相同的 key"""
+    text = unicodedata.normalize("NFKC", question).lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(_TRAILING_PUNCTUATION)
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class AnswerCache:
+    """
+    AI 回答缓存
+
+    key 由归一化后的问题、系统提示词和模型名共同决定，任何一项变化都不会命中旧答案。
+    先按 key 精确查找；配置了 embedder 时再按问题向量的余弦相似度查找最相近的已缓存问题。
+    问题向量保存在 Redis，进程内缓存成一个归一化的 NumPy 矩阵，每 refresh_interval 秒重新加载一次，
+    相似匹配只是一次矩阵向量乘，不必每次未命中都读取并解析全部向量。
+    只缓存会话首轮、未调用工具的回答，是否可缓存由调用方通过 should_bypass / store 判断。
+    """
+
+    def __init__(self, cache: RedisManager, model_name: str, system_prompt: str, ttl: int = 86400,
+                 embedder: Optional[Callable[[str], Sequence[float]]] = None,
+                 similarity_threshold: float = 0.92, max_candidates: int = 500,
+                 bypass_patterns: Iterable[str] = DEFAULT_BYPASS_PATTERNS, refresh_interval: float = 30.0):
+        """
+        Args:
+            cache: Redis 连接
+            model_name: 模型名，参与 key 计算
+            system_prompt: 系统提示词，参与 key 计算
+            ttl: 缓存有效期（秒）
+            embedder: 文本向量化函数，不提供时只做精确匹配；必须能区分措辞相近但含义不同的问题
+            similarity_threshold: 相似匹配的余弦相似度下限，应取 embedder 对应后端标定的值
+            max_candidates: 相似匹配时最多比较的已缓存问题数
+            bypass_patterns: 正则列表，问题（归一化后）匹配任一模式时不走缓存
+            refresh_interval: 从 Redis 重新加载问题向量的间隔（秒）
+        """
+        self.cache = cache
+        self.ttl = ttl
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+        self.max_candidates = max_candidates
+        self.bypass_patterns = [re.compile(pattern.lower()) for pattern in bypass_patterns]
+        self.refresh_interval = refresh_interval
+        self._keys: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._loaded_at = 0.0
+        self.scope = hashlib.sha1(f"{model_name}\x00{system_prompt}".encode("utf-8")).hexdigest()[:12]
+        metrics.register_gauge("ai.answer_cache", self.stats)
+
+    def key_of(self, question: str) -> str:
+        digest = hashlib.sha256(f"{self.scope}\x00{normalize_question(question)}".encode("utf-8")).hexdigest()
+        return digest[:32]
+
+    def should_bypass(self, question: str) -> bool:
+        """问题是否与用户个人信息相关，相关时既不查也不写缓存"""
+        text = normalize_question(question)
+        return any(pattern.search(text) for pattern in self.bypass_patterns)
+
+    def lookup(self, question: str) -> Optional[str]:
+        """
+        查找缓存的回答
+
+        Returns:
+            命中时返回回答，否则返回 None
+        """
+        try:
+            answer = self._get(self.key_of(question))
+            if answer is not None:
+                metrics.incr("ai.answer_cache.hit", kind="exact")
+                return answer
+            if self.embedder is not None:
+                answer = self._lookup_similar(question)
+                if answer is not None:
+                    metrics.incr("ai.answer_cache.hit", kind="similar")
+                    return answer
+        except Exception as e:
+            logger.warning(f"读取回答缓存失败: {e}")
+            metrics.incr("ai.answer_cache.error")
+            return None
+        metrics.incr("ai.answer_cache.miss")
+        return None
+
+    def store(self, question: str, answer: str) -> None:
+        """写入回答；配置了 embedder 时同时写入问题向量用于相似匹配"""
+        if not answer:
+            return
+        key = self.key_of(question)
+        try:
+            self.cache.set(ANSWER_KEY.format(key), json.dumps({"question": question, "answer": answer},
+                                                             ensure_ascii=False), ttl=self.ttl)
+            if self.embedder is not None:
+                vector = _unit(self.embedder(normalize_question(question)))
+                self.cache.hset(VECTOR_INDEX_KEY, key, json.dumps([round(float(x), 5) for x in vector]),
+                                ttl=self.ttl)
+                self._prune_vectors()
+                self._append_vector(key, vector)
+            metrics.incr("ai.answer_cache.store")
+        except Exception as e:
+            logger.warning(f"写入回答缓存失败: {e}")
+            metrics.incr("ai.answer_cache.error")
+
+    def _get(self, key: str) -> Optional[str]:
+        raw = self.cache.get(ANSWER_KEY.format(key))
+        return json.loads(raw)["answer"] if raw else None
+
+    def _load_vectors(self) -> Optional[np.ndarray]:
+        """返回进程内的问题向量矩阵，过期时从 Redis 重新加载"""
+        if self._matrix is None or time.monotonic() - self._loaded_at > self.refresh_interval:
+            vectors: Dict[str, str] = self.cache.hgetall(VECTOR_INDEX_KEY) or {}
+            items = list(vectors.items())[-self.max_candidates:]
+            self._keys = [key for key, _ in items]
+            self._matrix = np.array([_unit(json.loads(raw)) for _, raw in items], dtype=np.float32) \
+                if items else None
+            self._loaded_at = time.monotonic()
+        return self._matrix
+
+    def _append_vector(self, key: str, vector: np.ndarray) -> None:
+        """本进程新写入的向量直接追加到矩阵，不必等下次重新加载"""
+        if self._matrix is None or self._matrix.shape[1] != len(vector):
+            return
+        if key in self._keys:
+            self._matrix[self._keys.index(key)] = vector
+            return
+        self._keys.append(key)
+        self._matrix = np.vstack([self._matrix, vector[None, :]])[-self.max_candidates:]
+        self._keys = self._keys[-self.max_candidates:]
+
+    def _drop_vector(self, key: str) -> None:
+        self.cache.hdel(VECTOR_INDEX_KEY, key)
+        if key in self._keys:
+            row = self._keys.index(key)
+            del self._keys[row]
+            self._matrix = np.delete(self._matrix, row, axis=0) if self._keys else None
+
+    def _lookup_similar(self, question: str) -> Optional[str]:
+        matrix = self._load_vectors()
+        if matrix is None:
+            return None
+        query = _unit(self.embedder(normalize_question(question)))
+        if matrix.shape[1] != len(query):
+            return None
+        scores = matrix @ query
+        candidates = [self._keys[row] for row in np.argsort(-scores) if scores[row] >= self.similarity_threshold]
+        for key in candidates:
+            answer = self._get(key)
+            if answer is not None:
+                return answer
+            # 回答已过期，清理对应的向量
+            self._drop_vector(key)
+        return None
+
+    def _prune_vectors(self) -> None:
+        """向量数超过 max_candidates 时删除回答已过期的向量"""
+        vectors = self.cache.hgetall(VECTOR_INDEX_KEY)
+        if len(vectors) <= self.max_candidates:
+            return
+        for key in vectors:
+            if not self.cache.exist(ANSWER_KEY.format(key)):
+                self.cache.hdel(VECTOR_INDEX_KEY, key)
+
+    def stats(self) -> dict:
+        hits = metrics.counter("ai.answer_cache.hit", kind="exact") + metrics.counter("ai.answer_cache.hit",
+                                                                                      kind="similar")
+        lookups = hits + metrics.counter("ai.answer_cache.miss")
+        return {
+            "hits": hits,
+            "lookups": lookups,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "bypassed": metrics.counter("ai.answer_cache.bypass"),
+        }
@@ -0,0 +1,65 @@
+import time
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from src.llm.usage import RequestUsage
+
+
+class UsageCallbackHandler(AsyncCallbackHandler):
+    """
+    把一次请求内所有模型调用和工具调用的用量、耗时记到 RequestUsage 上
+
+    通过 config["callbacks"] 传入，agent 内部（包括中间件的摘要调用）的模型和工具都会触发。
+    首 token 时间由流式接口在产出第一个回答 token 时记录，不在这里统计。
+    """
+
+    # 同步执行回调，避免计时被事件循环调度延迟
+    run_inline = True
+
+    def __init__(self, usage: RequestUsage):
+        self.usage = usage
+        self._started: Dict[UUID, float] = {}
+        self._tool_names: Dict[UUID, str] = {}
+
+    async def on_chat_model_start(self, serialized: Dict[str, Any], messages, *, run_id: UUID,
+                                  **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        duration_ms = (time.perf_counter() - started) * 1000 if started else 0.0
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage_metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage_metadata.get("input_tokens", 0)
+                output_tokens += usage_metadata.get("output_tokens", 0)
+        if not input_tokens and not output_tokens:
+            # 部分接口只在 llm_output 中返回 OpenAI 格式的用量
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            input_tokens = token_usage.get("prompt_tokens", 0)
+            output_tokens = token_usage.get("completion_tokens", 0)
+        self.usage.add_model_call(input_tokens, output_tokens, duration_ms)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started.pop(run_id, None)
+
+    async def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID,
+                            **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+        self._tool_names[run_id] = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+
+    async def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_tool(run_id, ok=True)
+
+    async def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_tool(run_id, ok=False)
+
+    def _end_tool(self, run_id: UUID, ok: bool):
+        started: Optional[float] = self._started.pop(run_id, None)
+        name = self._tool_names.pop(run_id, "unknown")
+        if started is not None:
+            self.usage.add_tool_call(name, (time.perf_counter() - started) * 1000, ok=ok)
@@ -6,6 +6,14 @@ API_KEY = getenv("OPENROUTER_API_KEY")
 TEST_MODEL = "mistralai/devstral-2512:free"
 TEST_MODEL_PROVIDER = "mistralai"
 
+# 模型后端：openrouter（默认）或 fake（本地模拟模型，用于离线压测）
+LLM_BACKEND = getenv("LLM_BACKEND", "openrouter")
+FAKE_LLM_TOKENS_PER_SECOND = float(getenv("FAKE_LLM_TOKENS_PER_SECOND", "50"))
+FAKE_LLM_LATENCY_MS = float(getenv("FAKE_LLM_LATENCY_MS", "200"))
+FAKE_LLM_RESPONSE_TOKENS = int(getenv("FAKE_LLM_RESPONSE_TOKENS", "64"))
+# JSON 列表，如 [{"name": "get_weather_for_location", "args": {"location": "北京"}}]
+FAKE_LLM_TOOL_SCRIPT = getenv("FAKE_LLM_TOOL_SCRIPT", "[]")
+
 
 LANGSMITH_TRACING = getenv("LANGSMITH_TRACING")
 LANGSMITH_ENDPOINT = getenv("LANGSMITH_ENDPOINT")
@@ -0,0 +1,228 @@
+import asyncio
+import base64
+import hashlib
+import io
+import ipaddress
+import mimetypes
+import os
+import socket
+from typing import Optional, Tuple
+from urllib.parse import unquote
+
+import httpx
+from loguru import logger
+
+from src.database.redis.redis_manage import RedisManager
+from src.util.cache import TwoTierCache
+from src.util.http_client import get_http_client
+from src.util.metrics import metrics
+
+try:
+    from PIL import Image
+except ImportError:  # 部署时应安装 Pillow（已在依赖中声明），缺失时无法缩放，原图直接发给模型
+    Image = None
+
+# 远程图片最多跟随的重定向次数
+MAX_REDIRECTS = 3
+ALLOWED_MIME_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp", "image/bmp"}
+
+
+class InvalidImage(ValueError):
+    """图片地址不合法、无法读取或超过大小限制（对应 HTTP 400）"""
+
+
+class ImagePreparer:
+    """
+    为视觉模型准备图片
+
+    本站图片（images_dir 中的文件，或以 public_url_prefix 开头的地址）直接读本地文件，其他 http(s) 地址用共享 HTTP 客户端下载；
+    安装了 Pillow 时把长边缩到 max_side 以内并重新编码，再以 data URI 交给模型，模型服务不必再去拉取原图。
+    处理结果按原图内容的 sha256 缓存，同一张图（即使地址不同）只处理一次；地址到内容哈希的映射也短期缓存，
+    重复请求同一地址时不再下载。
+    """
+
+    def __init__(self, images_dir: Optional[str] = None, public_url_prefix: Optional[str] = None,
+                 max_side: int = 1024, max_fetch_bytes: int = 10 * 1024 * 1024, jpeg_quality: int = 85,
+                 payload_ttl: int = 86400, uri_ttl: int = 3600, answer_ttl: int = 7 * 86400):
+        """
+        Args:
+            images_dir: 本站图片目录
+            public_url_prefix: 本站图片的公开地址前缀，如 https://sunworld.site/static/imgs/
+            max_side: 缩放后长边的最大像素
+            max_fetch_bytes: 原图的最大字节数
+            jpeg_quality: 重新编码为 JPEG 时的质量
+            payload_ttl: 处理结果的缓存时间（秒）
+            uri_ttl: 地址到内容哈希映射的缓存时间（秒）
+            answer_ttl: 模型回答的缓存时间（秒）
+        """
+        self.images_dir = os.path.realpath(images_dir) if images_dir else None
+        self.public_url_prefix = public_url_prefix
+        self.max_side = max_side
+        self.max_fetch_bytes = max_fetch_bytes
+        self.jpeg_quality = jpeg_quality
+        self.payload_cache = TwoTierCache("image:payload", ttl=payload_ttl, negative_ttl=0, l1_size=64)
+        self.uri_cache = TwoTierCache("image:uri", ttl=uri_ttl, negative_ttl=0, l1_size=1024)
+        # 按 (内容哈希, 模型, 问题) 缓存回答，由 AiManager 读写
+        self.answer_cache = TwoTierCache("image:answer", ttl=answer_ttl, negative_ttl=0, l1_size=256)
+        if Image is None:
+            logger.warning("未安装 Pillow，识图接口将直接发送原图，不做缩放")
+
+    def bind_redis(self, redis: Optional[RedisManager]):
+        for cache in (self.payload_cache, self.uri_cache, self.answer_cache):
+            cache.bind_redis(redis)
+
+    @staticmethod
+    def answer_key(digest: str, model: str, question: str) -> str:
+        return hashlib.sha1(f"{digest}\x00{model}\x00{question.strip()}".encode("utf-8")).hexdigest()
+
+    def __repr__(self) -> str:
+        return f"image preparer dir={self.images_dir} max_side={self.max_side} pillow={Image is not None}"
+
+    def local_path(self, uri: str) -> Optional[str]:
+        """本站图片返回本地路径，其他地址返回 None；路径越出 images_dir 时抛出 InvalidImage"""
+        if not self.images_dir:
+            return None
+        if self.public_url_prefix and uri.startswith(self.public_url_prefix):
+            name = uri[len(self.public_url_prefix):]
+        elif "://" not in uri:
+            name = uri
+        else:
+            return None
+        name = unquote(name.split("?", 1)[0]).lstrip("/")
+        path = os.path.realpath(os.path.join(self.images_dir, name))
+        if os.path.commonpath([path, self.images_dir]) != self.images_dir:
+            raise InvalidImage("图片路径不合法")
+        return path
+
+    async def _read(self, uri: str) -> Tuple[bytes, Optional[str]]:
+        """读取原图，返回 (字节, Content-Type)"""
+        path = self.local_path(uri)
+        if path is not None:
+            if not os.path.isfile(path):
+                raise InvalidImage("图片不存在")
+            if os.path.getsize(path) > self.max_fetch_bytes:
+                raise InvalidImage("图片过大")
+            with metrics.timer("ai.image.read_ms", source="local"):
+                data = await asyncio.to_thread(_read_file, path)
+            return data, mimetypes.guess_type(path)[0]
+
+        with metrics.timer("ai.image.read_ms", source="remote"):
+            return await self._fetch(uri)
+
+    async def _fetch(self, uri: str) -> Tuple[bytes, Optional[str]]:
+        """
+        下载远程图片
+
+        不让 httpx 自动跟随重定向：每一跳都重新解析并检查地址，再直接连接检查过的 IP，
+        避免重定向到内网或 httpx 二次解析域名时被换成内网地址（DNS rebinding）。
+        响应体边读边计数，超过 max_fetch_bytes 立即中止，不把超大响应整个读进内存。
+        """
+        client = get_http_client()
+        for _ in range(MAX_REDIRECTS + 1):
+            url, address = await self._check_remote(uri)
+            headers = {"Host": url.netloc.decode("ascii")}
+            extensions = {"sni_hostname": url.host} if url.scheme == "https" else {}
+            async with client.stream("GET", url.copy_with(host=address), headers=headers, extensions=extensions,
+                                     follow_redirects=False) as response:
+                if response.is_redirect and "location" in response.headers:
+                    uri = str(url.join(response.headers["location"]))
+                    continue
+                if response.status_code != 200:
+                    raise InvalidImage(f"下载图片失败: HTTP {response.status_code}")
+                length = response.headers.get("content-length", "")
+                if length.isdigit() and int(length) > self.max_fetch_bytes:
+                    raise InvalidImage("图片过大")
+                data = bytearray()
+                async for chunk in response.aiter_bytes():
+                    data += chunk
+                    if len(data) > self.max_fetch_bytes:
+                        raise InvalidImage("图片过大")
+                return bytes(data), response.headers.get("content-type", "").split(";")[0].strip() or None
+        raise InvalidImage("图片地址重定向次数过多")
+
+    @staticmethod
+    async def _check_remote(uri: str) -> Tuple[httpx.URL, str]:
+        """
+        只允许访问公网 http(s) 地址，避免借图片接口探测内网服务
+
+        Returns:
+            (解析后的地址, 检查通过、应当连接的 IP)
+        """
+        try:
+            url = httpx.URL(uri)
+        except httpx.InvalidURL:
+            raise InvalidImage("图片地址不合法")
+        if url.scheme not in ("http", "https") or not url.host:
+            raise InvalidImage("只支持 http(s) 地址或本站图片")
+        port = url.port or (443 if url.scheme == "https" else 80)
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(url.host, port, type=socket.SOCK_STREAM)
+        except OSError:
+            raise InvalidImage("无法解析图片地址")
+        addresses = [info[4][0] for info in infos]
+        for address in addresses:
+            ip = ipaddress.ip_address(address)
+            if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+                ip = ip.ipv4_mapped
+            if not ip.is_global:
+                raise InvalidImage("不允许访问内网地址")
+        if not addresses:
+            raise InvalidImage("无法解析图片地址")
+        return url, addresses[0]
+
+    def _encode(self, data: bytes, mime_type: Optional[str]) -> str:
+        """缩放并重新编码，返回 data URI；在线程池中执行"""
+        if Image is not None:
+            try:
+                with Image.open(io.BytesIO(data)) as image:
+                    image.load()
+                    if max(image.size) > self.max_side or len(data) > 512 * 1024:
+                        image.thumbnail((self.max_side, self.max_side))
+                        buffer = io.BytesIO()
+                        if image.mode in ("RGBA", "LA", "P"):
+                            image.save(buffer, format="PNG", optimize=True)
+                            mime_type = "image/png"
+                        else:
+                            image.convert("RGB").save(buffer, format="JPEG", quality=self.jpeg_quality,
+                                                      optimize=True)
+                            mime_type = "image/jpeg"
+                        if buffer.tell() < len(data):
+                            data = buffer.getvalue()
+                    else:
+                        mime_type = Image.MIME.get(image.format, mime_type)
+            except Exception as e:
+                raise InvalidImage(f"无法识别的图片: {e}")
+        if mime_type not in ALLOWED_MIME_TYPES:
+            raise InvalidImage(f"不支持的图片类型: {mime_type}")
+        return f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+    async def prepare(self, uri: str) -> Tuple[str, str]:
+        """
+        读取并处理图片
+
+        Returns:
+            (原图内容的 sha256, 发给模型的 data URI)
+        """
+        digest = self.uri_cache.get(uri)
+        if digest is not None:
+            payload = self.payload_cache.get(digest)
+            if payload is not None:
+                return digest, payload
+
+        data, mime_type = await self._read(uri)
+        digest = hashlib.sha256(data).hexdigest()
+        self.uri_cache.set(uri, digest)
+
+        async def encode():
+            with metrics.timer("ai.image.encode_ms"):
+                payload = await asyncio.to_thread(self._encode, data, mime_type)
+            metrics.observe("ai.image.payload_ratio", len(payload) / max(len(data), 1))
+            logger.info(f"图片 {digest[:12]} 已处理: {len(data)} -> {len(payload)} 字节")
+            return payload
+
+        return digest, await self.payload_cache.get_or_load(digest, encode)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
@@ -0,0 +1,150 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from loguru import logger
+
+from src.util.metrics import metrics
+
+
+class LimiterRejected(Exception):
+    """排队已满或等待超时，请求被拒绝（对应 HTTP 503）"""
+
+    def __init__(self, model: str, reason: str, retry_after: int = 1):
+        super().__init__(f"{model} 繁忙（{reason}），请稍后重试")
+        self.model = model
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class FairLimiter:
+    """
+    单个模型的并发限制
+
+    同时最多 max_concurrency 个上游调用；超出的请求按用户分队列等待，释放名额时在有等待的用户之间轮转，
+    避免一个用户的突发请求占满队列。排队总数达到 max_queue 时直接拒绝，等待超过 max_wait 秒也拒绝，
+    让调用方尽快返回 503，而不是把请求堆积到上游触发 429。
+    """
+
+    def __init__(self, name: str, max_concurrency: int = 4, max_wait: float = 10.0, max_queue: int = 50):
+        """
+        Args:
+            name: 模型名，用于日志和指标
+            max_concurrency: 最大并发调用数
+            max_wait: 排队的最长等待时间（秒）
+            max_queue: 最大排队数，0 表示不排队、没有空闲名额时直接拒绝
+        """
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiting = 0
+        # 用户 -> 该用户的等待队列；有序字典的顺序即轮转顺序
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+
+    def stats(self) -> dict:
+        return {"in_flight": self.in_flight, "waiting": self.waiting, "users_waiting": len(self._queues),
+                "max_concurrency": self.max_concurrency, "max_queue": self.max_queue}
+
+    async def acquire(self, user: str) -> None:
+        """获取一个调用名额，拿不到时抛出 LimiterRejected"""
+        if self.in_flight < self.max_concurrency and not self.waiting:
+            self.in_flight += 1
+            metrics.observe("ai.limiter.wait_ms", 0.0, model=self.name)
+            return
+        if self.waiting >= self.max_queue:
+            metrics.incr("ai.limiter.rejected", model=self.name, reason="queue_full")
+            raise LimiterRejected(self.name, "排队已满")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user, deque()).append(future)
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            if not self._discard(user, future):
+                # 超时的同时刚好被分配到名额，名额由本请求持有
+                metrics.observe("ai.limiter.wait_ms", (time.perf_counter() - start) * 1000, model=self.name)
+                return
+            metrics.incr("ai.limiter.rejected", model=self.name, reason="timeout")
+            raise LimiterRejected(self.name, "等待超时", retry_after=int(self.max_wait))
+        except asyncio.CancelledError:
+            if not self._discard(user, future):
+                self.release()
+            raise
+        metrics.observe("ai.limiter.wait_ms", (time.perf_counter() - start) * 1000, model=self.name)
+
+    def try_acquire(self) -> bool:
+        """有空闲名额且无人排队时立即占用并返回 True，否则返回 False，不排队"""
+        if self.in_flight < self.max_concurrency and not self.waiting:
+            self.in_flight += 1
+            return True
+        return False
+
+    def _discard(self, user: str, future: asyncio.Future) -> bool:
+        """把仍在排队的请求移出队列，已经被分配名额时返回 False"""
+        if future.done():
+            return False
+        queue = self._queues.get(user)
+        if queue is not None:
+            queue.remove(future)
+            if not queue:
+                del self._queues[user]
+        self.waiting -= 1
+        future.cancel()
+        return True
+
+    def release(self) -> None:
+        """归还名额；有等待者时直接转交给轮转到的下一个用户"""
+        while self._queues:
+            user, queue = self._queues.popitem(last=False)
+            future = queue.popleft()
+            if queue:
+                # 该用户还有请求在等，排到轮转队尾
+                self._queues[user] = queue
+            self.waiting -= 1
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, user: str) -> AsyncIterator[None]:
+        await self.acquire(user)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class ModelLimiters:
+    """按模型名管理 FairLimiter，未单独配置的模型使用默认参数"""
+
+    def __init__(self, default: Optional[dict] = None, models: Optional[Dict[str, dict]] = None):
+        """
+        Args:
+            default: 默认参数（max_concurrency / max_wait / max_queue）
+            models: 模型名 -> 覆盖的参数
+        """
+        self.default = default or {}
+        self.models = models or {}
+        self.limiters: Dict[str, FairLimiter] = {}
+        metrics.register_gauge("ai.limiter", self.stats)
+
+    def get(self, model: str) -> FairLimiter:
+        limiter = self.limiters.get(model)
+        if limiter is None:
+            options = {**self.default, **self.models.get(model, {})}
+            limiter = self.limiters[model] = FairLimiter(model, **options)
+            logger.info(f"模型 {model} 并发限制: {limiter.stats()}")
+        return limiter
+
+    def slot(self, model: str, user: str):
+        return self.get(model).slot(user)
+
+    def stats(self) -> dict:
+        return {model: limiter.stats() for model, limiter in self.limiters.items()}
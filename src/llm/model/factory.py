@@ -0,0 +1,24 @@
+import json
+
+from src.llm import config
+
+
+def create_chat_model(model: str, model_provider: str, **kwargs):
+    """
+    按 LLM_BACKEND 创建聊天模型：openrouter 时用 init_chat_model 连接远程服务，
+    fake 时返回本地的 FakeChatModel，参数取自 FAKE_LLM_* 环境变量
+
+    Args:
+        model: 模型名
+        model_provider: 模型提供商
+        kwargs: 传给 init_chat_model 的其余参数
+    """
+    if config.LLM_BACKEND == "fake":
+        from src.llm.model.fake import FakeChatModel
+        return FakeChatModel(model_name=model,
+                             tokens_per_second=config.FAKE_LLM_TOKENS_PER_SECOND,
+                             first_token_latency=config.FAKE_LLM_LATENCY_MS / 1000,
+                             response_tokens=config.FAKE_LLM_RESPONSE_TOKENS,
+                             tool_script=json.loads(config.FAKE_LLM_TOOL_SCRIPT))
+    from langchain.chat_models import init_chat_model
+    return init_chat_model(model=model, model_provider=model_provider, **kwargs)
@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+VOCABULARY = ["博客", "接口", "缓存", "异步", "数据库", "索引", "连接池", "延迟", "吞吐", "模型",
+              "请求", "响应", "事务", "队列", "并发", "日志", "配置", "部署", "性能", "优化"]
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    本地模拟的聊天模型，用于离线压测 AI 链路（AiManager、流式接口、checkpoint 等）
+
+    回复内容由输入消息决定（相同输入得到相同 token 序列），首 token 延迟和出 token 速率可配置。
+    配置了 tool_script 且绑定了对应工具时，每轮用户消息后先按脚本发起工具调用，拿到工具结果后再给出文本回复。
+    """
+
+    model_name: str = "fake"
+    tokens_per_second: float = 50.0
+    first_token_latency: float = 0.2
+    response_tokens: int = 64
+    tool_script: List[Dict[str, Any]] = []
+    bound_tools: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "tokens_per_second": self.tokens_per_second,
+                "first_token_latency": self.first_token_latency, "response_tokens": self.response_tokens}
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "FakeChatModel":
+        names = [convert_to_openai_tool(tool)["function"]["name"] for tool in tools]
+        return self.model_copy(update={"bound_tools": names})
+
+    def _tool_calls(self, messages: List[BaseMessage]) -> List[dict]:
+        """当前轮还没有工具结果时，返回脚本中已绑定的工具调用"""
+        if not self.tool_script or not messages or not isinstance(messages[-1], HumanMessage):
+            return []
+        return [{"name": step["name"], "args": step.get("args", {}), "id": f"call_{uuid.uuid4().hex[:12]}",
+                 "type": "tool_call"}
+                for step in self.tool_script if step["name"] in self.bound_tools]
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        seed = hashlib.sha1("".join(str(message.content) for message in messages).encode("utf-8")).hexdigest()
+        rng = random.Random(seed)
+        return [rng.choice(VOCABULARY) for _ in range(self.response_tokens)]
+
+    def _usage(self, messages: List[BaseMessage], output_tokens: int) -> dict:
+        input_tokens = sum(len(str(message.content)) for message in messages) // 4
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens}
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        tool_calls = self._tool_calls(messages)
+        if tool_calls:
+            message = AIMessage(content="", tool_calls=tool_calls, usage_metadata=self._usage(messages, 0))
+        else:
+            tokens = self._tokens(messages)
+            message = AIMessage(content="".join(tokens), usage_metadata=self._usage(messages, len(tokens)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        result = self._result(messages)
+        time.sleep(self.first_token_latency + self.response_tokens / self.tokens_per_second)
+        return result
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                         **kwargs: Any) -> ChatResult:
+        result = self._result(messages)
+        await asyncio.sleep(self.first_token_latency + self.response_tokens / self.tokens_per_second)
+        return result
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency)
+        for chunk in self._chunks(messages):
+            if run_manager and chunk.text:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+            time.sleep(1 / self.tokens_per_second)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_latency)
+        for chunk in self._chunks(messages):
+            if run_manager and chunk.text:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+            await asyncio.sleep(1 / self.tokens_per_second)
+
+    def _chunks(self, messages: List[BaseMessage]) -> Iterator[ChatGenerationChunk]:
+        tool_calls = self._tool_calls(messages)
+        if tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="", usage_metadata=self._usage(messages, 0),
+                tool_call_chunks=[{"name": call["name"], "args": json.dumps(call["args"], ensure_ascii=False),
+                                   "id": call["id"], "index": index, "type": "tool_call_chunk"}
+                                  for index, call in enumerate(tool_calls)]))
+            return
+        tokens = self._tokens(messages)
+        for index, token in enumerate(tokens):
+            usage = self._usage(messages, len(tokens)) if index == len(tokens) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage))
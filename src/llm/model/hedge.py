@@ -0,0 +1,215 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from loguru import logger
+
+from src.util.metrics import metrics
+
+# 内部调用显式使用空的回调列表：否则会从上下文继承外层回调，LangGraph 的流式输出和用量核算会重复计入
+INNER_CONFIG = {"callbacks": []}
+# 整次调用的耗时和首个流式块的耗时分别统计，两种调用方式按各自的分布计算对冲阈值
+LATENCY_METRIC = "ai.model.latency_ms"
+TTFT_METRIC = "ai.model.ttft_ms"
+
+
+class HedgedChatModel(BaseChatModel):
+    """
+    带对冲请求的聊天模型
+
+    先请求主模型；主模型在阈值时间内没有返回（流式调用时为没有产出第一个块）或直接出错时，
+    再向备用模型发起同样的请求，取先得到的有效结果，另一个请求随即取消。
+    阈值取主模型最近延迟的 quantile 分位数，限制在 [min_delay, max_delay] 之间，样本不足时用 default_delay；
+    各模型的延迟分布（p50/p99 等）记录在 ai.model.latency_ms / ai.model.ttft_ms 中。
+    内部调用不向上传递回调，流式 token 和用量核算只计入胜出的那次调用。
+    配置了 fallback_limiter 时，对冲请求要先不排队地占到备用模型的并发名额，占不到就不对冲，只等主模型；
+    名额在备用请求结束或被取消时归还，对冲不会让备用模型超出自己的并发预算。
+    """
+
+    primary: Any
+    fallback: Any
+    primary_name: str = "primary"
+    fallback_name: str = "fallback"
+    quantile: float = 0.9
+    min_delay: float = 1.0
+    max_delay: float = 8.0
+    default_delay: float = 3.0
+    min_samples: int = 20
+    fallback_limiter: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged-chat"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"primary": self.primary_name, "fallback": self.fallback_name, "quantile": self.quantile}
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "HedgedChatModel":
+        return self.model_copy(update={"primary": self.primary.bind_tools(tools, **kwargs),
+                                       "fallback": self.fallback.bind_tools(tools, **kwargs)})
+
+    def hedge_delay(self, streaming: bool = False) -> float:
+        """当前的对冲阈值（秒）"""
+        histogram = metrics.histogram(TTFT_METRIC if streaming else LATENCY_METRIC, model=self.primary_name)
+        if histogram is None or len(histogram.samples) < self.min_samples:
+            return self.default_delay
+        return min(self.max_delay, max(self.min_delay, histogram.percentile(self.quantile) / 1000))
+
+    @staticmethod
+    def _good(message: BaseMessage) -> bool:
+        return bool(message.content or getattr(message, "tool_calls", None))
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        # 同步调用不做对冲，只在主模型出错时改用备用模型
+        try:
+            message = self.primary.invoke(messages, INNER_CONFIG, stop=stop, **kwargs)
+        except Exception as e:
+            logger.warning(f"主模型 {self.primary_name} 调用失败，改用 {self.fallback_name}: {e!r}")
+            message = self.fallback.invoke(messages, INNER_CONFIG, stop=stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _timed_invoke(self, name: str, model: Any, messages: List[BaseMessage], stop, kwargs) -> AIMessage:
+        start = time.perf_counter()
+        try:
+            message = await model.ainvoke(messages, INNER_CONFIG, stop=stop, **kwargs)
+        except asyncio.CancelledError:
+            # 被取消的请求至少花了这么久，也计入分布，否则阈值只反映快的请求，会越来越低
+            metrics.observe(LATENCY_METRIC, (time.perf_counter() - start) * 1000, model=name)
+            raise
+        except Exception:
+            metrics.incr("ai.model.errors", model=name)
+            raise
+        metrics.observe(LATENCY_METRIC, (time.perf_counter() - start) * 1000, model=name)
+        return message
+
+    def _acquire_fallback(self) -> bool:
+        """对冲前占用备用模型的并发名额，占不到时放弃本次对冲"""
+        if self.fallback_limiter is not None and not self.fallback_limiter.try_acquire():
+            metrics.incr("ai.hedge.skipped", model=self.fallback_name, reason="limiter")
+            return False
+        metrics.incr("ai.hedge.fired", model=self.primary_name)
+        return True
+
+    def _release_fallback(self):
+        if self.fallback_limiter is not None:
+            self.fallback_limiter.release()
+
+    async def _fallback_invoke(self, messages: List[BaseMessage], stop, kwargs) -> AIMessage:
+        try:
+            return await self._timed_invoke(self.fallback_name, self.fallback, messages, stop, kwargs)
+        finally:
+            self._release_fallback()
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                         **kwargs: Any) -> ChatResult:
+        tasks = {asyncio.create_task(self._timed_invoke(self.primary_name, self.primary, messages, stop, kwargs)):
+                 self.primary_name}
+        hedged = False
+        last_error: Optional[BaseException] = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+            while True:
+                for task in done:
+                    name = tasks.pop(task)
+                    if task.exception() is None and self._good(task.result()):
+                        self._record_winner(name, hedged)
+                        return ChatResult(generations=[ChatGeneration(message=task.result())])
+                    last_error = task.exception() or ValueError(f"{name} 返回了空回复")
+                if not hedged:
+                    hedged = True
+                    if self._acquire_fallback():
+                        tasks[asyncio.create_task(self._fallback_invoke(messages, stop, kwargs))] = \
+                            self.fallback_name
+                if not tasks:
+                    raise last_error
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            await self._cancel(tasks)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        streams = {self.primary_name: self.primary.astream(messages, INNER_CONFIG, stop=stop, **kwargs)}
+        start = {self.primary_name: time.perf_counter()}
+        tasks = {asyncio.create_task(anext(streams[self.primary_name])): self.primary_name}
+        hedged = False
+        winner = first = None
+        last_error: Optional[BaseException] = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(streaming=True))
+            while winner is None:
+                for task in done:
+                    name = tasks.pop(task)
+                    if task.exception() is None:
+                        winner, first = name, task.result()
+                        break
+                    metrics.incr("ai.model.errors", model=name)
+                    last_error = task.exception()
+                if winner is not None:
+                    break
+                if not hedged:
+                    hedged = True
+                    if self._acquire_fallback():
+                        streams[self.fallback_name] = self.fallback.astream(messages, INNER_CONFIG, stop=stop,
+                                                                            **kwargs)
+                        start[self.fallback_name] = time.perf_counter()
+                        tasks[asyncio.create_task(anext(streams[self.fallback_name]))] = self.fallback_name
+                if not tasks:
+                    raise last_error if not isinstance(last_error, StopAsyncIteration) else \
+                        ValueError("模型返回了空的流")
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for name in tasks.values():
+                # 与整次调用相同，被取消的一方按已等待的时间计入首块耗时
+                metrics.observe(TTFT_METRIC, (time.perf_counter() - start[name]) * 1000, model=name)
+            await self._cancel(tasks)
+            for name, stream in streams.items():
+                if name != winner:
+                    try:
+                        await stream.aclose()
+                    finally:
+                        if name == self.fallback_name:
+                            self._release_fallback()
+
+        metrics.observe(TTFT_METRIC, (time.perf_counter() - start[winner]) * 1000, model=winner)
+        self._record_winner(winner, hedged)
+        stream = streams[winner]
+        try:
+            chunk = first
+            while True:
+                if not isinstance(chunk, AIMessageChunk):
+                    chunk = AIMessageChunk(content=chunk.content)
+                if run_manager and chunk.content and isinstance(chunk.content, str):
+                    await run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+                yield ChatGenerationChunk(message=chunk)
+                try:
+                    chunk = await anext(stream)
+                except StopAsyncIteration:
+                    break
+            metrics.observe(LATENCY_METRIC, (time.perf_counter() - start[winner]) * 1000, model=winner)
+        finally:
+            try:
+                await stream.aclose()
+            finally:
+                if winner == self.fallback_name:
+                    self._release_fallback()
+
+    def _record_winner(self, name: str, hedged: bool):
+        metrics.incr("ai.hedge.won", model=name, hedged=hedged)
+
+    @staticmethod
+    async def _cancel(tasks: Dict[asyncio.Task, str]):
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
@@ -1,15 +1,8 @@
+from src.llm.model.registry import models
 
-from langchain.chat_models import init_chat_model
-from src.llm.config import AI_BASE_URL, API_KEY, TEST_MODEL, TEST_MODEL_PROVIDER
 
-
-# Initialize the model with OpenRouter's base URL
-MistralImgModel = init_chat_model(
-    model='mistralai/mistral-small-3.1-24b-instruct:free',
-    model_provider=TEST_MODEL_PROVIDER,
-    base_url=AI_BASE_URL,
-    api_key=API_KEY,
-    temperature=0.5,
-    timeout=10,
-    max_tokens=1000
-)
+def __getattr__(name):
+    """MistralImgModel 在第一次访问时才创建，参数见 registry.MODEL_SPECS["mistral_img"]"""
+    if name == "MistralImgModel":
+        return models.get("mistral_img")
+    raise AttributeError(name)
@@ -1,15 +1,8 @@
+from src.llm.model.registry import models
 
-from langchain.chat_models import init_chat_model
-from src.llm.config import AI_BASE_URL, API_KEY, TEST_MODEL, TEST_MODEL_PROVIDER
 
-
-# Initialize the model with OpenRouter's base URL
-QwenModel = init_chat_model(
-    model="qwen/qwen-2.5-vl-7b-instruct:free",
-    model_provider='openai',
-    base_url=AI_BASE_URL,
-    api_key=API_KEY,
-    temperature=0.5,
-    timeout=10,
-    max_tokens=1000
-)
+def __getattr__(name):
+    """QwenModel 在第一次访问时才创建，参数见 registry.MODEL_SPECS["qwen"]"""
+    if name == "QwenModel":
+        return models.get("qwen")
+    raise AttributeError(name)
@@ -0,0 +1,52 @@
+import threading
+from typing import Dict, List
+
+from loguru import logger
+
+from src.llm.config import AI_BASE_URL, API_KEY, TEST_MODEL, TEST_MODEL_PROVIDER
+from src.util.metrics import metrics
+
+_COMMON = {"base_url": AI_BASE_URL, "api_key": API_KEY, "temperature": 0.5, "timeout": 10, "max_tokens": 1000}
+
+# 模型名 -> create_chat_model 参数；所有模型都经 OpenRouter 访问
+MODEL_SPECS: Dict[str, dict] = {
+    "mistral": {"model": TEST_MODEL, "model_provider": TEST_MODEL_PROVIDER, **_COMMON},
+    "mistral_img": {"model": "mistralai/mistral-small-3.1-24b-instruct:free", "model_provider": TEST_MODEL_PROVIDER,
+                    **_COMMON},
+    "gemma": {"model": "google/gemma-3-27b-it:free", "model_provider": "openai", **_COMMON},
+    "qwen": {"model": "qwen/qwen-2.5-vl-7b-instruct:free", "model_provider": "openai", **_COMMON},
+}
+
+
+class ModelRegistry:
+    """
+    按名称懒加载聊天模型
+
+    模型（以及 langchain、provider SDK 的导入）推迟到第一次 get() 时才创建，之后复用同一个实例，
+    避免应用启动和 import 时为用不到的模型付出开销。
+    """
+
+    def __init__(self, specs: Dict[str, dict]):
+        self.specs = specs
+        self._models: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                from src.llm.model.factory import create_chat_model
+                with metrics.timer("ai.model_init_ms", model=name):
+                    model = create_chat_model(**self.specs[name])
+                self._models[name] = model
+                logger.info(f"模型 {name} 已创建")
+        return model
+
+    def loaded(self) -> List[str]:
+        return list(self._models)
+
+
+models = ModelRegistry(MODEL_SPECS)
@@ -1,3 +1,3 @@
-from .system_prompt import SYSTEM_PROMPT
+from .system_prompt import SYSTEM_PROMPT, CONTEXT_SUMMARY_PROMPT, CONTEXT_SUMMARY_HEADER
 
-__all__ = ["SYSTEM_PROMPT"]
+__all__ = ["SYSTEM_PROMPT", "CONTEXT_SUMMARY_PROMPT", "CONTEXT_SUMMARY_HEADER"]
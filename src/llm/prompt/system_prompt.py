@@ -2,7 +2,21 @@ SYSTEM_PROMPT = """
 你是一个高级多功能助手，能够理解并生成多种类型的回复。
 你可以根据用户的请求：
 1. 直接回复文本。
-2.调用相关工具完成功能
+2.调用相关工具完成功能；需要多个互不依赖的工具时，在同一轮中一次性发起调用，它们会并行执行
 
 请根据需要组合文本、代码和图片。例如，如果你生成了代码，请同时提供解释文本；如果你生成了图片，请提供图片的描述。
 """
+
+CONTEXT_SUMMARY_PROMPT = """
+请把下面较早的对话内容与已有摘要合并成一段新的摘要，供后续对话参考。
+保留用户的身份信息、偏好、提出过的问题和已经得出的结论、工具调用得到的关键结果；省略寒暄和重复内容。
+只输出摘要本身，不超过 300 字。
+
+已有摘要：
+{summary}
+
+较早的对话：
+{messages}
+"""
+
+CONTEXT_SUMMARY_HEADER = "以下是本次会话较早内容的摘要，回答时可以参考：\n"
@@ -0,0 +1,7 @@
+from .chunker import chunk_text
+from .embedder import CallableEmbedder, Embedder, HashingEmbedder
+from .index import VectorIndex
+from .retriever import BlogRetriever, get_blog_retriever, set_blog_retriever
+
+__all__ = ["chunk_text", "Embedder", "HashingEmbedder", "CallableEmbedder", "VectorIndex", "BlogRetriever",
+           "get_blog_retriever", "set_blog_retriever"]
@@ -0,0 +1,56 @@
+import re
+from typing import List
+
+# 段落之间以空行分隔；过长的段落再按句末标点切分
+PARAGRAPH_SPLIT = re.compile(r"\n\s*\n")
+SENTENCE_SPLIT = re.compile(r"(?<=[。！？；.!?;\n])")
+
+
+def _pieces(text: str, max_chars: int) -> List[str]:
+    """把正文拆成不超过 max_chars 的段落或句子"""
+    pieces = []
+    for paragraph in PARAGRAPH_SPLIT.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in SENTENCE_SPLIT.split(paragraph):
+            sentence = sentence.strip()
+            # 没有标点的超长句子（如代码块）按长度硬切
+            while len(sentence) > max_chars:
+                pieces.append(sentence[:max_chars])
+                sentence = sentence[max_chars:]
+            if sentence:
+                pieces.append(sentence)
+    return pieces
+
+
+def chunk_text(text: str, max_chars: int = 500, overlap: int = 80) -> List[str]:
+    """
+    把博客正文切成用于检索的片段
+
+    尽量在段落和句子边界处切分，相邻段落合并到接近 max_chars；
+    每个片段开头带上前一个片段末尾的 overlap 个字符，避免答案恰好落在切分点上时检索不到。
+
+    Args:
+        text: 正文（Markdown 或纯文本）
+        max_chars: 单个片段的最大字符数（不含重叠部分）
+        overlap: 与前一个片段重叠的字符数
+
+    Returns:
+        片段列表，正文为空时返回空列表
+    """
+    chunks: List[str] = []
+    current = ""
+    for piece in _pieces(text or "", max_chars):
+        if current and len(current) + len(piece) + 1 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    if overlap <= 0:
+        return chunks
+    return [chunk if i == 0 else chunks[i - 1][-overlap:] + "\n" + chunk for i, chunk in enumerate(chunks)]
@@ -0,0 +1,91 @@
+import math
+import re
+import zlib
+from collections import Counter
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+# 英文、数字按词切分；中日韩文字没有空格，按单字和相邻两字切分
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+|[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]+")
+CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]")
+
+
+class Embedder:
+    """
+    向量化后端的接口：dim 为向量维度，embed 返回 L2 归一化后的 float32 矩阵
+
+    similarity_threshold 是判定两个问题「问的是同一件事」的余弦相似度下限，供回答缓存的相似匹配使用；
+    None 表示该后端分不清措辞相近但含义不同的问题，不能用于相似匹配。
+    """
+
+    name = "base"
+    dim = 0
+    similarity_threshold: Optional[float] = None
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+
+class HashingEmbedder(Embedder):
+    """
+    本地的哈希向量化，不依赖模型和网络
+
+    文本切成词（英文）和单字、双字（中文）特征，用 crc32 哈希到 dim 维并按另一位决定正负号，
+    词频取对数后做 L2 归一化。语义能力有限，但对关键词检索足够，结果稳定，适合离线构建索引和测试。
+    只看字面重合，「关于 Python 的文章」和「关于 Java 的文章」相似度也在 0.95 左右，因此不用于回答缓存的相似匹配。
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    @staticmethod
+    def features(text: str) -> Counter:
+        counter: Counter = Counter()
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            if CJK_PATTERN.match(token):
+                counter.update(token)
+                counter.update(token[i:i + 2] for i in range(len(token) - 1))
+            else:
+                counter[token] += 1
+        return counter
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in self.features(text).items():
+                h = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, h % self.dim] += (1.0 if h & 0x80000000 else -1.0) * (1.0 + math.log(count))
+        return _normalize(vectors)
+
+
+class CallableEmbedder(Embedder):
+    """包装外部的批量向量化函数（如 langchain Embeddings.embed_documents），用于接入真实的向量模型"""
+
+    def __init__(self, func: Callable[[List[str]], List[List[float]]], dim: int, name: str = "callable",
+                 similarity_threshold: Optional[float] = None):
+        """
+        Args:
+            func: 批量向量化函数
+            dim: 向量维度
+            name: 后端名，参与索引的兼容性检查
+            similarity_threshold: 回答缓存相似匹配的相似度下限，需按具体模型标定；None 表示不用于相似匹配
+        """
+        self.func = func
+        self.dim = dim
+        self.name = name
+        self.similarity_threshold = similarity_threshold
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return _normalize(np.asarray(self.func(list(texts)), dtype=np.float32).reshape(len(texts), self.dim))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
@@ -0,0 +1,186 @@
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+from loguru import logger
+
+VECTORS_FILE = "vectors.f32"
+META_FILE = "meta.json"
+
+
+class VectorIndex:
+    """
+    基于 NumPy 内存映射文件的向量索引
+
+    向量按行追加到 vectors.f32（float32，已归一化，点积即余弦相似度），容量不足时按倍数扩容；
+    片段元数据（博客 ID、标题、正文片段）和删除标记保存在 meta.json。
+    删除和覆盖只打标记，失效行超过一半时 compact 重写。检索是一次矩阵向量乘加 argpartition 取 top-k，
+    数万个片段也在毫秒级完成。只在事件循环线程中修改，不加锁。
+    """
+
+    def __init__(self, path: Optional[str], dim: int, embedder_name: str, initial_capacity: int = 1024):
+        """
+        Args:
+            path: 索引目录，None 表示只保存在内存中
+            dim: 向量维度
+            embedder_name: 向量化后端名，与已保存的索引不一致时丢弃旧索引
+            initial_capacity: 初始容量（行）
+        """
+        self.path = path
+        self.dim = dim
+        self.embedder_name = embedder_name
+        self.initial_capacity = initial_capacity
+        self.count = 0
+        self.chunks: List[dict] = []
+        self.alive = np.zeros(0, dtype=bool)
+        self.by_blog: Dict[int, List[int]] = {}
+        self._vectors: np.ndarray = np.zeros((0, dim), dtype=np.float32)
+        self.load()
+
+    def __repr__(self) -> str:
+        return f"vector index {self.path or 'memory'} dim={self.dim} chunks={self.size} blogs={len(self.by_blog)}"
+
+    @property
+    def size(self) -> int:
+        """有效的片段数"""
+        return int(self.alive[:self.count].sum())
+
+    @property
+    def blog_ids(self) -> Set[int]:
+        return set(self.by_blog)
+
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, VECTORS_FILE)
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, META_FILE)
+
+    def _allocate(self, capacity: int):
+        """把向量存储扩容到 capacity 行，已有数据保留"""
+        if self.path is None:
+            vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+            vectors[:self.count] = self._vectors[:self.count]
+            self._vectors = vectors
+        else:
+            if isinstance(self._vectors, np.memmap):
+                self._vectors.flush()
+            self._vectors = None
+            with open(self._vectors_path(), "ab") as f:
+                f.truncate(capacity * self.dim * 4)
+            self._vectors = np.memmap(self._vectors_path(), dtype=np.float32, mode="r+",
+                                      shape=(capacity, self.dim))
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self.alive)] = self.alive[:capacity]
+        self.alive = alive
+
+    def load(self):
+        if self.path is None:
+            self._allocate(self.initial_capacity)
+            return
+        os.makedirs(self.path, exist_ok=True)
+        meta = None
+        if os.path.exists(self._meta_path()) and os.path.exists(self._vectors_path()):
+            with open(self._meta_path(), encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("dim") != self.dim or meta.get("embedder") != self.embedder_name:
+                logger.warning(f"向量索引的维度或向量化后端已变化，重建索引: {meta.get('embedder')}/{meta.get('dim')}")
+                meta = None
+        if meta is None:
+            for name in (VECTORS_FILE, META_FILE):
+                if os.path.exists(os.path.join(self.path, name)):
+                    os.remove(os.path.join(self.path, name))
+            self._allocate(self.initial_capacity)
+            return
+        self.chunks = meta["chunks"]
+        self.count = len(self.chunks)
+        capacity = max(self.initial_capacity, os.path.getsize(self._vectors_path()) // (self.dim * 4), self.count)
+        self.alive = np.array([chunk.pop("alive", True) for chunk in self.chunks] + [False] * (capacity - self.count),
+                              dtype=bool)
+        self._allocate(capacity)
+        self._rebuild_blog_map()
+        logger.info(f"{self} 已加载")
+
+    def _rebuild_blog_map(self):
+        self.by_blog = {}
+        for row in np.flatnonzero(self.alive[:self.count]):
+            self.by_blog.setdefault(self.chunks[row]["blogId"], []).append(int(row))
+
+    def save(self):
+        if self.path is None:
+            return
+        self._vectors.flush()
+        meta = {"dim": self.dim, "embedder": self.embedder_name,
+                "chunks": [{**chunk, "alive": bool(alive)} for chunk, alive in zip(self.chunks, self.alive)]}
+        tmp = self._meta_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, self._meta_path())
+
+    def remove(self, blog_id: int) -> int:
+        """删除一篇博客的全部片段，返回删除的片段数"""
+        rows = self.by_blog.pop(blog_id, [])
+        self.alive[rows] = False
+        return len(rows)
+
+    def upsert(self, blog_id: int, title: str, chunks: List[str], vectors: np.ndarray):
+        """写入一篇博客的片段，已存在时整体替换"""
+        self.remove(blog_id)
+        if not chunks:
+            return
+        needed = self.count + len(chunks)
+        if needed > len(self.alive):
+            self._allocate(max(needed, len(self.alive) * 2))
+        rows = list(range(self.count, needed))
+        self._vectors[self.count:needed] = vectors
+        self.alive[self.count:needed] = True
+        self.chunks.extend({"blogId": blog_id, "title": title, "chunk": i, "text": text}
+                           for i, text in enumerate(chunks))
+        self.count = needed
+        self.by_blog[blog_id] = rows
+
+    def search(self, query: np.ndarray, k: int = 5, min_score: float = 0.0) -> List[dict]:
+        """
+        按余弦相似度返回最相近的 k 个片段
+
+        Returns:
+            片段元数据加 score，按相似度从高到低
+        """
+        if not self.by_blog or k <= 0:
+            return []
+        scores = self._vectors[:self.count] @ query.astype(np.float32)
+        scores[~self.alive[:self.count]] = -np.inf
+        k = min(k, self.count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{**self.chunks[row], "score": float(scores[row])}
+                for row in top if scores[row] > min_score and np.isfinite(scores[row])]
+
+    def retain(self, blog_ids: Iterable[int]) -> int:
+        """只保留 blog_ids 中的博客（删除已不存在的博客），返回删除的博客数"""
+        keep = set(blog_ids)
+        stale = [blog_id for blog_id in self.by_blog if blog_id not in keep]
+        for blog_id in stale:
+            self.remove(blog_id)
+        return len(stale)
+
+    def compact(self, min_dead_ratio: float = 0.5) -> bool:
+        """失效行超过 min_dead_ratio 时重写存储，返回是否执行了重写"""
+        if not self.count or self.size / self.count > 1 - min_dead_ratio:
+            return False
+        rows = np.flatnonzero(self.alive[:self.count])
+        vectors = np.array(self._vectors[rows])
+        self.chunks = [self.chunks[row] for row in rows]
+        self.count = len(rows)
+        capacity = max(self.initial_capacity, self.count * 2)
+        if self.path is not None:
+            self._vectors = None
+            os.remove(self._vectors_path())
+        self.alive = np.zeros(0, dtype=bool)
+        self._allocate(capacity)
+        self._vectors[:self.count] = vectors
+        self.alive[:self.count] = True
+        self._rebuild_blog_map()
+        self.save()
+        logger.info(f"{self} 已压缩")
+        return True
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from typing import AsyncIterator, Iterable, List, Optional
+
+from loguru import logger
+
+from src.llm.rag.chunker import chunk_text
+from src.llm.rag.embedder import Embedder, HashingEmbedder
+from src.llm.rag.index import VectorIndex
+from src.util.metrics import metrics
+
+
+class BlogRetriever:
+    """
+    博客正文的检索
+
+    正文按 chunk_text 切片，片段连同标题一起向量化后写入 VectorIndex。
+    新增博客时由 BlogManager 调用 index_blog 增量写入；启动时 sync 只补齐索引中缺少的博客、删掉已不存在的博客。
+    向量化是 CPU 计算，放到线程池中执行，不阻塞事件循环。
+    """
+
+    def __init__(self, index_dir: Optional[str] = None, embedder: Optional[Embedder] = None,
+                 chunk_size: int = 500, chunk_overlap: int = 80, top_k: int = 4, min_score: float = 0.1):
+        """
+        Args:
+            index_dir: 索引目录，None 表示只保存在内存中
+            embedder: 向量化后端，默认使用本地的 HashingEmbedder
+            chunk_size: 片段的最大字符数
+            chunk_overlap: 相邻片段重叠的字符数
+            top_k: 默认返回的片段数
+            min_score: 低于该相似度的片段不返回
+        """
+        self.embedder = embedder or HashingEmbedder()
+        self.index = VectorIndex(index_dir, dim=self.embedder.dim, embedder_name=self.embedder.name)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.top_k = top_k
+        self.min_score = min_score
+        metrics.register_gauge("ai.rag", self.stats)
+
+    def __repr__(self) -> str:
+        return f"blog retriever {self.index}"
+
+    def stats(self) -> dict:
+        return {"blogs": len(self.index.by_blog), "chunks": self.index.size, "rows": self.index.count,
+                "embedder": self.embedder.name, "dim": self.embedder.dim}
+
+    def _embed_blog(self, title: str, content: str):
+        chunks = chunk_text(content, max_chars=self.chunk_size, overlap=self.chunk_overlap)
+        vectors = self.embedder.embed([f"{title}\n{chunk}" for chunk in chunks]) if chunks else None
+        return chunks, vectors
+
+    async def index_blog(self, blog_id: int, title: str, content: str, save: bool = True) -> int:
+        """
+        写入（或替换）一篇博客的索引
+
+        Returns:
+            写入的片段数
+        """
+        with metrics.timer("ai.rag.index_ms"):
+            chunks, vectors = await asyncio.to_thread(self._embed_blog, title, content)
+            self.index.upsert(blog_id, title, chunks, vectors)
+            if save:
+                self.index.save()
+        metrics.incr("ai.rag.indexed_chunks", len(chunks))
+        return len(chunks)
+
+    def remove_blog(self, blog_id: int):
+        if self.index.remove(blog_id):
+            self.index.save()
+
+    async def sync(self, blog_ids: Iterable[int], load_blogs, batch_size: int = 100) -> dict:
+        """
+        让索引与现有博客一致：补齐缺少的博客，删除已不存在的博客
+
+        Args:
+            blog_ids: 当前所有博客的 ID
+            load_blogs: 按 ID 列表异步迭代博客正文的函数（BlogManager.iter_blogs_content）
+            batch_size: 每写入多少篇博客保存一次索引
+
+        Returns:
+            新增和删除的博客数
+        """
+        start = time.perf_counter()
+        blog_ids = list(blog_ids)
+        removed = self.index.retain(blog_ids)
+        missing = [blog_id for blog_id in blog_ids if blog_id not in self.index.by_blog]
+        added = 0
+        blogs: AsyncIterator = load_blogs(missing)
+        async for blog in blogs:
+            await self.index_blog(blog.id, blog.title, blog.content, save=False)
+            added += 1
+            if added % batch_size == 0:
+                self.index.save()
+        self.index.compact()
+        self.index.save()
+        result = {"added": added, "removed": removed}
+        logger.info(f"{self} 同步完成: {result}, 耗时 {time.perf_counter() - start:.2f}s")
+        return result
+
+    def search(self, query: str, k: Optional[int] = None) -> List[dict]:
+        """
+        检索与问题最相关的博客片段
+
+        Returns:
+            片段列表（blogId、title、text、score），按相似度从高到低
+        """
+        with metrics.timer("ai.rag.search_ms"):
+            results = self.index.search(self.embedder.embed_query(query), k or self.top_k, self.min_score)
+        metrics.incr("ai.rag.search", hit="yes" if results else "no")
+        return results
+
+
+_retriever: Optional[BlogRetriever] = None
+
+
+def set_blog_retriever(retriever: Optional[BlogRetriever]):
+    """由 Application 在启动时注入，search_blog 工具通过 get_blog_retriever 使用"""
+    global _retriever
+    _retriever = retriever
+
+
+def get_blog_retriever() -> Optional[BlogRetriever]:
+    return _retriever
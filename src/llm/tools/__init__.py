@@ -1,3 +1,9 @@
-from .tool import get_weather_for_location, get_client_ip, get_current_location
+__all__ = ["get_weather_for_location", "get_client_ip", "get_current_location", "search_blog"]
 
-__all__ = ["get_weather_for_location", "get_client_ip", "get_current_location"]
+
+def __getattr__(name):
+    # 工具依赖 langchain，按需导入，使 src.llm.tools.cache 等轻量模块可以单独使用
+    if name in __all__:
+        from . import tool
+        return getattr(tool, name)
+    raise AttributeError(name)
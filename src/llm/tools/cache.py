@@ -0,0 +1,23 @@
+import unicodedata
+
+from src.database.redis.redis_manage import RedisManager
+from src.util.cache import TwoTierCache
+
+# IP 对应的位置几乎不变，缓存数小时；天气按分钟变化。失败结果短时间负缓存，避免反复请求不可用的上游
+location_cache = TwoTierCache("tool:location", ttl=6 * 3600, negative_ttl=300)
+weather_cache = TwoTierCache("tool:weather", ttl=600, negative_ttl=60)
+
+
+def configure_tool_caches(redis: RedisManager = None, location_ttl: int = None, weather_ttl: int = None,
+                          negative_ttl: int = None):
+    """由 Application 启动时调用：为工具缓存启用 Redis 二级缓存并覆盖有效期"""
+    for cache, ttl in ((location_cache, location_ttl), (weather_cache, weather_ttl)):
+        cache.bind_redis(redis)
+        if ttl is not None:
+            cache.ttl = ttl
+        if negative_ttl is not None:
+            cache.negative_ttl = negative_ttl
+
+
+def normalize_location(location: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", location).split()).lower()
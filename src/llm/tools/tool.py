@@ -5,7 +5,21 @@ from loguru import logger
 from pydantic import BaseModel, Field
 import httpx
 
-from src.llm.model.gemma import GemmaModel
+from src.llm.model.registry import models
+from src.llm.rag import get_blog_retriever
+from src.llm.tools.cache import location_cache, normalize_location, weather_cache
+from src.util.http_client import get_http_client
+
+# 各工具的超时时间（秒），由 ToolPolicyMiddleware 使用；未列出的工具使用 DEFAULT_TOOL_TIMEOUT
+TOOL_TIMEOUTS = {
+    "get_client_ip": 1,
+    "get_current_location": 5,
+    "get_weather_for_location": 8,
+    "search_blog": 3,
+    "generate_python_code": 2,
+    "generate_image": 60,
+}
+DEFAULT_TOOL_TIMEOUT = 10
 
 # ---------------------------------------------------------
 # 工具 1: 获取用户 IP
@@ -40,13 +54,22 @@ async def get_current_location(config: RunnableConfig) -> str:
     if not ip or ip.startswith("127."):
         return "本地开发环境，位置默认：北京市"
 
-    # 2. 直接解析 IP
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"http://ip-api.com/json/{ip}?lang=zh-CN")
-        if response.status_code == 200:
-            data = response.json()
-            return f"{data.get('regionName')} {data.get('city')}"
-        return "无法解析位置"
+    # 2. 解析 IP（复用共享连接池，结果按 IP 缓存）
+    async def lookup():
+        response = await get_http_client().get(f"http://ip-api.com/json/{ip}?lang=zh-CN")
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        if data.get("status") == "fail":
+            return None
+        return f"{data.get('regionName')} {data.get('city')}"
+
+    try:
+        location = await location_cache.get_or_load(ip.strip(), lookup)
+    except httpx.HTTPError as e:
+        logger.warning(f"解析 IP 位置失败: {e!r}")
+        location = None
+    return location or "无法解析位置"
 
 # ---------------------------------------------------------
 # 工具 3: 根据地址获取天气
@@ -64,12 +87,19 @@ async def get_weather_for_location(location: str) -> str:
     logger.info(f"get_weather_for_location: {location}")
     # 提示：实际生产中建议使用和风天气、OpenWeatherMap 等 API
     # 这里演示使用 wttr.in 快速获取文本天气
-    async with httpx.AsyncClient() as client:
+    async def lookup():
         # format=3 返回简洁的一行文字描述
-        response = await client.get(f"https://wttr.in/{location}?format=3&lang=zh-CN")
-        if response.status_code == 200:
-            return response.text.strip()
-        return f"暂时无法获取 {location} 的天气信息"
+        response = await get_http_client().get(f"https://wttr.in/{location}?format=3&lang=zh-CN")
+        if response.status_code != 200:
+            return None
+        return response.text.strip() or None
+
+    try:
+        weather = await weather_cache.get_or_load(normalize_location(location), lookup)
+    except httpx.HTTPError as e:
+        logger.warning(f"查询天气失败: {e!r}")
+        weather = None
+    return weather or f"暂时无法获取 {location} 的天气信息"
 
 
 class CodeSchema(BaseModel):
@@ -88,5 +118,29 @@ def generate_python_code(description: str, language: str = "python") -> str:
 @tool
 async def generate_image(prompt: str) -> str:
     """当用户请求生成图片时，调用此工具生成对应的图片。"""
-    response = await GemmaModel.ainvoke(prompt)
+    response = await models.get("gemma").ainvoke(prompt)
     return response.content
+
+
+# ---------------------------------------------------------
+# 工具: 检索博客内容
+# ---------------------------------------------------------
+
+
+@tool
+async def search_blog(query: str) -> str:
+    """
+    在本站博客文章中检索与问题相关的内容。
+    当用户询问本站博客写过的主题、文章内容或技术细节时调用，回答时注明引用的文章标题。
+
+    Args:
+        query: 检索用的关键词或问题
+    """
+    retriever = get_blog_retriever()
+    if retriever is None:
+        return "博客检索未启用"
+    results = retriever.search(query)
+    if not results:
+        return "没有找到相关的博客内容"
+    return "\n\n".join(f"《{item['title']}》(blogId={item['blogId']}, 相关度 {item['score']:.2f})\n{item['text']}"
+                        for item in results)
@@ -0,0 +1,219 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+from src.database.postgresql.postgresql_manager import PostgreSQLManager
+from src.util.metrics import metrics
+
+# 汇总表中按以下维度聚合，其余字段累加
+ROLLUP_KEYS = ("bucket", "model", "endpoint", "user_id", "ip")
+ROLLUP_FIELDS = ("requests", "errors", "cache_hits", "input_tokens", "output_tokens", "model_calls",
+                 "model_ms", "tool_calls", "tool_errors", "tool_ms", "ttft_ms", "ttft_count", "total_ms")
+# 进程内按用户统计的上限，超过后只保留用量最多的一部分
+MAX_TRACKED_USERS = 10000
+
+
+class RequestUsage:
+    """一次 AI 请求的用量和耗时，由回调和 AiManager 填写，结束时交给 UsageAccounting.finish"""
+
+    def __init__(self, endpoint: str, model: str, user_id: object, ip: Optional[str]):
+        self.endpoint = endpoint
+        self.model = model
+        self.user_id = "" if user_id is None else str(user_id)
+        self.ip = ip or ""
+        self.start = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.model_calls = 0
+        self.model_ms = 0.0
+        self.tool_calls = 0
+        self.tool_errors = 0
+        self.tool_ms = 0.0
+        self.tools: Dict[str, float] = {}
+        self.cache_hit = False
+
+    def mark_first_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+    def add_model_call(self, input_tokens: int, output_tokens: int, duration_ms: float):
+        self.model_calls += 1
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        self.model_ms += duration_ms
+
+    def add_tool_call(self, name: str, duration_ms: float, ok: bool = True):
+        self.tool_calls += 1
+        self.tool_errors += 0 if ok else 1
+        self.tool_ms += duration_ms
+        self.tools[name] = self.tools.get(name, 0.0) + duration_ms
+
+    @property
+    def ttft_ms(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return (self.first_token_at - self.start) * 1000
+
+    def to_dict(self) -> dict:
+        ttft_ms = self.ttft_ms
+        return {"endpoint": self.endpoint, "model": self.model, "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens, "model_calls": self.model_calls,
+                "model_ms": round(self.model_ms, 1), "tool_calls": self.tool_calls,
+                "tool_ms": round(self.tool_ms, 1), "ttft_ms": None if ttft_ms is None else round(ttft_ms, 1),
+                "cache_hit": self.cache_hit}
+
+
+class UsageAccounting:
+    """
+    AI 请求的用量核算
+
+    每个请求结束时：按模型和接口记录指标（token、首 token 延迟、总耗时、工具耗时、缓存命中），
+    同时在进程内按 (时间桶, 模型, 接口, 用户, IP) 累加，由后台任务定期 upsert 到 PostgreSQL 汇总表，
+    每个维度组合每个时间桶只有一行。
+    """
+
+    def __init__(self, db: Optional[PostgreSQLManager] = None, bucket_seconds: int = 3600,
+                 table: str = "ai_usage_rollup"):
+        """
+        Args:
+            db: 汇总表所在的 PostgreSQL，None 表示只记录指标
+            bucket_seconds: 汇总的时间粒度（秒）
+            table: 汇总表名
+        """
+        self.db = db
+        self.bucket_seconds = bucket_seconds
+        self.table = table
+        self._pending: Dict[Tuple, Dict[str, float]] = {}
+        self._user_tokens: Counter = Counter()
+        self._table_ready = False
+        metrics.register_gauge("ai.usage", self.stats)
+
+    def start(self, endpoint: str, model: str, config: Optional[dict] = None) -> RequestUsage:
+        configurable = (config or {}).get("configurable", {})
+        return RequestUsage(endpoint, model, configurable.get("user_id"), configurable.get("ip"))
+
+    def finish(self, usage: RequestUsage, error: bool = False):
+        """请求结束（成功、失败或客户端断开）时调用一次"""
+        total_ms = (time.perf_counter() - usage.start) * 1000
+        labels = {"model": usage.model, "endpoint": usage.endpoint}
+        metrics.incr("ai.usage.requests", **labels, status="error" if error else "ok")
+        metrics.incr("ai.usage.input_tokens", usage.input_tokens, **labels)
+        metrics.incr("ai.usage.output_tokens", usage.output_tokens, **labels)
+        metrics.observe("ai.usage.total_ms", total_ms, **labels)
+        if usage.ttft_ms is not None:
+            metrics.observe("ai.usage.ttft_ms", usage.ttft_ms, **labels)
+        if usage.cache_hit:
+            metrics.incr("ai.usage.cache_hits", **labels)
+        for name, duration_ms in usage.tools.items():
+            metrics.observe("ai.usage.tool_ms", duration_ms, tool=name)
+
+        user_key = f"{usage.user_id}|{usage.ip}"
+        self._user_tokens[user_key] += usage.input_tokens + usage.output_tokens
+        if len(self._user_tokens) > MAX_TRACKED_USERS:
+            self._user_tokens = Counter(dict(self._user_tokens.most_common(MAX_TRACKED_USERS // 10)))
+
+        bucket = int(time.time()) // self.bucket_seconds * self.bucket_seconds
+        row = self._pending.setdefault((bucket, usage.model, usage.endpoint, usage.user_id, usage.ip),
+                                       dict.fromkeys(ROLLUP_FIELDS, 0))
+        row["requests"] += 1
+        row["errors"] += 1 if error else 0
+        row["cache_hits"] += 1 if usage.cache_hit else 0
+        row["input_tokens"] += usage.input_tokens
+        row["output_tokens"] += usage.output_tokens
+        row["model_calls"] += usage.model_calls
+        row["model_ms"] += usage.model_ms
+        row["tool_calls"] += usage.tool_calls
+        row["tool_errors"] += usage.tool_errors
+        row["tool_ms"] += usage.tool_ms
+        if usage.ttft_ms is not None:
+            row["ttft_ms"] += usage.ttft_ms
+            row["ttft_count"] += 1
+        row["total_ms"] += total_ms
+        logger.debug(f"AI 用量: {usage.to_dict()}, 总耗时 {total_ms:.1f}ms")
+
+    def stats(self) -> dict:
+        return {"pending_rows": len(self._pending),
+                "top_users": dict(self._user_tokens.most_common(10))}
+
+    async def ensure_table(self):
+        if self._table_ready or self.db is None:
+            return
+        await self.db.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                bucket        timestamptz NOT NULL,
+                model         text        NOT NULL,
+                endpoint      text        NOT NULL,
+                user_id       text        NOT NULL,
+                ip            text        NOT NULL,
+                requests      integer     NOT NULL DEFAULT 0,
+                errors        integer     NOT NULL DEFAULT 0,
+                cache_hits    integer     NOT NULL DEFAULT 0,
+                input_tokens  bigint      NOT NULL DEFAULT 0,
+                output_tokens bigint      NOT NULL DEFAULT 0,
+                model_calls   integer     NOT NULL DEFAULT 0,
+                model_ms      double precision NOT NULL DEFAULT 0,
+                tool_calls    integer     NOT NULL DEFAULT 0,
+                tool_errors   integer     NOT NULL DEFAULT 0,
+                tool_ms       double precision NOT NULL DEFAULT 0,
+                ttft_ms       double precision NOT NULL DEFAULT 0,
+                ttft_count    integer     NOT NULL DEFAULT 0,
+                total_ms      double precision NOT NULL DEFAULT 0,
+                PRIMARY KEY (bucket, model, endpoint, user_id, ip)
+            )
+        """)
+        self._table_ready = True
+
+    async def flush(self) -> int:
+        """
+        把进程内累加的用量写入汇总表
+
+        Returns:
+            写入的行数
+        """
+        if not self._pending or self.db is None:
+            self._pending.clear()
+            return 0
+        await self.ensure_table()
+        pending, self._pending = self._pending, {}
+        columns = ROLLUP_KEYS + ROLLUP_FIELDS
+        updates = ", ".join(f"{field} = {self.table}.{field} + EXCLUDED.{field}" for field in ROLLUP_FIELDS)
+        sql = f"""
+            INSERT INTO {self.table} ({", ".join(columns)})
+            VALUES (to_timestamp(%s), {", ".join(["%s"] * (len(columns) - 1))})
+            ON CONFLICT ({", ".join(ROLLUP_KEYS)}) DO UPDATE SET {updates}
+        """
+        written = 0
+        try:
+            async with self.db.transaction() as tx:
+                for key, row in pending.items():
+                    await tx.execute(sql, key + tuple(row[field] for field in ROLLUP_FIELDS))
+                    written += 1
+        except Exception:
+            # 写入失败时放回，下次与新数据合并后重试
+            for key, row in pending.items():
+                merged = self._pending.setdefault(key, dict.fromkeys(ROLLUP_FIELDS, 0))
+                for field in ROLLUP_FIELDS:
+                    merged[field] += row[field]
+            raise
+        metrics.incr("ai.usage.rollup_rows", written)
+        return written
+
+    async def run_flush_loop(self, interval: float = 60) -> None:
+        """后台定期写入汇总表，直到任务被取消；取消时做最后一次写入"""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error(f"AI 用量写入失败: {e}")
+        except asyncio.CancelledError:
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"退出前 AI 用量写入失败: {e}")
+            raise
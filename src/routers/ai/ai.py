@@ -2,16 +2,19 @@ import asyncio
 import json
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from loguru import logger
 from pydantic import BaseModel
 from app_instance import app
 from src.controller import ai_manager
 from src.controller.ai_manager import AiManager
-from src.llm.model.gemma import GemmaModel
-from src.llm.model.mistral_img import MistralImgModel
-from src.llm.model.qwen import QwenModel
+from src.llm.image import InvalidImage
+from src.llm.limiter import LimiterRejected
+from src.routers.auth.auth import get_current_user
 from src.type.type import ResponseModel
+from src.type.user_type import User
+from src.util.func import get_client_ip
+from src.util.ndjson import MEDIA_TYPE as NDJSON_MEDIA_TYPE
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
@@ -24,11 +27,32 @@ def get_ai_manager() -> AiManager:
             status_code=500, detail="AI manager not initialized")
     return app.ai
 
+
+@app.exception_handler(LimiterRejected)
+async def limiter_rejected_handler(request: Request, exc: LimiterRejected):
+    """上游模型繁忙时快速返回 503，提示客户端稍后重试"""
+    return JSONResponse(status_code=503, content={"detail": str(exc)},
+                        headers={"Retry-After": str(exc.retry_after)})
+
 # 获取ai回答
 
 # 1. 定义请求结构
 
 
+@router.get("/metrics")
+async def get_metrics(ai_manager: AiManager = Depends(get_ai_manager),
+                      current_user: User = Depends(get_current_user)):
+    """AI 接口相关的运行指标；包含按用户和 IP 的用量，需要登录"""
+    return ResponseModel(code=1, data=ai_manager.get_metrics(), message="获取成功")
+
+
+@router.get("/checkpoints")
+async def get_checkpoint_report(ai_manager: AiManager = Depends(get_ai_manager),
+                                current_user: User = Depends(get_current_user)):
+    """会话 checkpoint 表的体积和清理情况，需要登录"""
+    return ResponseModel(code=1, data=await ai_manager.get_checkpoint_report(), message="获取成功")
+
+
 class ChatRequest(BaseModel):
     question: str
     session_id: str = "1"
@@ -39,7 +63,7 @@ class ChatRequest(BaseModel):
 async def get_answer(request: Request, chat_data: ChatRequest, ai_manager: AiManager = Depends(get_ai_manager)):
     # user_id = request.state.user_id
     user_id = 2
-    ip = request.headers.get("x-forwarded-for") or request.client.host
+    ip = get_client_ip(request)
     config = {"configurable": {
         "thread_id": chat_data.session_id, "ip": ip, "user_id": user_id}}
     answer = await ai_manager.invoke(chat_data.question, config)
@@ -49,11 +73,11 @@ async def get_answer(request: Request, chat_data: ChatRequest, ai_manager: AiMan
 @router.post("/chat_stream")
 async def get_answer_stream(request: Request, chat_data: ChatRequest, ai_manager: AiManager = Depends(get_ai_manager)):
     user_id = 2
-    ip = request.headers.get("x-forwarded-for") or request.client.host
+    ip = get_client_ip(request)
     config = {"configurable": {
         "thread_id": chat_data.session_id, "ip": ip, "user_id": user_id}}
     return StreamingResponse(
-        ai_manager.invoke_stream(chat_data.question, config),
+        await ai_manager.invoke_sse(chat_data.question, config, request.is_disconnected),
         media_type="text/event-stream",  # SSE 标准流格式
         headers={
             "Cache-Control": "no-cache",
@@ -65,13 +89,14 @@ async def get_answer_stream(request: Request, chat_data: ChatRequest, ai_manager
 
 @router.post("/chat-chunk-stream")
 async def chat_chunk_stream(request: Request, chat_data: ChatRequest, ai_manager: AiManager = Depends(get_ai_manager)):
+    """NDJSON 流：每行一个事件（token / tool_start / tool_end / usage / done）"""
     user_id = 2
-    ip = request.headers.get("x-forwarded-for") or request.client.host
+    ip = get_client_ip(request)
     config = {"configurable": {
         "thread_id": chat_data.session_id, "ip": ip, "user_id": user_id}}
     return StreamingResponse(
-        ai_manager.invoke_stream(chat_data.question, config),
-        media_type="application/json",  # 或者使用更规范的 application/x-ndjson
+        await ai_manager.invoke_ndjson(chat_data.question, config),
+        media_type=NDJSON_MEDIA_TYPE,
         headers={
             "Cache-Control": "no-cache",
             "X-Content-Type-Options": "nosniff",  # 防止浏览器尝试猜测类型而产生缓存
@@ -83,35 +108,23 @@ async def chat_chunk_stream(request: Request, chat_data: ChatRequest, ai_manager
 @router.post("/generate-image")
 async def generate_image(request: Request, chat_data: ChatRequest, ai_manager: AiManager = Depends(get_ai_manager)):
     user_id = 2
-    ip = request.headers.get("x-forwarded-for") or request.client.host
+    ip = get_client_ip(request)
     config = {"configurable": {
         "thread_id": chat_data.session_id, "ip": ip, "user_id": user_id}}
-    # answer = await ai_manager.generate_image(chat_data.question, config)
-    answer = await GemmaModel.ainvoke(chat_data.question)
+    answer = await ai_manager.generate_image(chat_data.question, config)
     logger.info(f"generate_image: {answer}")
     return ResponseModel(code=1, data=answer, message="获取成功")
 
 
 @router.post("/read-image")
-async def generate_image(request: Request, uri: str, ai_manager: AiManager = Depends(get_ai_manager)):
-    messages = [
-        {
-            "role": "user",
-            "content": [
-                {
-                    "type": "text",
-                    "text": "What is in this image?"
-                },
-                {
-                    "type": "image_url",
-                    "image_url": {
-                        "url": uri
-                    }
-                }
-            ]
-        }
-    ]
-    response = await QwenModel.ainvoke(messages)
-    answer = response.content
-    logger.info(f"generate_image: {answer}")
+async def read_image(request: Request, uri: str, question: str = "What is in this image?",
+                     ai_manager: AiManager = Depends(get_ai_manager)):
+    user_id = 2
+    ip = get_client_ip(request)
+    config = {"configurable": {"ip": ip, "user_id": user_id}}
+    try:
+        answer = await ai_manager.read_image(uri, config, question)
+    except InvalidImage as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"read_image: {answer}")
     return ResponseModel(code=1, data=answer, message="获取成功")
@@ -1,6 +1,6 @@
 from typing import Union
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from loguru import logger
 from pydantic import BaseModel
 from src.controller.blog_manage import BlogManager
@@ -32,7 +32,7 @@ async def create_blog(blog: BlogCreate, blog_manager: BlogManager = Depends(get_
     """
     logger.info(f'接收到的参数：{blog}')
     
-    res = blog_manager.add_blog(blog)
+    res = await blog_manager.add_blog(blog)
     
     if res:
         return ResponseModel(code=1, data={"id": res}, message="创建成功")
@@ -41,7 +41,7 @@ async def create_blog(blog: BlogCreate, blog_manager: BlogManager = Depends(get_
 
 # 获取指定博客
 @router.get("/{blog_id}")
-async def get_blog(blog_id:int, blog_manager: BlogManager = Depends(get_blog_manager)):
+async def get_blog(blog_id:int, request: Request, blog_manager: BlogManager = Depends(get_blog_manager)):
     """
     获取指定 ID 的博客
 
@@ -51,13 +51,19 @@ async def get_blog(blog_id:int, blog_manager: BlogManager = Depends(get_blog_man
     Returns:
         Blog: 博客对象，如果不存在则抛出 404 错误
     """
-    blog = blog_manager.get_blog(blog_id)
+    blog = await blog_manager.get_blog(blog_id)
     logger.info(f'查找的结果-----{blog}')
     
     if not blog:
         return ResponseModel(code=0, data=None, message="博客不存在")
 
     blog_dict = {item[0]: item[1] for item in blog}
+    if blog_manager.views:
+        # 不直接读 X-Forwarded-For：客户端可以随意伪造；uvicorn 只对 forwarded_allow_ips 中的反向代理解析该头，
+        # 解析后的真实客户端地址就在 request.client.host
+        ip = request.client.host if request.client else ""
+        blog_manager.views.record_view(blog_id, f"{ip}|{request.headers.get('user-agent', '')}")
+        blog_dict["view_num"] = blog_manager.views.get_view_num(blog_id)
 
     return ResponseModel(code=1, data=blog_dict, message="获取成功")
 
@@ -0,0 +1,19 @@
+import os
+import yaml
+
+
+def load_config(env: str = 'local') -> dict:
+    """读取 src/conf/{env}.yml，供命令行脚本在 Application 之外复用配置"""
+    config_path = f'./src/conf/{env}.yml'
+    if not os.path.exists(config_path):
+        raise FileNotFoundError(f"Configuration file not found: {config_path}")
+    with open(config_path, 'r') as file:
+        return yaml.safe_load(file)
+
+
+def build_mongo(config: dict):
+    """按配置创建 MongoDBManager"""
+    from src.database.mongo.mongodb_manage import MongoDBManager
+    mongo_config = config['mongo']
+    return MongoDBManager(ip=mongo_config['ip'], port=mongo_config['port'], db=mongo_config['db'],
+                          user=mongo_config['user'], password=mongo_config['password'])
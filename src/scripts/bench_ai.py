@@ -0,0 +1,128 @@
+"""
+AI 链路基准：用本地模拟模型（LLM_BACKEND=fake）压测 TestAgent 的流式输出，
+测量首 token 延迟（TTFT）、单流出 token 速率、整体吞吐，以及不同 checkpointer 带来的额外开销
+
+用法:
+    python -m src.scripts.bench_ai                                   # 无 checkpointer 与内存 checkpointer 对比
+    python -m src.scripts.bench_ai --concurrency 1 8 32 --requests 64 --turns 3
+    python -m src.scripts.bench_ai --env local --checkpointer none postgres  # 使用配置中的 PostgreSQL
+    python -m src.scripts.bench_ai --tool-script '[{"name": "get_client_ip"}]'  # 每轮先调用一次工具
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import uuid
+from typing import Dict, List
+
+from src.scripts import load_config
+from src.util.metrics import percentile
+
+
+async def build_checkpointer(kind: str, config: dict):
+    """返回 (checkpointer, 关闭函数)"""
+    if kind == "none":
+        return None, None
+    if kind == "memory":
+        from langgraph.checkpoint.memory import InMemorySaver
+        return InMemorySaver(), None
+    from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+    from src.database.postgresql.postgresql_manager import PostgreSQLManager
+    pg_config = config['postgresql']
+    pg = PostgreSQLManager(ip=pg_config['ip'], port=pg_config['port'], db=pg_config['db'],
+                           user=pg_config['user'], password=pg_config['password'],
+                           min_size=2, max_size=pg_config.get('pool_max_size', 10), name="bench_ai")
+    await pg.connect()
+    checkpointer = AsyncPostgresSaver(conn=pg.pool)
+    await checkpointer.setup()
+    return checkpointer, pg.close
+
+
+async def run_session(agent, turns: int, samples: Dict[str, List[float]]):
+    """一个会话连续问 turns 轮，每轮记录 TTFT、token 数和总耗时"""
+    config = {"configurable": {"thread_id": f"bench-{uuid.uuid4().hex}", "ip": "127.0.0.1", "user_id": 0}}
+    for turn in range(turns):
+        start = time.perf_counter()
+        first = None
+        tokens = 0
+        async for _ in agent.invoke_stream(f"第 {turn} 个问题：介绍一下这个博客的架构", config):
+            if first is None:
+                first = time.perf_counter()
+            tokens += 1
+        end = time.perf_counter()
+        samples["ttft_ms"].append(((first or end) - start) * 1000)
+        samples["total_ms"].append((end - start) * 1000)
+        samples["tokens"].append(tokens)
+        if first is not None and end > first and tokens > 1:
+            samples["stream_tps"].append((tokens - 1) / (end - first))
+
+
+async def bench(agent, concurrency: int, requests: int, turns: int) -> dict:
+    samples: Dict[str, List[float]] = {"ttft_ms": [], "total_ms": [], "tokens": [], "stream_tps": []}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await run_session(agent, turns, samples)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "ttft_p50": percentile(samples["ttft_ms"], 0.5),
+        "ttft_p99": percentile(samples["ttft_ms"], 0.99),
+        "total_p50": percentile(samples["total_ms"], 0.5),
+        "stream_tps": statistics.mean(samples["stream_tps"]) if samples["stream_tps"] else 0.0,
+        "throughput_tps": sum(samples["tokens"]) / elapsed,
+    }
+
+
+async def run(args):
+    from src.llm.agent import TestAgent
+
+    config = load_config(args.env) if args.env else {}
+    print(f"{'checkpointer':>12} {'conc':>5} {'ttft p50':>9} {'ttft p99':>9} {'total p50':>10} "
+          f"{'stream tok/s':>13} {'total tok/s':>12} {'ckpt +ms':>9}")
+    baseline: Dict[int, float] = {}
+    for kind in args.checkpointer:
+        checkpointer, close = await build_checkpointer(kind, config)
+        try:
+            agent = TestAgent(checkpointer)
+            for concurrency in args.concurrency:
+                result = await bench(agent, concurrency, args.requests, args.turns)
+                if kind == "none":
+                    baseline[concurrency] = result["total_p50"]
+                overhead = result["total_p50"] - baseline[concurrency] if concurrency in baseline else float("nan")
+                print(f"{kind:>12} {concurrency:>5} {result['ttft_p50']:>9.1f} {result['ttft_p99']:>9.1f} "
+                      f"{result['total_p50']:>10.1f} {result['stream_tps']:>13.1f} "
+                      f"{result['throughput_tps']:>12.1f} {overhead:>9.1f}")
+        finally:
+            if close:
+                await close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI 链路基准（本地模拟模型）")
+    parser.add_argument("--env", help="配置环境；使用 postgres checkpointer 时需要")
+    parser.add_argument("--checkpointer", nargs="+", choices=["none", "memory", "postgres"],
+                        default=["none", "memory"], help="对比的 checkpointer，none 作为计算开销的基线")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="并发会话数")
+    parser.add_argument("--requests", type=int, default=32, help="每个并发级别的会话数")
+    parser.add_argument("--turns", type=int, default=2, help="每个会话的轮数")
+    parser.add_argument("--tokens", type=int, default=64, help="模拟模型每次回复的 token 数")
+    parser.add_argument("--tps", type=float, default=50, help="模拟模型的出 token 速率")
+    parser.add_argument("--latency-ms", type=float, default=200, help="模拟模型的首 token 延迟（毫秒）")
+    parser.add_argument("--tool-script", default="[]", help="模拟模型每轮先发起的工具调用（JSON）")
+    args = parser.parse_args()
+    # 模型在导入时按环境变量创建，必须在导入 src.llm 之前设置
+    os.environ.update({"LLM_BACKEND": "fake",
+                       "FAKE_LLM_RESPONSE_TOKENS": str(args.tokens),
+                       "FAKE_LLM_TOKENS_PER_SECOND": str(args.tps),
+                       "FAKE_LLM_LATENCY_MS": str(args.latency_ms),
+                       "FAKE_LLM_TOOL_SCRIPT": args.tool_script})
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
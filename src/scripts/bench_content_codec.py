@@ -0,0 +1,128 @@
+"""
+正文压缩基准：对比不压缩 / zlib / zstd 在不同正文长度下的存储体积和读取解码耗时
+
+用法:
+    python -m src.scripts.bench_content_codec                       # 合成的 markdown 正文
+    python -m src.scripts.bench_content_codec --env local --sample 50  # 抽样线上正文
+    python -m src.scripts.bench_content_codec --env local --roundtrip  # 额外测量 Mongo find_one 往返耗时
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import Dict, List
+
+from src.database.mongo.content_codec import ContentCodec, zstandard
+from src.scripts import build_mongo, load_config
+
+BENCH_COLLECTION = "blogs_codec_bench"
+WORDS = ["FastAPI", "MongoDB", "Redis", "异步", "索引", "缓存", "连接池", "事务", "博客", "性能",
+         "async", "await", "def", "return", "index", "query", "latency", "throughput", "的", "是"]
+
+
+def synthetic_post(size: int, seed: int) -> str:
+    """生成带标题、段落和代码块的 markdown 正文，近似真实文章的可压缩性"""
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        if rng.random() < 0.2:
+            block = "```python\n" + "\n".join(
+                f"    {rng.choice(WORDS)} = {rng.choice(WORDS)}({rng.randint(0, 999)})" for _ in range(8)) + "\n```\n"
+        elif rng.random() < 0.1:
+            block = f"## {' '.join(rng.choices(WORDS, k=4))}\n"
+        else:
+            block = " ".join(rng.choices(WORDS, k=60)) + "\n\n"
+        parts.append(block)
+        length += len(block.encode("utf-8"))
+    return "".join(parts)
+
+
+def codecs() -> Dict[str, ContentCodec]:
+    result = {"none": ContentCodec(codec="zlib", enabled=False),
+              "zlib": ContentCodec(codec="zlib", threshold=0)}
+    if zstandard is not None:
+        result["zstd"] = ContentCodec(codec="zstd", threshold=0)
+    return result
+
+
+def timed_ms(func, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def bench_offline(posts: List[str], repeat: int):
+    print(f"{'size':>9} {'codec':>5} {'stored':>9} {'ratio':>7} {'encode ms':>10} {'decode ms':>10}")
+    for post in posts:
+        raw_size = len(post.encode("utf-8"))
+        for name, codec in codecs().items():
+            encoded = codec.encode(post)
+            stored = len(encoded["content"]) if name != "none" else raw_size
+            encode_ms = timed_ms(lambda: codec.encode(post), repeat)
+            decode_ms = timed_ms(lambda: codec.decode(dict(encoded)), repeat)
+            print(f"{raw_size:>9} {name:>5} {stored:>9} {stored / raw_size:>7.1%} {encode_ms:>10.4f} {decode_ms:>10.4f}")
+
+
+async def bench_roundtrip(mongo, posts: List[str], repeat: int):
+    """写入临时集合后测量 find_one + 解码的端到端读取耗时，结束后删除集合"""
+    collection = mongo.db[BENCH_COLLECTION]
+    await collection.drop()
+    try:
+        print(f"\n{'size':>9} {'codec':>5} {'read ms':>9}")
+        for index, post in enumerate(posts):
+            raw_size = len(post.encode("utf-8"))
+            for name, codec in codecs().items():
+                doc_id = f"{index}-{name}"
+                await collection.insert_one({"_id": doc_id, **codec.encode(post)})
+                samples = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    codec.decode(await mongo.find_one(BENCH_COLLECTION, {"_id": doc_id}))
+                    samples.append((time.perf_counter() - start) * 1000)
+                print(f"{raw_size:>9} {name:>5} {statistics.median(samples):>9.3f}")
+    finally:
+        await collection.drop()
+
+
+async def sample_posts(mongo, count: int) -> List[str]:
+    cursor = mongo.db["blogs"].aggregate([{"$sample": {"size": count}}, {"$project": {"content": 1}}])
+    codec = ContentCodec(codec="zlib", enabled=False)
+    return [codec.decode(doc)["content"] async for doc in cursor if doc.get("content")]
+
+
+async def run(args):
+    mongo = None
+    if args.env:
+        mongo = build_mongo(load_config(args.env))
+    try:
+        if mongo and args.sample:
+            posts = await sample_posts(mongo, args.sample)
+            posts.sort(key=len)
+        else:
+            posts = [synthetic_post(size, seed) for seed, size in enumerate(args.sizes)]
+        bench_offline(posts, args.repeat)
+        if mongo and args.roundtrip:
+            await bench_roundtrip(mongo, posts, args.repeat)
+    finally:
+        if mongo:
+            mongo.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="博客正文压缩基准")
+    parser.add_argument("--env", help="配置环境；提供时可抽样线上正文或测量 Mongo 往返")
+    parser.add_argument("--sample", type=int, default=0, help="从 blogs 集合随机抽样的正文数")
+    parser.add_argument("--roundtrip", action="store_true", help="测量 Mongo find_one 的读取耗时")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 4096, 16384, 65536, 262144],
+                        help="合成正文的字节数")
+    parser.add_argument("--repeat", type=int, default=50, help="每项重复次数，取中位数")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
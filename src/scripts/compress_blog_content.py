@@ -0,0 +1,50 @@
+"""
+存量博客正文压缩回填
+
+用法:
+    python -m src.scripts.compress_blog_content --env local --dry-run
+    python -m src.scripts.compress_blog_content --env local --codec zstd --threshold 4096
+"""
+import argparse
+import asyncio
+
+from loguru import logger
+
+from src.controller.blog_manage import BlogManager
+from src.database.mongo.content_codec import ContentCodec
+from src.scripts import build_mongo, load_config
+
+
+async def run(args):
+    config = load_config(args.env)
+    codec_config = config['mongo'].get('content_compression', {})
+    codec = ContentCodec(codec=args.codec or codec_config.get('codec', 'zstd'),
+                         threshold=args.threshold or codec_config.get('threshold', 4096),
+                         level=codec_config.get('level'),
+                         enabled=True)
+    mongo = build_mongo(config)
+    try:
+        if not await mongo.ping():
+            raise ConnectionError(f"{mongo} 不可用")
+        # 回填只访问 Mongo，不需要 MySQL 连接
+        manager = BlogManager(baseDB=None, contentDB=mongo, codec=codec)
+        logger.info(f"开始回填: {codec}")
+        stats = await manager.backfill_content_codec(batch_size=args.batch_size, dry_run=args.dry_run)
+        if stats["raw_bytes"]:
+            logger.info(f"压缩后体积为原来的 {stats['stored_bytes'] / stats['raw_bytes']:.1%}")
+    finally:
+        mongo.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="压缩 Mongo blogs 集合中的存量正文")
+    parser.add_argument("--env", default="local", help="配置环境，对应 src/conf/{env}.yml")
+    parser.add_argument("--codec", choices=["zstd", "zlib"], help="覆盖配置中的压缩算法")
+    parser.add_argument("--threshold", type=int, help="覆盖配置中的压缩阈值（字节）")
+    parser.add_argument("--batch-size", type=int, default=200, help="每批回写的文档数")
+    parser.add_argument("--dry-run", action="store_true", help="只统计不写入")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
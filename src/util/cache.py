@@ -0,0 +1,155 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from loguru import logger
+
+from src.database.redis.redis_manage import RedisManager
+from src.util.metrics import metrics
+
+# 负缓存的占位值：上游失败时在短时间内不再重复请求
+NEGATIVE = {"__negative__": True}
+
+
+class TwoTierCache:
+    """
+    两级缓存：进程内 TTL + LRU（L1）在前，Redis（L2）在后
+
+    读取先查 L1，未命中再查 L2 并回填 L1；写入同时写两级。L2 未配置或 Redis 出错时退化为只用 L1。
+    get_or_load 对同一个 key 的并发加载只执行一次 loader，失败结果按 negative_ttl 做负缓存。
+    值需要能被 JSON 序列化。
+    """
+
+    def __init__(self, name: str, ttl: int = 300, negative_ttl: int = 60, l1_size: int = 1024,
+                 l1_ttl: Optional[int] = None, redis: Optional[RedisManager] = None):
+        """
+        Args:
+            name: 缓存名，作为 Redis key 前缀和指标标签
+            ttl: 正常结果的有效期（秒）
+            negative_ttl: 失败结果的有效期（秒），0 表示不做负缓存
+            l1_size: 进程内最多保存的条目数
+            l1_ttl: 进程内条目的有效期（秒），默认与 ttl 相同；多进程部署时可以设短一些
+            redis: L2 使用的 Redis 连接
+        """
+        self.name = name
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.l1_size = l1_size
+        self.l1_ttl = l1_ttl
+        self.redis = redis
+        self._l1: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+
+    def __repr__(self) -> str:
+        return f"two tier cache {self.name} ttl={self.ttl} l2={'on' if self.redis else 'off'}"
+
+    def bind_redis(self, redis: Optional[RedisManager]):
+        """启用（或关闭）Redis 二级缓存"""
+        self.redis = redis
+
+    def _redis_key(self, key: str) -> str:
+        return f"cache:{self.name}:{key}"
+
+    def _l1_get(self, key: str) -> Any:
+        item = self._l1.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._l1[key]
+            return None
+        self._l1.move_to_end(key)
+        return value
+
+    def _l1_set(self, key: str, value: Any, ttl: int):
+        self._l1[key] = (time.monotonic() + min(ttl, self.l1_ttl or ttl), value)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.l1_size:
+            self._l1.popitem(last=False)
+
+    def get(self, key: str) -> Any:
+        """
+        读取缓存
+
+        Returns:
+            缓存的值；未命中返回 None，负缓存返回 NEGATIVE
+        """
+        value = self._l1_get(key)
+        if value is not None:
+            metrics.incr("cache.hit", cache=self.name, tier="l1")
+            return value
+        if self.redis is not None:
+            try:
+                raw = self.redis.get(self._redis_key(key))
+            except Exception as e:
+                logger.warning(f"{self} 读取 Redis 失败: {e}")
+                raw = None
+            if raw is not None:
+                value = json.loads(raw)
+                self._l1_set(key, value, self.negative_ttl if value == NEGATIVE else self.ttl)
+                metrics.incr("cache.hit", cache=self.name, tier="l2")
+                return value
+        metrics.incr("cache.miss", cache=self.name)
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        self._l1_set(key, value, ttl)
+        if self.redis is not None:
+            try:
+                self.redis.set(self._redis_key(key), json.dumps(value, ensure_ascii=False), ttl=ttl)
+            except Exception as e:
+                logger.warning(f"{self} 写入 Redis 失败: {e}")
+
+    def delete(self, key: str):
+        self._l1.pop(key, None)
+        if self.redis is not None:
+            try:
+                self.redis.delete(self._redis_key(key))
+            except Exception as e:
+                logger.warning(f"{self} 删除 Redis key 失败: {e}")
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        读取缓存，未命中时调用 loader 加载并写入
+
+        loader 返回 None 或抛出异常视为失败：失败结果写入负缓存，本次返回 None（异常会继续抛出）。
+        负缓存命中时直接返回 None。
+
+        Returns:
+            加载到的值，失败时为 None
+        """
+        value = self.get(key)
+        if value is not None:
+            return None if value == NEGATIVE else value
+
+        pending = self._loading.get(key)
+        if pending is not None:
+            # 同一个 key 已经在加载，等待其结果即可
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            start = time.perf_counter()
+            value = await loader()
+            metrics.observe("cache.load_ms", (time.perf_counter() - start) * 1000, cache=self.name)
+            if value is None:
+                metrics.incr("cache.negative", cache=self.name)
+                self.set(key, NEGATIVE, ttl=self.negative_ttl)
+            else:
+                self.set(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            if isinstance(e, Exception):
+                metrics.incr("cache.negative", cache=self.name)
+                self.set(key, NEGATIVE, ttl=self.negative_ttl)
+            future.set_result(None)
+            raise
+        finally:
+            self._loading.pop(key, None)
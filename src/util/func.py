@@ -12,3 +12,19 @@ def get_seconds_until_expiry(expiry_time: datetime) -> int:
         int: 从当前时间到过期时间的秒数（整数）
     """
     return int((expiry_time - datetime.now(timezone.utc)).total_seconds())
+
+
+def get_client_ip(request) -> str:
+    """
+    请求方的 IP
+
+    不直接读 X-Forwarded-For：客户端可以随意伪造。uvicorn 只对 forwarded_allow_ips 中的反向代理解析该头
+    （包括 "a, b" 形式的多跳），解析后的真实客户端地址就在 request.client.host。
+
+    Args:
+        request: Starlette / FastAPI 的请求对象
+
+    Returns:
+        str: 客户端 IP，无法获取时为空字符串
+    """
+    return request.client.host if request.client else ""
@@ -0,0 +1,140 @@
+import asyncio
+import random
+import time
+from typing import Optional
+
+import httpx
+from loguru import logger
+
+from src.util.metrics import metrics
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# 这些状态码通常是上游临时不可用，幂等请求可以重试
+RETRY_STATUS = {429, 502, 503, 504}
+RETRY_METHODS = {"GET", "HEAD", "OPTIONS"}
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.ReadTimeout, httpx.RemoteProtocolError,
+                    httpx.PoolTimeout)
+
+
+class HttpClient:
+    """
+    进程内共享的异步 HTTP 客户端
+
+    复用一个 httpx.AsyncClient 的连接池（keep-alive，安装了 h2 时启用 HTTP/2），
+    幂等请求在连接失败、超时或 429/5xx 时按指数退避重试，并按 host 记录延迟和状态码。
+    生命周期由 Application 管理：启动时 start()，关闭时 close()。
+    """
+
+    def __init__(self, timeout: float = 10.0, connect_timeout: float = 3.0, max_connections: int = 100,
+                 max_keepalive_connections: int = 20, keepalive_expiry: float = 30.0, retries: int = 2,
+                 backoff: float = 0.2, max_backoff: float = 3.0, http2: bool = True):
+        """
+        Args:
+            timeout: 读写超时（秒）
+            connect_timeout: 建连超时（秒）
+            max_connections: 连接池最大连接数
+            max_keepalive_connections: 保持的空闲连接数
+            keepalive_expiry: 空闲连接保持时间（秒）
+            retries: 最大重试次数
+            backoff: 首次重试的等待时间（秒），之后每次翻倍并加随机抖动
+            max_backoff: 单次重试等待的上限（秒）
+            http2: 是否启用 HTTP/2（需要安装 h2）
+        """
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.client: Optional[httpx.AsyncClient] = None
+
+    def __repr__(self) -> str:
+        return f"http client http2={self.http2} retries={self.retries}"
+
+    def start(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits, http2=self.http2,
+                                            follow_redirects=True)
+            logger.info(f"{self} 已创建")
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+            logger.info("HTTP 客户端已关闭")
+
+    def _delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.max_backoff)
+        return min(self.backoff * (2 ** attempt), self.max_backoff) * (0.5 + random.random() / 2)
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        发送请求，幂等方法失败时自动重试
+
+        Returns:
+            最后一次的响应；重试耗尽仍然是网络错误时抛出对应的 httpx 异常
+        """
+        self.start()
+        method = method.upper()
+        host = httpx.URL(url).host
+        attempts = self.retries + 1 if method in RETRY_METHODS else 1
+        for attempt in range(attempts):
+            start = time.perf_counter()
+            response = None
+            try:
+                response = await self.client.request(method, url, **kwargs)
+                metrics.incr("http.requests", host=host, status=response.status_code)
+                if response.status_code not in RETRY_STATUS or attempt == attempts - 1:
+                    return response
+            except RETRY_EXCEPTIONS as e:
+                metrics.incr("http.errors", host=host, error=type(e).__name__)
+                if attempt == attempts - 1:
+                    raise
+                logger.warning(f"请求 {host} 失败，第 {attempt + 1} 次重试: {e!r}")
+            finally:
+                metrics.observe("http.latency_ms", (time.perf_counter() - start) * 1000, host=host)
+            metrics.incr("http.retries", host=host)
+            await asyncio.sleep(self._delay(attempt, response))
+
+    def stream(self, method: str, url, **kwargs):
+        """
+        流式请求，不重试，供需要边读边检查响应体的调用方使用
+
+        Returns:
+            httpx 的流式响应上下文管理器
+        """
+        self.start()
+        return self.client.stream(method.upper(), url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+
+_http_client: Optional[HttpClient] = None
+
+
+def set_http_client(client: Optional[HttpClient]):
+    """由 Application 在启动时注入共享客户端，关闭时置空"""
+    global _http_client
+    _http_client = client
+
+
+def get_http_client() -> HttpClient:
+    """获取共享客户端；未注入时（如脚本中单独使用工具）按默认参数创建一个"""
+    global _http_client
+    if _http_client is None:
+        _http_client = HttpClient()
+    return _http_client
@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Optional
+
+
+def _metric_key(name: str, labels: Dict[str, object]) -> str:
+    """把指标名和标签拼成 key，如 llm.latency_ms{model=gemma}"""
+    if not labels:
+        return name
+    label_text = ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+    return f"{name}{{{label_text}}}"
+
+
+def percentile(samples, q: float) -> float:
+    """计算样本的分位数（q 取 0~1），样本为空时返回 0"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return float(ordered[index])
+
+
+class Histogram:
+    """保留最近 window 个样本的分布，用于计算 p50/p90/p99"""
+
+    def __init__(self, window: int = 1024):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentile(self, q: float) -> float:
+        return percentile(list(self.samples), q)
+
+    def summary(self) -> dict:
+        samples = list(self.samples)
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50": round(percentile(samples, 0.5), 3),
+            "p90": round(percentile(samples, 0.9), 3),
+            "p99": round(percentile(samples, 0.99), 3),
+            "max": round(max(samples), 3) if samples else 0.0,
+        }
+
+
+class Metrics:
+    """
+    进程内指标：计数器、延迟分布和按需计算的 gauge，
+    通过 snapshot() 汇总后由 /ai/metrics 等接口输出
+    """
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.gauges: Dict[str, Callable[[], object]] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: float = 1, **labels):
+        key = _metric_key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _metric_key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.window)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """记录代码块耗时（毫秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000, **labels)
+
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        return self.histograms.get(_metric_key(name, labels))
+
+    def counter(self, name: str, **labels) -> float:
+        return self.counters.get(_metric_key(name, labels), 0)
+
+    def register_gauge(self, name: str, func: Callable[[], object]):
+        """注册一个在 snapshot 时才计算的指标，如连接池状态"""
+        self.gauges[name] = func
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {key: histogram.summary() for key, histogram in self.histograms.items()}
+        gauges = {}
+        for name, func in self.gauges.items():
+            try:
+                gauges[name] = func()
+            except Exception as e:
+                gauges[name] = {"error": str(e)}
+        return {"counters": counters, "histograms": histograms, "gauges": gauges}
+
+
+metrics = Metrics()
@@ -0,0 +1,61 @@
+import json
+import time
+from typing import Any, AsyncIterator
+
+from loguru import logger
+
+from src.util.metrics import metrics
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时退回标准库
+    orjson = None
+
+MEDIA_TYPE = "application/x-ndjson"
+
+
+def dumps_line(obj: Any) -> bytes:
+    """序列化为一行 NDJSON（UTF-8，以换行结尾）"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+async def ndjson_stream(events: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    """
+    把事件流编码为 NDJSON，每个事件一行
+
+    上游正常结束时追加 {"type": "done"}，出错时追加 {"type": "error"} 后结束。
+    客户端断开（生成器被关闭或取消）时关闭上游事件流，从而取消模型调用。
+
+    Yields:
+        编码后的行
+    """
+    start = time.perf_counter()
+    lines = sent_bytes = 0
+    status = "done"
+    try:
+        try:
+            async for event in events:
+                line = dumps_line(event)
+                lines += 1
+                sent_bytes += len(line)
+                yield line
+        except Exception as e:
+            logger.exception(f"流式生成失败: {e}")
+            status = "error"
+        line = dumps_line({"type": status, "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)})
+        lines += 1
+        sent_bytes += len(line)
+        yield line
+    except BaseException:
+        status = "disconnected"
+        raise
+    finally:
+        aclose = getattr(events, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        metrics.incr("ndjson.streams", status=status)
+        metrics.incr("ndjson.lines", lines)
+        metrics.incr("ndjson.bytes", sent_bytes)
+        metrics.observe("ndjson.duration_ms", (time.perf_counter() - start) * 1000)
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from loguru import logger
+
+from src.util.metrics import metrics
+
+# 流结束标记，与前端约定保持不变
+DONE_FRAME = "data: [DONE]\n\n"
+HEARTBEAT_FRAME = ": ping\n\n"
+
+
+class SSEStreamer:
+    """
+    把模型逐 token 的输出整理成 SSE 帧
+
+    - 合并：缓冲区内的 token 达到 max_bytes，或第一个 token 已等待 max_delay 秒时才发出一帧，
+      避免每个 token 一个 JSON 帧带来的头部开销
+    - 心跳：超过 heartbeat 秒没有数据时发送 SSE 注释帧，防止代理和浏览器断开空闲连接
+    - 背压：上游输出先进入有界队列，客户端读得慢时队列写满，上游生成随之暂停
+    - 断开：检测到客户端断开（或响应被取消）时取消上游调用，不再继续消耗模型额度
+    每个流结束时记录帧数、字节数、心跳数和耗时。
+    """
+
+    def __init__(self, max_delay: float = 0.05, max_bytes: int = 512, heartbeat: float = 15.0,
+                 queue_size: int = 64, disconnect_check: float = 1.0):
+        """
+        Args:
+            max_delay: token 在缓冲区中最多停留的时间（秒）
+            max_bytes: 缓冲区达到该字节数时立即发出
+            heartbeat: 空闲多久发送一次心跳（秒）
+            queue_size: 上游输出队列长度
+            disconnect_check: 检查客户端是否断开的间隔（秒）
+        """
+        self.max_delay = max_delay
+        self.max_bytes = max_bytes
+        self.heartbeat = heartbeat
+        self.queue_size = queue_size
+        self.disconnect_check = disconnect_check
+
+    def __repr__(self) -> str:
+        return f"sse streamer max_delay={self.max_delay}s max_bytes={self.max_bytes} heartbeat={self.heartbeat}s"
+
+    @staticmethod
+    def frame(text: str) -> str:
+        return f"data: {json.dumps({'token': text}, ensure_ascii=False)}\n\n"
+
+    async def stream(self, tokens: AsyncIterator[str],
+                     is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None) -> AsyncIterator[str]:
+        """
+        Args:
+            tokens: 上游的文本 token 流
+            is_disconnected: 返回客户端是否已断开，一般传 request.is_disconnected
+
+        Yields:
+            SSE 帧（data 帧、心跳注释帧，最后是 [DONE]）
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        end = object()
+        producer = asyncio.create_task(self._produce(tokens, queue, end))
+        buffer: List[str] = []
+        size = 0
+        first_at = 0.0
+        start = last_sent = last_check = time.monotonic()
+        frames = sent_bytes = heartbeats = 0
+        status = "done"
+        try:
+            while True:
+                now = time.monotonic()
+                if is_disconnected is not None and now - last_check >= self.disconnect_check:
+                    last_check = now
+                    if await is_disconnected():
+                        status = "disconnected"
+                        break
+                # 有缓冲时最多等到 max_delay 到期，否则等到下一次心跳或断开检查
+                deadline = first_at + self.max_delay if buffer else last_sent + self.heartbeat
+                if is_disconnected is not None:
+                    deadline = min(deadline, last_check + self.disconnect_check)
+                item = await self._next(queue, deadline - now)
+
+                if item is end:
+                    break
+                if isinstance(item, BaseException):
+                    status = "error"
+                    break
+                if item:
+                    if not buffer:
+                        first_at = time.monotonic()
+                    buffer.append(item)
+                    size += len(item.encode("utf-8"))
+
+                now = time.monotonic()
+                if buffer and (size >= self.max_bytes or now - first_at >= self.max_delay):
+                    data = self.frame("".join(buffer))
+                    buffer, size = [], 0
+                elif not buffer and now - last_sent >= self.heartbeat:
+                    data = HEARTBEAT_FRAME
+                    heartbeats += 1
+                else:
+                    continue
+                yield data
+                frames += 1
+                sent_bytes += len(data.encode("utf-8"))
+                last_sent = time.monotonic()
+
+            if status == "disconnected":
+                return
+            if buffer:
+                data = self.frame("".join(buffer))
+                yield data
+                frames += 1
+                sent_bytes += len(data.encode("utf-8"))
+            if status == "error":
+                data = f"event: error\ndata: {json.dumps({'error': '生成失败'}, ensure_ascii=False)}\n\n"
+                yield data
+                frames += 1
+                sent_bytes += len(data.encode("utf-8"))
+            yield DONE_FRAME
+            frames += 1
+            sent_bytes += len(DONE_FRAME)
+        except (asyncio.CancelledError, GeneratorExit):
+            # 响应被服务器取消（客户端断开）
+            status = "disconnected"
+            raise
+        finally:
+            if not producer.done():
+                producer.cancel()
+                try:
+                    await producer
+                except (asyncio.CancelledError, Exception):
+                    pass
+            if status == "disconnected":
+                logger.info("客户端已断开，取消上游生成")
+            metrics.incr("sse.streams", status=status)
+            metrics.incr("sse.frames", frames)
+            metrics.incr("sse.bytes", sent_bytes)
+            metrics.incr("sse.heartbeats", heartbeats)
+            metrics.observe("sse.frames_per_stream", frames)
+            metrics.observe("sse.bytes_per_stream", sent_bytes)
+            metrics.observe("sse.duration_ms", (time.monotonic() - start) * 1000)
+
+    @staticmethod
+    async def _next(queue: asyncio.Queue, timeout: float):
+        """从队列取下一项，超时返回 None"""
+        if not queue.empty() or timeout <= 0:
+            return None if queue.empty() else queue.get_nowait()
+        try:
+            return await asyncio.wait_for(queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    @staticmethod
+    async def _produce(tokens: AsyncIterator[str], queue: asyncio.Queue, end: object):
+        try:
+            async for token in tokens:
+                await queue.put(token)
+            await queue.put(end)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"流式生成失败: {e}")
+            await queue.put(e)
+        finally:
+            # 被取消时生成器可能停在 yield 处，需要显式关闭，让上游调用和并发名额及时释放
+            aclose = getattr(tokens, "aclose", None)
+            if aclose is not None:
+                try:
+                    await aclose()
+                except Exception:
+                    pass
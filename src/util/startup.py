@@ -0,0 +1,29 @@
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from src.util.metrics import metrics
+
+
+class StartupProfile:
+    """记录启动过程中各阶段（模块导入、各子系统初始化）的耗时，通过 /ai/metrics 的 gauges.startup 查看"""
+
+    def __init__(self):
+        self.steps: Dict[str, float] = {}
+        metrics.register_gauge("startup", self.report)
+
+    @contextmanager
+    def step(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.steps[name] = round(elapsed, 1)
+            metrics.observe("startup.step_ms", elapsed, step=name)
+
+    def report(self) -> dict:
+        return {"steps": dict(self.steps), "total_ms": round(sum(self.steps.values()), 1)}
+
+
+startup = StartupProfile()